@@ -0,0 +1,186 @@
+"""
+Scores a file of matchups (First_pokemon, Second_pokemon ids, e.g. data/tests.csv) with the scoring model.
+
+Usage (from the repo root):
+    python -m batch_score data/tests.csv predictions.csv --chunksize 100000
+
+The input (CSV or Parquet) is read chunksize rows at a time, each chunk is turned into model rows and
+scored, and its predictions are written before the next chunk is read, so memory stays flat however long
+the file is. Output is CSV, or a directory of Parquet part files when the output path ends in .parquet.
+Progress is recorded next to the output, and re-running the same command resumes after the last chunk
+that was fully written.
+"""
+
+import argparse
+import glob
+import json
+import os
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from logzero import logger
+
+import get_predictions as gp
+from build_datasets.data_loading import file_fingerprint, load_pokemon
+from feature_store import RosterFeatureStore
+
+ID_COLUMNS = ["First_pokemon", "Second_pokemon"]
+
+
+def _parquet_files(path):
+    return (
+        sorted(glob.glob(os.path.join(path, "*.parquet")))
+        if os.path.isdir(path)
+        else [path]
+    )
+
+
+def _is_parquet(path):
+    return path.endswith(".parquet") or os.path.isdir(path)
+
+
+def read_chunks(path, chunksize, skip_chunks=0):
+    """
+    Yields the input's matchup id columns in chunks of up to chunksize rows, starting after skip_chunks chunks.
+    Chunk boundaries only depend on the input and chunksize, which is what makes resuming by chunk count safe.
+    """
+    if _is_parquet(path):
+        batches = (
+            batch
+            for file in _parquet_files(path)
+            for batch in pq.ParquetFile(file).iter_batches(
+                batch_size=chunksize, columns=ID_COLUMNS
+            )
+        )
+        for index, batch in enumerate(batches):
+            if index >= skip_chunks:
+                yield batch.to_pandas()
+        return
+    skip_rows = skip_chunks * chunksize
+    yield from pd.read_csv(
+        path,
+        usecols=ID_COLUMNS,
+        chunksize=chunksize,
+        # A callable rather than a range, so skipping millions of rows needs no set of row numbers
+        skiprows=lambda i: 0 < i <= skip_rows,
+    )
+
+
+def total_rows(path):
+    """Row count from Parquet metadata; None for CSV, which would have to be read to count"""
+    if _is_parquet(path):
+        return sum(
+            pq.ParquetFile(file).metadata.num_rows for file in _parquet_files(path)
+        )
+    return None
+
+
+class ScoringProgress:
+    """Chunks of output that are complete, kept in <output>.progress.json"""
+
+    def __init__(self, input_path, output_path, chunksize, max_explanations):
+        self.path = output_path.rstrip("/") + ".progress.json"
+        self.output_path = output_path
+        self.job = {
+            "input": os.path.abspath(input_path),
+            "input_sha256": (
+                file_fingerprint(input_path) if os.path.isfile(input_path) else None
+            ),
+            "chunksize": chunksize,
+            "max_explanations": max_explanations,
+            "model": gp.model_version(),
+        }
+        self.chunks = 0
+        self.rows = 0
+        self.output_bytes = 0
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                saved = json.load(f)
+            if saved["job"] == self.job:
+                self.chunks = saved["chunks"]
+                self.rows = saved["rows"]
+                self.output_bytes = saved["output_bytes"]
+            else:
+                logger.warning(
+                    f"{self.path} is for a different input or settings, starting over"
+                )
+
+    @property
+    def parquet(self):
+        return self.output_path.endswith(".parquet")
+
+    def discard_partial_output(self):
+        """Drops whatever was written after the last recorded chunk"""
+        if self.parquet:
+            os.makedirs(self.output_path, exist_ok=True)
+            for path in glob.glob(os.path.join(self.output_path, "part-*.parquet")):
+                if int(os.path.basename(path)[5:10]) >= self.chunks:
+                    os.remove(path)
+        elif os.path.exists(self.output_path):
+            with open(self.output_path, "r+b") as f:
+                f.truncate(self.output_bytes)
+
+    def write(self, scored):
+        if self.parquet:
+            pq.write_table(
+                pa.Table.from_pandas(scored, preserve_index=False),
+                os.path.join(self.output_path, f"part-{self.chunks:05d}.parquet"),
+            )
+        else:
+            scored.to_csv(
+                self.output_path, mode="a", header=self.output_bytes == 0, index=False
+            )
+            self.output_bytes = os.path.getsize(self.output_path)
+        self.chunks += 1
+        self.rows += len(scored)
+        with open(self.path + ".tmp", "w") as f:
+            json.dump(
+                {
+                    "job": self.job,
+                    "chunks": self.chunks,
+                    "rows": self.rows,
+                    "output_bytes": self.output_bytes,
+                },
+                f,
+            )
+        os.replace(self.path + ".tmp", self.path)
+
+
+def score_file(input_path, output_path, chunksize=100_000, max_explanations=3):
+    store = RosterFeatureStore(load_pokemon())
+    model = gp.get_model()
+    progress = ScoringProgress(input_path, output_path, chunksize, max_explanations)
+    progress.discard_partial_output()
+    if progress.chunks:
+        logger.info(f"Resuming after {progress.rows:,} scored rows")
+    total = total_rows(input_path)
+
+    start = time.perf_counter()
+    resumed_rows = progress.rows
+    for matchups in read_chunks(input_path, chunksize, skip_chunks=progress.chunks):
+        battle_data = store.pair_frame(
+            matchups["First_pokemon"], matchups["Second_pokemon"]
+        )
+        preds = model.predict(battle_data, max_explanations=max_explanations)
+        progress.write(pd.concat([matchups.reset_index(drop=True), preds], axis=1))
+        rate = (progress.rows - resumed_rows) / (time.perf_counter() - start)
+        done = f"{progress.rows:,}" + (f"/{total:,}" if total else "")
+        logger.info(f"Scored {done} rows, {rate:,.0f} rows/sec")
+    return progress.rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("input", help="CSV file, or Parquet file/directory")
+    parser.add_argument("output", help="CSV file, or a directory ending in .parquet")
+    parser.add_argument("--chunksize", type=int, default=100_000)
+    parser.add_argument("--max-explanations", type=int, default=3)
+    args = parser.parse_args()
+    rows = score_file(args.input, args.output, args.chunksize, args.max_explanations)
+    logger.info(f"{args.output} holds predictions for {rows:,} matchups")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,443 @@
+"""
+Standalone HTTP service for battle predictions, built on asyncio streams from the standard library.
+
+Usage (from the repo root):
+    python -m battle_service --port 8000 --max-concurrency 32
+    python -m battle_service --engine stub --call-overhead-ms 20    # load testing without model.jar
+    python -m battle_service --workers 4                            # score in 4 worker processes
+
+Endpoints (JSON in, JSON out):
+    GET  /health
+    POST /battle          {"pokemon1": "Pikachu", "pokemon2": "Bulbasaur"}
+    POST /custom-battle   {"custom_pokemon": {"name": ..., "type_1": ..., "type_2": ..., "generation": ...,
+                           "legendary": ..., "hp": ..., "speed": ..., "attack": ..., "defense": ...,
+                           "sp_attack": ..., "sp_defense": ...}, "opponent": "Bulbasaur"}
+    POST /batch           {"battles": [{"pokemon1": ..., "pokemon2": ...}, ...], "explanations": true}
+                          ("explanations": false scores probabilities only, which is much cheaper)
+    POST /counters        {"pokemon": "Pikachu", "k": 10, "type": "Water", "generation": 1, "legendary": false}
+                          (k and the filters are optional)
+    GET  /metrics         per-stage latency quantiles and counters, Prometheus text format
+    GET  /metrics.json    the same as JSON
+
+Preparation and scoring block, so they run on a thread pool. At most --max-concurrency requests are
+scored at once; further requests are answered 429 straight away instead of queueing without bound.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from http import HTTPStatus
+
+from logzero import logger
+
+import counter_finder
+import get_predictions as gp
+import helper_functions as hf
+from build_datasets.data_loading import load_pokemon
+from feature_store import RosterFeatureStore
+from instrumentation import METRICS
+from scoring_pool import ScoringWorkerPool
+
+MAX_CONCURRENCY = 32
+MAX_BODY_BYTES = 1 << 20
+MAX_BATCH_SIZE = 10_000
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4"
+CUSTOM_POKEMON_FIELDS = [
+    "name",
+    "type_1",
+    "type_2",
+    "generation",
+    "legendary",
+    "hp",
+    "speed",
+    "attack",
+    "defense",
+    "sp_attack",
+    "sp_defense",
+]
+CUSTOM_POKEMON_NUMBERS = [
+    "generation",
+    "hp",
+    "speed",
+    "attack",
+    "defense",
+    "sp_attack",
+    "sp_defense",
+]
+
+
+class TextResponse(str):
+    """A handler result sent as Prometheus text instead of JSON"""
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _explanations(preds, row=0):
+    explanations = []
+    k = 1
+    while f"EXPLANATION_{k}_FEATURE_NAME" in preds:
+        explanations.append(
+            {
+                "feature": preds[f"EXPLANATION_{k}_FEATURE_NAME"][row],
+                "strength": preds[f"EXPLANATION_{k}_QUALITATIVE_STRENGTH"][row],
+            }
+        )
+        k += 1
+    return explanations
+
+
+def _result(pokemon1, pokemon2, probability, preds=None, row=0):
+    probability = float(probability)
+    result = {
+        "pokemon1": pokemon1,
+        "pokemon2": pokemon2,
+        "winner": pokemon1 if probability > 0.5 else pokemon2,
+        "probability_pokemon1_wins": probability,
+    }
+    if preds is not None:
+        result["explanations"] = _explanations(preds, row)
+    return result
+
+
+def _records(frame):
+    """JSON-ready rows of a DataFrame, with missing values as None"""
+    return frame.astype(object).where(frame.notna(), None).to_dict(orient="records")
+
+
+def _require(body, *fields):
+    if not isinstance(body, dict):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Expected a JSON object")
+    missing = [field for field in fields if field not in body]
+    if missing:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"Missing fields: {', '.join(missing)}")
+
+
+def _integer(body, field, default=None, minimum=None):
+    """body[field], or default if it is absent or null, checked to be a whole number of at least minimum"""
+    value = body.get(field)
+    if value is None:
+        return default
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"{field} must be an integer")
+    if minimum is not None and value < minimum:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"{field} must be at least {minimum}")
+    return value
+
+
+def _boolean(body, field):
+    """body[field] if it is a JSON boolean, None if it is absent or null"""
+    value = body.get(field)
+    if value is not None and not isinstance(value, bool):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"{field} must be true, false or null")
+    return value
+
+
+class BattleService:
+    def __init__(self, store, max_concurrency=MAX_CONCURRENCY):
+        self.store = store
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self.rejected = 0
+        # One thread per admitted request, so concurrent requests reach the prediction batcher together
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix="battle-service"
+        )
+        self.routes = {
+            ("GET", "/health"): self.health,
+            ("GET", "/metrics"): self.metrics,
+            ("GET", "/metrics.json"): self.metrics_json,
+            ("POST", "/battle"): self.battle,
+            ("POST", "/custom-battle"): self.custom_battle,
+            ("POST", "/batch"): self.batch,
+            ("POST", "/counters"): self.counters,
+        }
+
+    def _check_roster(self, *names):
+        unknown = [name for name in names if name not in self.store.index_by_name]
+        if unknown:
+            raise HTTPError(
+                HTTPStatus.NOT_FOUND, f"Unknown pokemon: {', '.join(map(str, unknown))}"
+            )
+
+    def health(self, body):
+        health = {
+            "status": "ok",
+            "model": gp.model_version(),
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "rejected": self.rejected,
+        }
+        model = gp.get_model()
+        if isinstance(model, ScoringWorkerPool):
+            health["scoring_pool"] = model.health()
+            if health["scoring_pool"]["failing"]:
+                health["status"] = "degraded"
+        return health
+
+    def metrics(self, body):
+        return TextResponse(METRICS.prometheus())
+
+    def metrics_json(self, body):
+        return METRICS.snapshot()
+
+    def battle(self, body):
+        _require(body, "pokemon1", "pokemon2")
+        self._check_roster(body["pokemon1"], body["pokemon2"])
+        battle_data = hf.process_for_pokemon_battle(
+            self.store, body["pokemon1"], body["pokemon2"]
+        )
+        probability, preds = hf.run_pokemon_battle(battle_data)
+        return _result(body["pokemon1"], body["pokemon2"], probability, preds)
+
+    def custom_battle(self, body):
+        _require(body, "custom_pokemon", "opponent")
+        custom = body["custom_pokemon"]
+        _require(custom, *CUSTOM_POKEMON_FIELDS)
+        not_numbers = [
+            field
+            for field in CUSTOM_POKEMON_NUMBERS
+            if isinstance(custom[field], bool)
+            or not isinstance(custom[field], (int, float))
+        ]
+        if not_numbers:
+            raise HTTPError(
+                HTTPStatus.BAD_REQUEST,
+                f"custom_pokemon fields must be numbers: {', '.join(not_numbers)}",
+            )
+        self._check_roster(body["opponent"])
+        custom_pokemon_dict = {
+            f"pokemon_1_{field}": [custom[field]] for field in CUSTOM_POKEMON_FIELDS
+        }
+        battle_data = hf.process_for_custom_battle(
+            self.store, body["opponent"], custom_pokemon_dict
+        )
+        probability, preds = hf.run_pokemon_battle(battle_data)
+        return _result(custom["name"], body["opponent"], probability, preds)
+
+    def batch(self, body):
+        _require(body, "battles")
+        battles = body["battles"]
+        if not battles:
+            return {"results": []}
+        if len(battles) > MAX_BATCH_SIZE:
+            raise HTTPError(
+                HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                f"At most {MAX_BATCH_SIZE} battles per batch",
+            )
+        for battle in battles:
+            _require(battle, "pokemon1", "pokemon2")
+        pokemon1s = [battle["pokemon1"] for battle in battles]
+        pokemon2s = [battle["pokemon2"] for battle in battles]
+        self._check_roster(*set(pokemon1s) | set(pokemon2s))
+        battle_data = hf.process_for_pokemon_battles(self.store, pokemon1s, pokemon2s)
+        if body.get("explanations", True):
+            _, preds = hf.run_pokemon_battle(battle_data)
+            probabilities = preds["target_True_PREDICTION"].to_numpy()
+        else:
+            preds, probabilities = None, hf.battle_probabilities(battle_data)
+        return {
+            "results": [
+                _result(p1, p2, probabilities[i], preds, i)
+                for i, (p1, p2) in enumerate(zip(pokemon1s, pokemon2s))
+            ]
+        }
+
+    def counters(self, body):
+        _require(body, "pokemon")
+        self._check_roster(body["pokemon"])
+        counters, victims = counter_finder.find_counters(
+            self.store,
+            body["pokemon"],
+            k=_integer(body, "k", default=10, minimum=1),
+            type_=body.get("type"),
+            generation=_integer(body, "generation", minimum=1),
+            legendary=_boolean(body, "legendary"),
+        )
+        return {
+            "pokemon": body["pokemon"],
+            "counters": _records(counters),
+            "victims": _records(victims),
+        }
+
+    async def dispatch(self, method, path, body):
+        handler = self.routes.get((method, path))
+        if handler is None:
+            if any(route_path == path for _, route_path in self.routes):
+                raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, f"{method} not allowed")
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"No endpoint at {path}")
+        if handler in (self.health, self.metrics, self.metrics_json):
+            return handler(body)
+        if self.in_flight >= self.max_concurrency:
+            self.rejected += 1
+            METRICS.count("http_rejected")
+            raise HTTPError(HTTPStatus.TOO_MANY_REQUESTS, "Too many requests in flight")
+        self.in_flight += 1
+        start = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, partial(handler, body))
+        finally:
+            self.in_flight -= 1
+            METRICS.observe(
+                f"http_{path.strip('/').replace('-', '_')}", time.perf_counter() - start
+            )
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                keep_alive = await self._handle_request(request_line, reader, writer)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_request(self, request_line, reader, writer):
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        try:
+            method, path, version = request_line.decode("latin-1").split()
+        except ValueError:
+            self._respond(writer, HTTPStatus.BAD_REQUEST, {"error": "Bad request line"})
+            return False
+        keep_alive = (
+            version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+        )
+
+        try:
+            length = int(headers.get("content-length", 0))
+            if length > MAX_BODY_BYTES:
+                keep_alive = False
+                raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Body too large")
+            raw = await reader.readexactly(length) if length else b""
+            try:
+                body = json.loads(raw) if raw else {}
+            except json.JSONDecodeError as e:
+                raise HTTPError(HTTPStatus.BAD_REQUEST, f"Invalid JSON: {e}") from None
+            status, payload = HTTPStatus.OK, await self.dispatch(
+                method, path.split("?")[0], body
+            )
+        except HTTPError as e:
+            status, payload = e.status, {"error": str(e)}
+        except (KeyError, ValueError, TypeError) as e:
+            # Bad custom pokemon values (an unknown type, a non-numeric stat)
+            message = e.args[0] if e.args else repr(e)
+            status, payload = HTTPStatus.BAD_REQUEST, {"error": str(message)}
+        except Exception as e:
+            logger.exception(e)
+            status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": repr(e)}
+        self._respond(writer, status, payload, keep_alive)
+        return keep_alive
+
+    def _respond(self, writer, status, payload, keep_alive=False):
+        if isinstance(payload, TextResponse):
+            body, content_type = payload.encode(), PROMETHEUS_CONTENT_TYPE
+        else:
+            body, content_type = json.dumps(payload).encode(), "application/json"
+        headers = [
+            f"HTTP/1.1 {status.value} {status.phrase}",
+            f"Content-Type: {content_type}",
+            f"Content-Length: {len(body)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        if status == HTTPStatus.TOO_MANY_REQUESTS:
+            headers.append("Retry-After: 1")
+        writer.write(("\r\n".join(headers) + "\r\n\r\n").encode() + body)
+
+
+async def log_metrics_every(seconds):
+    while True:
+        await asyncio.sleep(seconds)
+        METRICS.log_snapshot()
+
+
+async def start(host, port, max_concurrency=MAX_CONCURRENCY):
+    """The service and its listening server; port 0 picks a free port"""
+    service = BattleService(RosterFeatureStore(load_pokemon()), max_concurrency)
+    # Load the model before accepting traffic rather than on the first request
+    await asyncio.get_running_loop().run_in_executor(None, gp.get_model)
+    server = await asyncio.start_server(service.handle_connection, host, port)
+    port = server.sockets[0].getsockname()[1]
+    logger.info(f"Serving battle predictions on http://{host}:{port}")
+    return service, server
+
+
+async def serve(host, port, max_concurrency, metrics_log_seconds=0):
+    _, server = await start(host, port, max_concurrency)
+    # Held so the task is not garbage collected while the server runs, and stopped with it
+    metrics_logger = (
+        asyncio.create_task(log_metrics_every(metrics_log_seconds))
+        if metrics_log_seconds
+        else None
+    )
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if metrics_logger is not None:
+            metrics_logger.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-concurrency", type=int, default=MAX_CONCURRENCY)
+    parser.add_argument(
+        "--engine",
+        choices=gp.SCORING_ENGINES,
+        help=f"Scoring engine, overriding {gp.SCORING_ENGINE_ENV}",
+    )
+    parser.add_argument(
+        "--call-overhead-ms",
+        type=float,
+        default=0.0,
+        help="With --engine stub, simulated cost of each model call",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Score in this many worker processes, each with its own model (0 scores in-process)",
+    )
+    parser.add_argument(
+        "--metrics-log-seconds",
+        type=float,
+        default=0,
+        help="Log a metrics snapshot this often (0 to only serve /metrics)",
+    )
+    args = parser.parse_args()
+    if args.engine == "stub":
+        model_factory = partial(
+            gp.StubScoringModel, call_overhead_ms=args.call_overhead_ms
+        )
+    else:
+        model_factory = partial(gp.load_engine, args.engine)
+    if args.workers:
+        gp.MODEL = ScoringWorkerPool(args.workers, model_factory)
+    elif args.engine:
+        gp.MODEL = model_factory()
+    asyncio.run(
+        serve(args.host, args.port, args.max_concurrency, args.metrics_log_seconds)
+    )
+
+
+if __name__ == "__main__":
+    main()
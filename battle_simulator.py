@@ -12,6 +12,15 @@ st.markdown(
 )
 
 pokemon = hf.load_data()
+roster = hf.load_feature_store()
+images = hf.load_image_index()
+# The model loads in the background while the page renders
+hf.start_model_warmup()
+# Imported once the top of the page is on screen, since they pull in the model and dataset modules
+import counter_finder
+import stat_sweep
+import tournament
+
 median_stats = dict(
     pokemon[["hp", "speed", "attack", "defense", "sp_attack", "sp_defense"]]
     .median()
@@ -21,7 +30,7 @@ median_stats = dict(
 pokemon_dropdown1, pokemon_dropdown2, types = hf.get_dropdowns(pokemon)
 title, icon = st.columns([4, 2])
 title.title("Welcome to the Pokemon Battle Simulator")
-icon.image("images/datarobot_icon.png", width=150)
+icon.image(images.thumbnail("datarobot_icon", 150), width=150)
 
 st.write(
     """
@@ -38,7 +47,7 @@ pokemon1 = pokemon_box1.selectbox("Pokemon 1", pokemon_dropdown1, index=30)
 pokemon2 = pokemon_box2.selectbox("Pokemon 2", pokemon_dropdown2, index=4)
 press_battle_button = st.button("Run")
 
-st.plotly_chart(hf.build_comp_chart(pokemon, pokemon1, pokemon2))
+st.plotly_chart(hf.build_comp_chart(roster, pokemon1, pokemon2))
 
 
 battle_loc, battle_image, _, battle_explanation = st.columns([5, 2, 1, 4])
@@ -51,33 +60,23 @@ battle_loc, battle_image, _, battle_explanation = st.columns([5, 2, 1, 4])
 # table_loc.table(hf.display_table(scored_data.head(10)))
 
 if press_battle_button > 0:
-
-    prep_for_battle = hf.process_for_pokemon_battle(pokemon, pokemon1, pokemon2)
-    battle_results, preds = hf.run_pokemon_battle(
-        prep_for_battle,
-    )
+    hf.wait_for_model()
+    prep_for_battle = hf.process_for_pokemon_battle(roster, pokemon1, pokemon2)
+    battle_results = hf.battle_probabilities(prep_for_battle)[0]
 
     winner = pokemon1 if battle_results > 0.5 else pokemon2
-    try:
-        battle_image.image(
-            f"images/{winner.lower()}.png",
-            width=250,
-        )
-    except Exception as e:
-        logger.warning(e)
+    winner_image = images.thumbnail(winner, 250)
+    if winner_image is not None:
+        battle_image.image(winner_image, width=250)
     battle_loc.subheader(
         f"And the winner between {pokemon1} and {pokemon2} is: {winner}!"
     )
-    explanation_1 = f"{preds['EXPLANATION_1_FEATURE_NAME'][0].replace('_', ' ').upper()} {preds['EXPLANATION_1_QUALITATIVE_STRENGTH'][0]}"
-    explanation_2 = f"{preds['EXPLANATION_2_FEATURE_NAME'][0].replace('_', ' ').upper()} {preds['EXPLANATION_2_QUALITATIVE_STRENGTH'][0]}"
-    explanation_3 = f"{preds['EXPLANATION_3_FEATURE_NAME'][0].replace('_', ' ').upper()} {preds['EXPLANATION_3_QUALITATIVE_STRENGTH'][0]}"
+    # The winner is shown first; its explanations are scored after
+    with battle_explanation:
+        with st.spinner("Working out the primary drivers..."):
+            preds = hf.explain_battle(prep_for_battle)
     battle_explanation.markdown(
-        f"""
-            <h3>Primary Drivers:</h3> \n
-            <p style="font-family:Courier; font-size: 20px;">{explanation_1}</p> \n
-            <p style="font-family:Courier; font-size: 20px;">{explanation_2}</p> \n
-            <p style="font-family:Courier; font-size: 20px;">{explanation_3}</p>
-        """,
+        hf.drivers_markdown(hf.format_explanations(preds)),
         unsafe_allow_html=True,
     )
 
@@ -121,48 +120,167 @@ with st.form(key="scenario_modeler"):
 
 prediction = st.empty()
 
+custom_pokemon_dict = {
+    "pokemon_1_name": [custom_pokemon_name],
+    "pokemon_1_type_1": [custom_pokemon_type1],
+    "pokemon_1_type_2": [custom_pokemon_type2],
+    "pokemon_1_generation": [custom_pokemon_generation],
+    "pokemon_1_legendary": [custom_pokemon_legendary],
+    "pokemon_1_hp": [custom_pokemon_hp],
+    "pokemon_1_speed": [custom_pokemon_speed],
+    "pokemon_1_attack": [custom_pokemon_attack],
+    "pokemon_1_defense": [custom_pokemon_defense],
+    "pokemon_1_sp_attack": [custom_pokemon_sp_attack],
+    "pokemon_1_sp_defense": [custom_pokemon_sp_defense],
+}
+
 if pressed_scenario > 0:
     logger.info("Battle On")
-    custom_pokemon_dict = {
-        "pokemon_1_name": [custom_pokemon_name],
-        "pokemon_1_type_1": [custom_pokemon_type1],
-        "pokemon_1_type_2": [custom_pokemon_type2],
-        "pokemon_1_generation": [custom_pokemon_generation],
-        "pokemon_1_legendary": [custom_pokemon_legendary],
-        "pokemon_1_hp": [custom_pokemon_hp],
-        "pokemon_1_speed": [custom_pokemon_speed],
-        "pokemon_1_attack": [custom_pokemon_attack],
-        "pokemon_1_defense": [custom_pokemon_defense],
-        "pokemon_1_sp_attack": [custom_pokemon_sp_attack],
-        "pokemon_1_sp_defense": [custom_pokemon_sp_defense],
-    }
+    hf.wait_for_model()
     prep_for_custom_battle = hf.process_for_custom_battle(
-        pokemon, pokemon2, custom_pokemon_dict
+        roster, pokemon2, custom_pokemon_dict
     )
 
-    battle_results, preds = hf.run_pokemon_battle(prep_for_custom_battle)
+    battle_results = hf.battle_probabilities(prep_for_custom_battle)[0]
 
     winner = custom_pokemon_name if battle_results > 0.5 else pokemon2
     battle_loc.subheader(
         f"And the winner between {custom_pokemon_name} and {pokemon2} is: {winner}!"
     )
-    try:
-        battle_image.image(
-            f"images/{winner}.png",
-            width=150,
-        )
-    except Exception as e:
-        logger.warning(e)
+    winner_image = images.thumbnail(winner, 150)
+    if winner_image is not None:
+        battle_image.image(winner_image, width=150)
 
-    explanation_1 = f"{preds['EXPLANATION_1_FEATURE_NAME'][0].replace('_', ' ').upper()} {preds['EXPLANATION_1_QUALITATIVE_STRENGTH'][0]}"
-    explanation_2 = f"{preds['EXPLANATION_2_FEATURE_NAME'][0].replace('_', ' ').upper()} {preds['EXPLANATION_2_QUALITATIVE_STRENGTH'][0]}"
-    explanation_3 = f"{preds['EXPLANATION_3_FEATURE_NAME'][0].replace('_', ' ').upper()} {preds['EXPLANATION_3_QUALITATIVE_STRENGTH'][0]}"
+    with battle_explanation:
+        with st.spinner("Working out the primary drivers..."):
+            preds = hf.explain_battle(prep_for_custom_battle)
     battle_explanation.markdown(
-        f"""
-            <h3>Primary Drivers:</h3> \n
-            <p style="font-family:Courier; font-size: 20px;">{explanation_1}</p> \n
-            <p style="font-family:Courier; font-size: 20px;">{explanation_2}</p> \n
-            <p style="font-family:Courier; font-size: 20px;">{explanation_3}</p>
-        """,
+        hf.drivers_markdown(hf.format_explanations(preds)),
         unsafe_allow_html=True,
     )
+
+
+st.header("Stat sweep")
+st.write(
+    f"See how the chance of {custom_pokemon_name} beating {pokemon2} changes across a range of one or two "
+    "of its stats, keeping the rest as set above. Every combination is scored in one go."
+)
+
+with st.form(key="stat_sweep"):
+    sweep_set1, sweep_set2 = st.columns([4, 4])
+    sweep_x_stat = sweep_set1.selectbox("Stat", stat_sweep.SWEEP_STATS, index=1)
+    sweep_x_range = sweep_set1.slider("Range", 1, 255, (10, 200))
+    sweep_y_stat = sweep_set2.selectbox(
+        "Second stat (optional)", ["None"] + stat_sweep.SWEEP_STATS
+    )
+    sweep_y_range = sweep_set2.slider("Second range", 1, 255, (10, 200))
+    sweep_steps = st.number_input(
+        "Steps per stat", min_value=2, max_value=stat_sweep.MAX_STEPS, value=50
+    )
+    pressed_sweep = st.form_submit_button("Run Sweep")
+
+if pressed_sweep > 0:
+    if sweep_y_stat == sweep_x_stat:
+        st.warning("Choose two different stats")
+    else:
+        hf.wait_for_model()
+        sweep_y_stat = None if sweep_y_stat == "None" else sweep_y_stat
+        sweep_x_values = stat_sweep.stat_values(*sweep_x_range, int(sweep_steps))
+        sweep_y_values = (
+            stat_sweep.stat_values(*sweep_y_range, int(sweep_steps))
+            if sweep_y_stat
+            else None
+        )
+        sweep_probabilities = stat_sweep.sweep(
+            roster,
+            custom_pokemon_dict,
+            pokemon2,
+            sweep_x_stat,
+            sweep_x_values,
+            sweep_y_stat,
+            sweep_y_values,
+        )
+        if sweep_y_stat is None:
+            needed = stat_sweep.break_even(sweep_x_values, sweep_probabilities)
+            st.subheader(
+                f"{custom_pokemon_name} is favoured from {sweep_x_stat} {needed}"
+                if needed is not None
+                else f"{custom_pokemon_name} is not favoured at the top of this {sweep_x_stat} range"
+            )
+        st.plotly_chart(
+            hf.build_sweep_chart(
+                sweep_probabilities,
+                sweep_x_stat,
+                sweep_x_values,
+                sweep_y_stat,
+                sweep_y_values,
+            )
+        )
+
+
+st.header("Counter finder")
+st.write(
+    "Pick a Pokemon to see which Pokemon are most likely to beat it, and which it beats most easily."
+)
+
+with st.form(key="counter_finder"):
+    counter_set1, counter_set2 = st.columns([4, 4])
+    counter_target = counter_set1.selectbox("Pokemon", pokemon_dropdown1, index=30)
+    counter_k = counter_set1.slider("How many", 1, 25, 10)
+    counter_type = counter_set2.selectbox("Opponent type", ["Any"] + list(types))
+    counter_generation = counter_set2.selectbox(
+        "Opponent generation", ["Any"] + sorted(pokemon.generation.unique())
+    )
+    counter_legendary = counter_set2.radio(
+        "Legendary opponents", ["Any", "Only", "Exclude"], horizontal=True
+    )
+    pressed_counters = st.form_submit_button("Find Counters")
+
+if pressed_counters > 0:
+    hf.wait_for_model()
+    counters, victims = counter_finder.find_counters(
+        roster,
+        counter_target,
+        k=counter_k,
+        type_=None if counter_type == "Any" else counter_type,
+        generation=None if counter_generation == "Any" else counter_generation,
+        legendary={"Any": None, "Only": True, "Exclude": False}[counter_legendary],
+    )
+    counters_loc, victims_loc = st.columns(2)
+    counters_loc.subheader(f"Beats {counter_target}")
+    counters_loc.dataframe(counters)
+    victims_loc.subheader(f"Beaten by {counter_target}")
+    victims_loc.dataframe(victims)
+
+
+st.header("Tournament")
+st.write(
+    f"Pick {tournament.MIN_ENTRANTS} to {tournament.MAX_ENTRANTS} Pokemon for a single elimination bracket, "
+    "in bracket order. Every matchup is scored once and the bracket is simulated many times."
+)
+
+with st.form(key="tournament"):
+    entrants = st.multiselect(
+        "Entrants", pokemon_dropdown1, default=list(pokemon_dropdown1[:16])
+    )
+    trials = st.number_input(
+        "Simulations", min_value=100, max_value=100_000, value=10_000, step=1_000
+    )
+    pressed_tournament = st.form_submit_button("Run Tournament")
+
+if pressed_tournament > 0:
+    if not tournament.MIN_ENTRANTS <= len(entrants) <= tournament.MAX_ENTRANTS:
+        st.warning(
+            f"Choose between {tournament.MIN_ENTRANTS} and {tournament.MAX_ENTRANTS} entrants"
+        )
+    else:
+        hf.wait_for_model()
+        tournament_results = tournament.run_tournament(
+            roster, entrants, trials=int(trials)
+        )
+        st.subheader(
+            f"{tournament_results.Pokemon[0]} wins "
+            f"{tournament_results.championship_probability[0]:.1%} of the time"
+        )
+        st.plotly_chart(hf.build_tournament_chart(tournament_results))
+        st.dataframe(tournament_results)
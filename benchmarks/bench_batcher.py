@@ -0,0 +1,106 @@
+"""
+Measures throughput and latency of single-row predictions from concurrent callers,
+scored one call per request versus coalesced by get_predictions.PredictionBatcher.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_batcher --users 32 --seconds 5 --window-ms 5
+
+Without model.jar the StubScoringModel is used, with --call-overhead-ms standing in for the JVM round trip.
+"""
+import argparse
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from logzero import logger
+
+import get_predictions as gp
+from build_datasets.data_loading import load_pokemon
+from build_datasets.format_dataset_for_classification import (
+    build_type_advantage,
+    process_data,
+)
+
+
+def build_requests(n, seed=0):
+    pokemon = load_pokemon()
+    rng = np.random.default_rng(seed)
+    combat = pd.DataFrame(
+        {
+            "First_pokemon": rng.choice(pokemon.id, n),
+            "Second_pokemon": rng.choice(pokemon.id, n),
+        }
+    )
+    battle_data = process_data(combat, pokemon, is_training_data=False)
+    battle_data["type_advantage"] = build_type_advantage(battle_data)
+    return [battle_data.iloc[[i]].reset_index(drop=True) for i in range(n)]
+
+
+def drive(predict, requests, users, seconds):
+    """Runs `users` threads calling predict back to back; returns (latencies in seconds, elapsed)"""
+    latencies = [[] for _ in range(users)]
+    stop = time.perf_counter() + seconds
+
+    def user(i):
+        j = i
+        while time.perf_counter() < stop:
+            start = time.perf_counter()
+            predict(requests[j % len(requests)])
+            latencies[i].append(time.perf_counter() - start)
+            j += users
+
+    threads = [threading.Thread(target=user, args=(i,)) for i in range(users)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return np.concatenate([np.array(lat) for lat in latencies]), (
+        time.perf_counter() - start
+    )
+
+
+def report(label, latencies, elapsed):
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+    logger.info(
+        f"{label}: {len(latencies) / elapsed:,.0f} predictions/sec, "
+        f"p50 {p50:.1f} ms, p95 {p95:.1f} ms, p99 {p99:.1f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--users", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--window-ms", type=float, default=gp.BATCH_WINDOW_MS)
+    parser.add_argument("--max-rows", type=int, default=gp.BATCH_MAX_ROWS)
+    parser.add_argument("--call-overhead-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    model = gp.get_model()
+    if isinstance(model, gp.StubScoringModel):
+        model = gp.StubScoringModel(call_overhead_ms=args.call_overhead_ms)
+    requests = build_requests(1000)
+
+    # One model instance serves one call at a time, as the JVM-backed model does
+    lock = threading.Lock()
+
+    def unbatched(data):
+        with lock:
+            return model.predict(data, max_explanations=3)
+
+    report("unbatched", *drive(unbatched, requests, args.users, args.seconds))
+
+    batcher = gp.PredictionBatcher(
+        model, window_ms=args.window_ms, max_rows=args.max_rows
+    )
+    report("batched", *drive(batcher.predict, requests, args.users, args.seconds))
+    batcher.close()
+    logger.info(
+        f"batched: {batcher.requests_scored / batcher.model_calls:.1f} requests per model call"
+    )
+
+
+if __name__ == "__main__":
+    main()
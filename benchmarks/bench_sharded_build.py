@@ -0,0 +1,75 @@
+"""
+Measures how the sharded classification build scales with the number of worker processes.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_sharded_build --rows 5000000 --workers 1 2 4 8
+
+A synthetic combat log of --rows rows is written to a temporary directory and built once per worker count.
+Every run is checked to produce the same part files as the first one.
+"""
+
+import argparse
+import glob
+import os
+import tempfile
+import time
+
+import pyarrow.parquet as pq
+from logzero import logger
+
+from benchmarks.run_benchmarks import synthetic_combats
+from build_datasets.data_loading import count_rows, load_pokemon, remove_cache
+from build_datasets.format_dataset_for_classification import (
+    write_partitioned_parallel,
+)
+
+
+def read_parts(output_dir):
+    return [
+        pq.read_table(path)
+        for path in sorted(glob.glob(os.path.join(output_dir, "part-*.parquet")))
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--chunksize", type=int, default=250_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    logger.info(f"{os.cpu_count()} cores available")
+    with tempfile.TemporaryDirectory() as tmp:
+        combat_path = os.path.join(tmp, "synthetic_combats.csv")
+        synthetic_combats(load_pokemon(), args.rows).to_csv(combat_path, index=False)
+        # Compile the column cache outside the timed runs, and drop it with the temporary log
+        count_rows(combat_path)
+        try:
+            reference = None
+            baseline = None
+            for workers in args.workers:
+                output_dir = os.path.join(tmp, f"train-{workers}.parquet")
+                start = time.perf_counter()
+                write_partitioned_parallel(
+                    combat_path, output_dir, args.chunksize, workers
+                )
+                seconds = time.perf_counter() - start
+                baseline = baseline or seconds
+
+                parts = read_parts(output_dir)
+                if reference is None:
+                    reference = parts
+                elif len(parts) != len(reference) or not all(
+                    a.equals(b) for a, b in zip(parts, reference)
+                ):
+                    raise AssertionError(f"{workers} workers wrote a different dataset")
+                logger.info(
+                    f"{workers} workers: {seconds:,.2f} s, {args.rows / seconds:,.0f} rows/sec, "
+                    f"{baseline / seconds:.2f}x"
+                )
+        finally:
+            remove_cache(combat_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Measures how scoring throughput scales with the number of ScoringWorkerPool worker processes.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_worker_pool --workers 1 2 4 8 --cpu-ms 20 --rows 256
+
+Every worker scores with a StubScoringModel that keeps a core busy for --cpu-ms per call, standing in for
+a CPU-bound model. Requests of --rows rows are kept queued --in-flight at a time for --seconds, and the
+single in-process model is measured the same way as the baseline.
+"""
+
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import numpy as np
+from logzero import logger
+
+import get_predictions as gp
+from build_datasets.data_loading import load_pokemon
+from feature_store import RosterFeatureStore
+from scoring_pool import ScoringWorkerPool
+
+
+def build_request(rows, seed=0):
+    store = RosterFeatureStore(load_pokemon())
+    rng = np.random.default_rng(seed)
+    return store.pair_frame(rng.choice(store.ids, rows), rng.choice(store.ids, rows))
+
+
+def drive(submit, data, in_flight, seconds):
+    """Keeps in_flight requests outstanding for seconds; returns (requests completed, elapsed)"""
+    stop = time.perf_counter() + seconds
+    done = 0
+    lock = threading.Lock()
+    finished = threading.Semaphore(0)
+
+    def on_done(future):
+        nonlocal done
+        future.result()
+        with lock:
+            done += 1
+        finished.release()
+
+    start = time.perf_counter()
+    outstanding = 0
+    for _ in range(in_flight):
+        submit(data).add_done_callback(on_done)
+        outstanding += 1
+    while outstanding:
+        finished.acquire()
+        outstanding -= 1
+        if time.perf_counter() < stop:
+            submit(data).add_done_callback(on_done)
+            outstanding += 1
+    return done, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--cpu-ms", type=float, default=20)
+    parser.add_argument("--rows", type=int, default=256)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument(
+        "--in-flight", type=int, default=0, help="default: twice the most workers"
+    )
+    args = parser.parse_args()
+    in_flight = args.in_flight or 2 * max(args.workers)
+    data = build_request(args.rows)
+
+    # The baseline: one model in this process, scoring one call at a time
+    model = gp.StubScoringModel(cpu_ms=args.cpu_ms)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        done, elapsed = drive(
+            partial(executor.submit, model.predict), data, in_flight, args.seconds
+        )
+    baseline = done * args.rows / elapsed
+    logger.info(f"in-process: {baseline:,.0f} rows/sec")
+
+    for workers in args.workers:
+        with ScoringWorkerPool(
+            workers, partial(gp.StubScoringModel, cpu_ms=args.cpu_ms)
+        ) as pool:
+            done, elapsed = drive(pool.submit, data, in_flight, args.seconds)
+        rate = done * args.rows / elapsed
+        logger.info(
+            f"{workers} workers: {rate:,.0f} rows/sec ({rate / baseline:.2f}x in-process)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Compares the scoring engines on the combats held out by build_datasets.train_numpy_model.
+
+Usage (from the repo root):
+    python -m benchmarks.engine_report --batch-sizes 1 100 10000
+
+For every engine whose model file exists it reports holdout accuracy, log loss and per-row latency by
+batch size. When model.jar is present, the other engines are also compared with it: probability
+difference, agreement on the winner and on the top explanation.
+"""
+
+import argparse
+import os
+import statistics
+import time
+
+import numpy as np
+from logzero import logger
+
+import get_predictions as gp
+from build_datasets.train_numpy_model import load_training_data, split
+
+
+def available_engines():
+    engines = {}
+    for name in ("jar", "numpy", "stub"):
+        try:
+            engines[name] = gp.load_engine(name)
+        except (FileNotFoundError, ImportError) as e:
+            logger.warning(f"Skipping the {name} engine: {e}")
+    return engines
+
+
+def per_row_latency(engine, data, batch_size, repeat):
+    batch = data.iloc[:batch_size].reset_index(drop=True)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        engine.predict(batch, max_explanations=3)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) / len(batch)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 100, 10_000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    _, holdout = split(load_training_data())
+    holdout = holdout.reset_index(drop=True)
+    won = holdout["pokemon_1_won"].to_numpy(dtype=bool)
+    engines = available_engines()
+    preds = {
+        name: engine.predict(holdout, max_explanations=3)
+        for name, engine in engines.items()
+    }
+
+    for name, engine in engines.items():
+        p = np.clip(preds[name]["target_True_PREDICTION"].to_numpy(), 1e-15, 1 - 1e-15)
+        accuracy = ((p > 0.5) == won).mean()
+        log_loss = -np.mean(np.where(won, np.log(p), np.log(1 - p)))
+        latencies = ", ".join(
+            f"batch {size:,}: {per_row_latency(engine, holdout, size, args.repeat) * 1e6:,.1f} us/row"
+            for size in args.batch_sizes
+        )
+        logger.info(
+            f"{name}: accuracy {accuracy:.4f}, log loss {log_loss:.4f} on {len(holdout):,} combats; {latencies}"
+        )
+
+    if "jar" not in preds:
+        logger.info(f"{gp.MODEL_PATH} not available, parity against the JAR skipped")
+        return
+    reference = preds["jar"]
+    for name in preds.keys() - {"jar"}:
+        p = preds[name]["target_True_PREDICTION"].to_numpy()
+        q = reference["target_True_PREDICTION"].to_numpy()
+        difference = np.abs(p - q)
+        same_top = (
+            preds[name]["EXPLANATION_1_FEATURE_NAME"].to_numpy()
+            == reference["EXPLANATION_1_FEATURE_NAME"].to_numpy()
+        )
+        logger.info(
+            f"{name} vs jar: mean |dp| {difference.mean():.4f}, max |dp| {difference.max():.4f}, "
+            f"same winner {((p > 0.5) == (q > 0.5)).mean():.4f}, same top explanation {same_top.mean():.4f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
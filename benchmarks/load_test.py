@@ -0,0 +1,278 @@
+"""
+Load test of the battle path: how latency and memory grow with the number of concurrent sessions.
+
+Usage (from the repo root):
+    python -m benchmarks.load_test --users 1 8 32 64 --seconds 20 --think-ms 500
+    python -m benchmarks.load_test --mode apptest --users 1 4 8    # whole script runs, much heavier
+
+Each simulated user is a thread that repeatedly picks two random pokemon, waits an exponentially
+distributed think time and then does what a session does when they press Run:
+- direct mode calls the session's code path itself: load_data, build_comp_chart, process_for_pokemon_battle,
+  the fast-path probability and the explanations (every --custom-every-th action a custom battle instead)
+- apptest mode reruns battle_simulator.py headless with streamlit.testing, one AppTest per user. AppTest
+  keeps state that threads would share, so these users are processes and memory is their total RSS.
+Scoring uses StubScoringModel, with --call-overhead-ms standing in for the JVM round trip. For each user
+count it reports actions/sec, p50/p99 action latency and the process's resident memory per user.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import threading
+import time
+
+import numpy as np
+from logzero import logger
+
+import get_predictions as gp
+import helper_functions as hf
+from benchmarks.run_benchmarks import custom_pokemon
+from instrumentation import METRICS
+
+
+def resident_bytes():
+    """Current resident set size; peak RSS where /proc is not available"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def direct_session(names, custom_every):
+    store = hf.load_feature_store()
+    actions = 0
+
+    def act(rng):
+        nonlocal actions
+        actions += 1
+        hf.load_data()
+        pokemon1, pokemon2 = rng.choice(names, 2)
+        hf.build_comp_chart(store, pokemon1, pokemon2)
+        if custom_every and actions % custom_every == 0:
+            battle_data = hf.process_for_custom_battle(
+                store, pokemon2, custom_pokemon(1)
+            )
+        else:
+            battle_data = hf.process_for_pokemon_battle(store, pokemon1, pokemon2)
+        hf.battle_probabilities(battle_data)
+        hf.format_explanations(hf.explain_battle(battle_data))
+
+    return act
+
+
+def apptest_session(names, custom_every):
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(os.path.abspath("battle_simulator.py"), default_timeout=120)
+    app.run()
+    actions = 0
+
+    def act(rng):
+        nonlocal actions
+        actions += 1
+        pokemon1, pokemon2 = rng.choice(names, 2)
+        app.selectbox[0].set_value(pokemon1)
+        app.selectbox[1].set_value(pokemon2)
+        if custom_every and actions % custom_every == 0:
+            app.button[1].click()
+        else:
+            app.button[0].click()
+        app.run()
+        if app.exception:
+            raise RuntimeError(app.exception[0].value)
+
+    return act
+
+
+def user_loop(act, rng, think_ms, stop_at, latencies, errors):
+    """Think, act, record, until the wall clock passes stop_at"""
+    while time.time() < stop_at:
+        if think_ms:
+            time.sleep(rng.exponential(think_ms / 1000))
+        start = time.perf_counter()
+        try:
+            act(rng)
+        except Exception as e:
+            errors.append(repr(e))
+            continue
+        latencies.append(time.perf_counter() - start)
+
+
+def run_level(session, users, seconds, think_ms, custom_every, names, seed=0):
+    """Runs users sessions as threads for seconds; returns action latencies in seconds, elapsed time and errors"""
+    latencies = [[] for _ in range(users)]
+    errors = []
+    ready = threading.Barrier(users + 1)
+    go = threading.Event()
+    stop_at = None
+
+    def user(i):
+        try:
+            act = session(names, custom_every)
+        except Exception as e:
+            errors.append(repr(e))
+            act = None
+        ready.wait()
+        go.wait()
+        if act is not None:
+            rng = np.random.default_rng(seed + i)
+            user_loop(act, rng, think_ms, stop_at, latencies[i], errors)
+
+    threads = [threading.Thread(target=user, args=(i,)) for i in range(users)]
+    for t in threads:
+        t.start()
+    # Sessions are set up before the clock starts, so set-up does not count as load
+    ready.wait()
+    start = time.perf_counter()
+    stop_at = time.time() + seconds
+    go.set()
+    for t in threads:
+        t.join()
+    return np.concatenate(latencies), time.perf_counter() - start, errors
+
+
+def _process_user(i, seed, call_overhead_ms, think_ms, custom_every, names, sync):
+    ready, go, stop_at, results = sync
+    gp.MODEL = gp.StubScoringModel(call_overhead_ms=call_overhead_ms)
+    latencies, errors = [], []
+    try:
+        act = apptest_session(names, custom_every)
+    except Exception as e:
+        errors.append(repr(e))
+        act = None
+    ready.wait()
+    go.wait()
+    if act is not None:
+        rng = np.random.default_rng(seed + i)
+        user_loop(act, rng, think_ms, stop_at.value, latencies, errors)
+    results.put((latencies, errors, resident_bytes()))
+
+
+def run_level_in_processes(
+    users, seconds, think_ms, custom_every, names, call_overhead_ms, seed=0
+):
+    """run_level for apptest sessions, one process per user; also returns the users' total RSS"""
+    context = multiprocessing.get_context("spawn")
+    ready = context.Barrier(users + 1)
+    go = context.Event()
+    stop_at = context.Value("d", 0.0)
+    results = context.Queue()
+    processes = [
+        context.Process(
+            target=_process_user,
+            args=(
+                i,
+                seed,
+                call_overhead_ms,
+                think_ms,
+                custom_every,
+                names,
+                (ready, go, stop_at, results),
+            ),
+        )
+        for i in range(users)
+    ]
+    for process in processes:
+        process.start()
+    ready.wait()
+    start = time.perf_counter()
+    stop_at.value = time.time() + seconds
+    go.set()
+    outcomes = [results.get() for _ in processes]
+    elapsed = time.perf_counter() - start
+    for process in processes:
+        process.join()
+    latencies = np.concatenate([np.array(lat) for lat, _, _ in outcomes])
+    errors = [error for _, errs, _ in outcomes for error in errs]
+    return latencies, elapsed, errors, sum(rss for _, _, rss in outcomes)
+
+
+def clear_caches():
+    hf.BATTLE_CACHE.clear()
+    hf.COMP_CHART_CACHE.clear()
+    gp.EXPLANATION_CACHE.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--mode", choices=["direct", "apptest"], default="direct")
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 8, 32, 64])
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--think-ms", type=float, default=500)
+    parser.add_argument(
+        "--custom-every",
+        type=int,
+        default=5,
+        help="Every nth action is a custom battle (0 for none)",
+    )
+    parser.add_argument("--call-overhead-ms", type=float, default=20)
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    gp.MODEL = gp.StubScoringModel(call_overhead_ms=args.call_overhead_ms)
+    names = hf.load_data().name.dropna().to_numpy()
+    hf.start_model_warmup().join()
+    # One action first, so one-off imports and set-up are not counted as per-user memory
+    direct_session(names, custom_every=0)(np.random.default_rng())
+    baseline = 0 if args.mode == "apptest" else resident_bytes()
+
+    results = []
+    for users in args.users:
+        clear_caches()
+        METRICS.reset()
+        if args.mode == "apptest":
+            latencies, elapsed, errors, memory = run_level_in_processes(
+                users,
+                args.seconds,
+                args.think_ms,
+                args.custom_every,
+                names,
+                args.call_overhead_ms,
+            )
+        else:
+            latencies, elapsed, errors = run_level(
+                direct_session,
+                users,
+                args.seconds,
+                args.think_ms,
+                args.custom_every,
+                names,
+            )
+            memory = resident_bytes()
+        if len(latencies) == 0:
+            logger.error(f"{users} users: no action completed ({len(errors)} errors)")
+            continue
+        p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+        result = {
+            "users": users,
+            "actions": len(latencies),
+            "errors": len(errors),
+            "actions_per_sec": len(latencies) / elapsed,
+            "p50_ms": p50,
+            "p99_ms": p99,
+            "rss_mb": memory / 2**20,
+            "rss_per_user_mb": (memory - baseline) / 2**20 / users,
+            "stages": METRICS.snapshot()["stages"],
+        }
+        results.append(result)
+        logger.info(
+            f"{users} users: {result['actions_per_sec']:,.1f} actions/sec, p50 {p50:.1f} ms, p99 {p99:.1f} ms, "
+            f"RSS {result['rss_mb']:,.0f} MB ({result['rss_per_user_mb']:.2f} MB/user), {len(errors)} errors"
+        )
+        if errors:
+            logger.warning(f"First error: {errors[0]}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(
+                {"mode": args.mode, "think_ms": args.think_ms, "results": results},
+                f,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+Times the battle and dataset hot paths over a range of input sizes.
+
+Usage (from the repo root):
+    python -m benchmarks.run_benchmarks --sizes 1 1000 50000 5000000 --output bench_results.json
+    python -m benchmarks.run_benchmarks --compare before.json after.json
+
+Each case reports the median wall time over --repeat runs, peak Python memory (tracemalloc, from a separate run)
+and rows/sec. Results are written as JSON tagged with the current commit so runs can be compared between commits.
+Scoring always uses the deterministic StubScoringModel, so no JVM is needed.
+"""
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+from logzero import logger
+
+import get_predictions as gp
+import helper_functions as hf
+import stat_sweep
+from build_datasets import format_dataset_for_regression as regression
+from build_datasets.format_dataset_for_classification import (
+    build_type_advantage,
+    process_data,
+)
+
+DEFAULT_SIZES = [1, 1_000, 50_000, 5_000_000]
+
+
+def synthetic_combats(pokemon, n, seed=0):
+    rng = np.random.default_rng(seed)
+    first = rng.choice(pokemon.id.to_numpy(), n)
+    second = rng.choice(pokemon.id.to_numpy(), n)
+    return pd.DataFrame(
+        {
+            "First_pokemon": first,
+            "Second_pokemon": second,
+            "Winner": np.where(rng.random(n) < 0.5, first, second),
+        }
+    )
+
+
+def custom_pokemon(n):
+    return {
+        "pokemon_1_name": ["Brettasaurus"] * n,
+        "pokemon_1_type_1": ["Fire"] * n,
+        "pokemon_1_type_2": ["None"] * n,
+        "pokemon_1_generation": [7] * n,
+        "pokemon_1_legendary": [False] * n,
+        "pokemon_1_hp": [65] * n,
+        "pokemon_1_speed": [65] * n,
+        "pokemon_1_attack": [75] * n,
+        "pokemon_1_defense": [70] * n,
+        "pokemon_1_sp_attack": [65] * n,
+        "pokemon_1_sp_defense": [70] * n,
+    }
+
+
+def build_cases(sizes):
+    """Yields (name, rows, setup) where setup() prepares inputs and returns the callable to time"""
+    pokemon = hf.load_data()
+    store = hf.feature_store(pokemon)
+    regression_pokemon, _ = regression.read_data()
+
+    def load_data():
+        hf.load_data.clear()
+        return hf.load_data()
+
+    yield "load_data", len(pokemon), lambda: load_data
+    yield "get_dropdowns", len(pokemon), lambda: lambda: hf.get_dropdowns(pokemon)
+
+    def build_comp_chart():
+        hf.COMP_CHART_CACHE.clear()
+        return hf.build_comp_chart(store, "Pikachu", "Bulbasaur")
+
+    yield "build_comp_chart", 2, lambda: build_comp_chart
+    yield "build_comp_chart.cached", 2, lambda: lambda: hf.build_comp_chart(
+        store, "Pikachu", "Bulbasaur"
+    )
+    yield "process_for_pokemon_battle", 1, lambda: lambda: hf.process_for_pokemon_battle(
+        store, "Pikachu", "Bulbasaur"
+    )
+    yield "process_for_custom_battle", 1, lambda: lambda: hf.process_for_custom_battle(
+        store, "Pikachu", custom_pokemon(1)
+    )
+
+    def setup_stat_sweep():
+        values = stat_sweep.stat_values(10, 200, 50)
+        return lambda: stat_sweep.sweep(
+            store, custom_pokemon(1), "Pikachu", "attack", values, "speed", values
+        )
+
+    yield "stat_sweep.50x50", 2500, setup_stat_sweep
+
+    for n in sizes:
+
+        def processed(n=n):
+            return process_data(
+                synthetic_combats(pokemon, n), pokemon, is_training_data=False
+            )
+
+        def battle_ready(n=n):
+            battle_data = processed(n)
+            battle_data["type_advantage"] = build_type_advantage(battle_data)
+            return battle_data
+
+        def setup_process_data(n=n):
+            combat = synthetic_combats(pokemon, n)
+            return lambda: process_data(combat, pokemon)
+
+        def setup_type_advantage(n=n):
+            battle_data = processed(n)
+            return lambda: build_type_advantage(battle_data)
+
+        def setup_pair_frame(n=n):
+            combat = synthetic_combats(pokemon, n)
+            return lambda: store.pair_frame(combat.First_pokemon, combat.Second_pokemon)
+
+        def setup_merge_dataframes(n=n):
+            combat = synthetic_combats(pokemon, n)
+            return lambda: regression.merge_dataframes(regression_pokemon, combat)
+
+        def setup_predict(n=n):
+            battle_data = battle_ready(n)
+            return lambda: gp.get_model().predict(battle_data, max_explanations=3)
+
+        yield "process_data", n, setup_process_data
+        yield "build_type_advantage", n, setup_type_advantage
+        yield "feature_store.pair_frame", n, setup_pair_frame
+        yield "regression.merge_dataframes", n, setup_merge_dataframes
+        yield "stub_model.predict", n, setup_predict
+
+
+def measure(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(timings), peak
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(sizes, repeat, only=None):
+    results = []
+    for name, rows, setup in build_cases(sizes):
+        if only and not any(pattern in name for pattern in only):
+            continue
+        result = {"name": name, "rows": rows}
+        try:
+            seconds, peak = measure(setup(), repeat)
+        except Exception as e:
+            logger.warning(f"{name} [{rows} rows] failed: {e!r}")
+            result["error"] = repr(e)
+        else:
+            result.update(
+                seconds=seconds,
+                peak_mb=peak / 2**20,
+                rows_per_sec=rows / seconds if seconds else None,
+            )
+            logger.info(
+                f"{name} [{rows:,} rows]: {seconds * 1000:,.2f} ms, "
+                f"peak {peak / 2**20:,.1f} MB, {rows / seconds:,.0f} rows/sec"
+            )
+        results.append(result)
+    return results
+
+
+def compare(before_path, after_path):
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    baseline = {(r["name"], r["rows"]): r for r in before["results"]}
+    print(f"{'case':<40}{'rows':>12}{'before ms':>14}{'after ms':>14}{'speedup':>10}")
+    for r in after["results"]:
+        old = baseline.get((r["name"], r["rows"]))
+        if old is None or "seconds" not in old or "seconds" not in r:
+            continue
+        print(
+            f"{r['name']:<40}{r['rows']:>12,}{old['seconds'] * 1000:>14,.2f}"
+            f"{r['seconds'] * 1000:>14,.2f}{old['seconds'] / r['seconds']:>9.2f}x"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--only", nargs="+", help="Only run cases whose name contains one of these"
+    )
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    gp.MODEL = gp.StubScoringModel()
+    results = run(args.sizes, args.repeat, args.only)
+    with open(args.output, "w") as f:
+        json.dump(
+            {
+                "commit": git_commit(),
+                "python": platform.python_version(),
+                "pandas": pd.__version__,
+                "numpy": np.__version__,
+                "sizes": args.sizes,
+                "repeat": args.repeat,
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+    logger.info(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
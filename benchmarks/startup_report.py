@@ -0,0 +1,92 @@
+"""
+Reports where app start-up time goes.
+
+Usage (from the repo root):
+    python -m benchmarks.startup_report
+
+Each measurement runs in a fresh interpreter so nothing is already imported:
+- import time of the app's modules and their heaviest dependencies (python -X importtime)
+- time to first paint: the first complete run of battle_simulator.py (streamlit.testing AppTest)
+- time until the background model warm-up finishes, and time to the first prediction (pressing Run)
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from logzero import logger
+
+APP_MODULES = "import helper_functions, tournament"
+MIN_IMPORT_MS = 5
+
+
+def import_times():
+    """(module, nesting depth, cumulative ms) for each import of the app modules that took MIN_IMPORT_MS or more"""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", APP_MODULES],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stderr
+    times = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth <= 1 and int(cumulative) >= MIN_IMPORT_MS * 1000:
+            times.append((name.strip(), depth, int(cumulative) / 1000))
+    return times
+
+
+def app_timings():
+    """Runs this module with --child in a fresh interpreter and returns its timings"""
+    stdout = subprocess.run(
+        [sys.executable, "-m", "benchmarks.startup_report", "--child"],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(stdout.strip().splitlines()[-1])
+
+
+def child():
+    start = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+
+    import helper_functions as hf
+
+    timings = {"imports": time.perf_counter() - start}
+    at = AppTest.from_file(os.path.abspath("battle_simulator.py"), default_timeout=120)
+    at.run()
+    timings["first_paint"] = time.perf_counter() - start
+    hf.start_model_warmup().join()
+    timings["model_warm"] = time.perf_counter() - start
+    at.button[0].click().run()
+    timings["first_prediction"] = time.perf_counter() - start
+    print(json.dumps(timings))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child()
+        return
+
+    logger.info("Import time (cumulative):")
+    for name, depth, ms in import_times():
+        logger.info(f"{'  ' * depth}{name}: {ms:,.0f} ms")
+    timings = app_timings()
+    logger.info(
+        f"App modules imported after {timings['imports']:.2f}s, first paint after {timings['first_paint']:.2f}s, "
+        f"model warm after {timings['model_warm']:.2f}s, first prediction after {timings['first_prediction']:.2f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""
+Shared loading of the raw CSVs for the app and the dataset builders.
+
+Each CSV is compiled once into a directory of .npy column files under data/.cache and memory-mapped on later
+loads, so cold starts and builder runs skip CSV parsing. The cache is rebuilt automatically when the source
+changes: a changed size/mtime triggers a sha256 check and a changed digest triggers a rebuild.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+from logzero import logger
+
+DATA_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data"
+)
+CACHE_DIR = os.path.join(DATA_DIR, ".cache")
+POKEMON_PATH = os.path.join(DATA_DIR, "pokemon.csv")
+COMBATS_PATH = os.path.join(DATA_DIR, "combats.csv")
+
+POKEMON_BASE_COLUMNS = [
+    "id",
+    "name",
+    "type_1",
+    "type_2",
+    "hp",
+    "attack",
+    "defense",
+    "sp_attack",
+    "sp_defense",
+    "speed",
+    "generation",
+    "legendary",
+]
+
+# Header of data/pokemon.csv, for outputs that keep the original column names
+POKEMON_CSV_COLUMNS = [
+    "#",
+    "Name",
+    "Type 1",
+    "Type 2",
+    "HP",
+    "Attack",
+    "Defense",
+    "Sp. Atk",
+    "Sp. Def",
+    "Speed",
+    "Generation",
+    "Legendary",
+]
+
+COMPILE_CHUNK_ROWS = 200_000
+
+_FINGERPRINTS = {}
+
+
+def file_fingerprint(path):
+    """
+    sha256 of a file on disk. Digests are memoised on (size, mtime) so repeat calls only cost a stat.
+    Returns None when the file does not exist.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    stamp = (stat.st_size, stat.st_mtime_ns)
+    cached = _FINGERPRINTS.get(path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    _FINGERPRINTS[path] = (stamp, digest.hexdigest())
+    return digest.hexdigest()
+
+
+def _chunks(path, columns, **kwargs):
+    # header=0 with names swaps the CSV's header for columns, renaming positionally
+    renamed = {} if columns is None else {"header": 0, "names": columns}
+    return pd.read_csv(path, chunksize=COMPILE_CHUNK_ROWS, **renamed, **kwargs)
+
+
+def _merge_dtype(a, b):
+    """The dtype read_csv infers for a whole column whose chunks read as a and b; None for strings"""
+    if a is None or b is None:
+        return None
+    if pd.api.types.is_bool_dtype(a) or pd.api.types.is_bool_dtype(b):
+        return a if a == b else None
+    return np.result_type(a, b)
+
+
+def _scan(path, columns):
+    """Column names, row count and each column's numeric dtype (None for strings), a chunk at a time"""
+    names, rows, dtypes = None, 0, None
+    for chunk in _chunks(path, columns):
+        chunk_dtypes = [
+            dtype if pd.api.types.is_numeric_dtype(dtype) else None
+            for dtype in chunk.dtypes
+        ]
+        if names is None:
+            names, dtypes = list(chunk.columns), chunk_dtypes
+        else:
+            dtypes = [_merge_dtype(a, b) for a, b in zip(dtypes, chunk_dtypes)]
+        rows += len(chunk)
+    return names, rows, dtypes
+
+
+def _compile(path, columns, directory):
+    """
+    Writes each column of the CSV to directory as .npy, reading COMPILE_CHUNK_ROWS rows at a time so
+    memory stays bounded: one pass for the dtypes, one for the string widths and one to fill the files.
+    """
+    names, rows, dtypes = _scan(path, columns)
+    strings = [name for name, dtype in zip(names, dtypes) if dtype is None]
+    widths = dict.fromkeys(strings, 1)
+    if strings:
+        for chunk in _chunks(path, columns, usecols=strings, dtype=str):
+            for name in strings:
+                longest = chunk[name].fillna("").str.len().max()
+                if pd.notna(longest):
+                    widths[name] = max(widths[name], int(longest))
+
+    os.makedirs(directory, exist_ok=True)
+    layout, outputs = [], {}
+    for i, (name, dtype) in enumerate(zip(names, dtypes)):
+        column_path = os.path.join(directory, f"{i}.npy")
+        if dtype is None:
+            # Fixed-width unicode keeps strings memory-mappable, with missing values in a separate mask
+            values = np.lib.format.open_memmap(
+                column_path, mode="w+", dtype=f"<U{widths[name]}", shape=(rows,)
+            )
+            missing = np.lib.format.open_memmap(
+                os.path.join(directory, f"{i}.missing.npy"),
+                mode="w+",
+                dtype=bool,
+                shape=(rows,),
+            )
+            outputs[name] = (values, missing)
+            layout.append({"name": name, "kind": "string"})
+        else:
+            values = np.lib.format.open_memmap(
+                column_path, mode="w+", dtype=dtype, shape=(rows,)
+            )
+            outputs[name] = (values, None)
+            layout.append({"name": name, "kind": "numeric"})
+
+    start = 0
+    for chunk in _chunks(path, columns, dtype=dict.fromkeys(strings, str)):
+        end = start + len(chunk)
+        for name, (values, missing) in outputs.items():
+            if missing is None:
+                values[start:end] = chunk[name].to_numpy()
+            else:
+                missing[start:end] = chunk[name].isna().to_numpy()
+                values[start:end] = chunk[name].fillna("").to_list()
+        start = end
+    for values, missing in outputs.values():
+        values.flush()
+        if missing is not None:
+            missing.flush()
+    return layout
+
+
+def _read(meta):
+    directory = os.path.join(CACHE_DIR, meta["directory"])
+    columns = {}
+    for i, column in enumerate(meta["columns"]):
+        # Copy-on-write: columns are writable, and writes stay in memory rather than reaching the cache.
+        # A plain ndarray view of the map, so callers never see the memmap subclass
+        values = np.load(os.path.join(directory, f"{i}.npy"), mmap_mode="c").view(
+            np.ndarray
+        )
+        if column["kind"] == "string":
+            missing = np.load(os.path.join(directory, f"{i}.missing.npy"))
+            values = values.astype(object)
+            values[missing] = np.nan
+            # Let pandas infer the string dtype exactly as read_csv would
+            values = pd.Series(values.tolist())
+        columns[column["name"]] = values
+    return pd.DataFrame(columns, copy=False)
+
+
+def _cache_name(source):
+    # Keyed on the resolved path, so same-named CSVs in different directories get separate caches
+    return "-".join(
+        [
+            os.path.splitext(os.path.basename(source))[0],
+            hashlib.sha256(source.encode()).hexdigest()[:12],
+        ]
+    )
+
+
+def _cached(path, columns):
+    """The cache manifest of path, compiling or refreshing the cache first if needed"""
+    source = os.path.realpath(path)
+    name = _cache_name(source)
+    pointer = os.path.join(CACHE_DIR, f"{name}.json")
+    stat = os.stat(source)
+    stamp = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    meta = None
+    if os.path.exists(pointer):
+        with open(pointer) as f:
+            meta = json.load(f)
+    if meta is not None and (meta["source"] != source or meta["renamed"] != columns):
+        meta = None
+    if meta is not None and meta["stamp"] == stamp:
+        return meta
+
+    digest = file_fingerprint(source)
+    if meta is None or meta["sha256"] != digest:
+        logger.info(f"Compiling {path} into {CACHE_DIR}")
+        stale = None if meta is None else meta["directory"]
+        directory = f"{name}-{digest[:16]}"
+        meta = {
+            "source": source,
+            "sha256": digest,
+            "renamed": columns,
+            "directory": directory,
+            "columns": _compile(source, columns, os.path.join(CACHE_DIR, directory)),
+        }
+        if stale is not None and stale != meta["directory"]:
+            shutil.rmtree(os.path.join(CACHE_DIR, stale), ignore_errors=True)
+    meta["stamp"] = stamp
+    # Swapping the pointer last means concurrent readers only ever see a complete cache
+    with open(pointer + f".{os.getpid()}.tmp", "w") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(pointer + f".{os.getpid()}.tmp", pointer)
+    return meta
+
+
+def load_csv(path, columns=None):
+    """
+    Loads path through the binary column cache. columns renames the CSV's columns positionally.
+    Numeric columns come back memory-mapped copy-on-write.
+    """
+    return _read(_cached(path, columns))
+
+
+def count_rows(path):
+    """Number of rows of path, from its column cache without loading any columns"""
+    meta = _cached(path, None)
+    first = os.path.join(CACHE_DIR, meta["directory"], "0.npy")
+    return len(np.load(first, mmap_mode="r"))
+
+
+def remove_cache(path):
+    """Deletes the column cache of path, e.g. for a temporary CSV"""
+    pointer = os.path.join(CACHE_DIR, f"{_cache_name(os.path.realpath(path))}.json")
+    if not os.path.exists(pointer):
+        return
+    with open(pointer) as f:
+        meta = json.load(f)
+    os.remove(pointer)
+    shutil.rmtree(os.path.join(CACHE_DIR, meta["directory"]), ignore_errors=True)
+
+
+def load_pokemon(path=POKEMON_PATH):
+    return load_csv(path, columns=POKEMON_BASE_COLUMNS)
+
+
+def load_combats(path=COMBATS_PATH):
+    return load_csv(path)
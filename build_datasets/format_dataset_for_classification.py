@@ -1,7 +1,31 @@
+import argparse
+import glob
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from logzero import logger
 
+from build_datasets.data_loading import (
+    COMBATS_PATH,
+    DATA_DIR,
+    POKEMON_PATH,
+    count_rows,
+    load_combats,
+    load_csv,
+    load_pokemon,
+)
+from build_datasets.incremental import Checkpoint, read_new_rows
+
+TRAIN_CSV = os.path.join(DATA_DIR, "pokemon_combat_classifier - train.csv")
+TRAIN_PARQUET = os.path.join(DATA_DIR, "pokemon_combat_classifier - train.parquet")
+TEST_PARQUET = os.path.join(DATA_DIR, "pokemon_combat_classifier - test.parquet")
+SHARD_ROWS = 500_000
+
 CONTINUOUS_COLUMNS = [
     "hp",
     "attack",
@@ -30,35 +54,34 @@ TYPE_ADVANTAGES = {
     "steel": ["ice", "rock", "fairy"],
     "ground": ["rock", "fire", "electric", "poison"],
     "flying": ["grass", "fighting", "bug"],
+    "none": [],
 }
 
+TYPE_CODES = {name: code for code, name in enumerate(TYPE_ADVANTAGES)}
+
+# TYPE_ADVANTAGE_MATRIX[attacker, defender] is 1 when attacker is strong against defender
+TYPE_ADVANTAGE_MATRIX = np.zeros((len(TYPE_CODES), len(TYPE_CODES)), dtype=np.int8)
+for _attacker, _defenders in TYPE_ADVANTAGES.items():
+    for _defender in _defenders:
+        TYPE_ADVANTAGE_MATRIX[TYPE_CODES[_attacker], TYPE_CODES[_defender]] = 1
+
 
 def read_data():
-    pokemon = pd.read_csv("../data/pokemon.csv")
-    pokemon.columns = [
-        "id",
-        "name",
-        "type_1",
-        "type_2",
-        "hp",
-        "attack",
-        "defense",
-        "sp_attack",
-        "sp_defense",
-        "speed",
-        "generation",
-        "legendary",
-    ]
-    combat = pd.read_csv("../data/combats.csv")
-    combat_test = pd.read_csv("../data/tests.csv")
+    pokemon = load_pokemon()
+    combat = load_combats()
+    combat_test = load_csv(os.path.join(DATA_DIR, "tests.csv"))
     return pokemon, combat, combat_test
 
 
-def process_data(combat, pokemon, is_training_data=True):
-    pokemon = pokemon.assign(
+def prepare_roster(pokemon):
+    return pokemon.assign(
         Multi_Type=np.where(pd.isna(pokemon["type_2"]), False, True),
         type_2=np.where(pd.isna(pokemon["type_2"]), "None", pokemon["type_2"]),
     )
+
+
+def process_data(combat, pokemon, is_training_data=True):
+    pokemon = prepare_roster(pokemon)
     pokemon1 = pokemon.copy()
     pokemon2 = pokemon.copy()
     pokemon1.columns = ["id"] + ["pokemon_1_" + c for c in pokemon1.columns[1:]]
@@ -86,52 +109,265 @@ def process_data(combat, pokemon, is_training_data=True):
     return combat_full
 
 
+def encode_types(values):
+    """Maps type names (any case, missing -> "none") to their row in TYPE_ADVANTAGE_MATRIX"""
+    codes, uniques = pd.factorize(pd.Series(values))
+    try:
+        # Only the handful of distinct spellings go through Python, the rows are a gather
+        lookup = np.array(
+            [TYPE_CODES[str(value).lower()] for value in uniques] + [TYPE_CODES["none"]],
+            dtype=np.int8,
+        )
+    except KeyError as e:
+        raise KeyError(f"Unknown pokemon type {e}") from None
+    return lookup[codes]
+
+
+def type_advantage_from_codes(t11, t12, t21, t22):
+    """
+    Count of pokemon 1 types that pokemon 1 is strong against, minus the reverse, offset by 3.
+    Arguments are arrays of type codes from encode_types.
+    """
+    adv = TYPE_ADVANTAGE_MATRIX
+    advantage = (adv[t11, t21] | adv[t12, t21]) + (adv[t11, t22] | adv[t12, t22])
+    disadvantage = (adv[t21, t11] | adv[t22, t11]) + (adv[t21, t12] | adv[t22, t12])
+    return 3 + advantage.astype(np.int64) - disadvantage
+
+
 def build_type_advantage(df):
-    temp = (
-        df[
-            [
-                "pokemon_1_type_1",
-                "pokemon_1_type_2",
-                "pokemon_2_type_1",
-                "pokemon_2_type_2",
-            ]
-        ]
-        .copy()
-        .fillna("none")
+    return type_advantage_from_codes(
+        encode_types(df["pokemon_1_type_1"]),
+        encode_types(df["pokemon_1_type_2"]),
+        encode_types(df["pokemon_2_type_1"]),
+        encode_types(df["pokemon_2_type_2"]),
     )
-    for col in temp.columns:
-        temp[col] = temp[col].str.lower()
-
-    t11, t12, t21, t22 = (
-        temp.pokemon_1_type_1,
-        temp.pokemon_1_type_2,
-        temp.pokemon_2_type_1,
-        temp.pokemon_2_type_2,
+
+
+def compact_dtypes(battle_data, pokemon):
+    """
+    Categorical names/types and narrow ints. Categories come from the roster rather than the data,
+    so every chunk of a partitioned dataset shares one schema.
+    """
+    names = pd.CategoricalDtype(pokemon.name.dropna().unique())
+    types = pd.CategoricalDtype(
+        sorted(set(pokemon.type_1) | set(pokemon.type_2.dropna())) + ["None"]
     )
+    dtypes = {}
+    for column in battle_data.columns:
+        if column.endswith("_name"):
+            dtypes[column] = names
+        elif column.endswith(("_type_1", "_type_2")):
+            dtypes[column] = types
+        elif column.endswith("_generation") or column == "type_advantage":
+            dtypes[column] = "int8"
+        elif pd.api.types.is_integer_dtype(battle_data[column]):
+            dtypes[column] = "int16"
+    return battle_data.astype(dtypes)
+
+
+def _clear_parts(output_dir):
+    os.makedirs(output_dir, exist_ok=True)
+    for stale in glob.glob(os.path.join(output_dir, "part-*.parquet")):
+        os.remove(stale)
+
+
+def _write_part(combat, pokemon, output_dir, part, is_training_data):
+    battle_data = process_data(combat, pokemon, is_training_data=is_training_data)
+    battle_data["type_advantage"] = build_type_advantage(battle_data)
+    table = pa.Table.from_pandas(
+        compact_dtypes(battle_data, pokemon), preserve_index=False
+    )
+    pq.write_table(table, os.path.join(output_dir, f"part-{part:05d}.parquet"))
+    return len(battle_data)
+
+
+def write_partitioned(
+    combat_path, pokemon, output_dir, chunksize, is_training_data=True
+):
+    """
+    Processes combat_path chunksize rows at a time against the in-memory roster and writes one Parquet
+    file per chunk to output_dir, so peak memory depends on chunksize and not on the size of the log.
+    """
+    _clear_parts(output_dir)
+    rows = 0
+    for part, combat in enumerate(pd.read_csv(combat_path, chunksize=chunksize)):
+        rows += _write_part(combat, pokemon, output_dir, part, is_training_data)
+        logger.info(f"Wrote {rows:,} rows to {output_dir}")
 
-    t_adv = []
-    for h, i, j, k in zip(t11, t12, t21, t22):
-        counter = 3
-        advantage_types = list(
-            set(TYPE_ADVANTAGES[h] + TYPE_ADVANTAGES.get(i, ["none"]))
-        )
-        disadvantage_types = list(
-            set(TYPE_ADVANTAGES[j] + TYPE_ADVANTAGES.get(k, ["none"]))
-        )
-        if j in advantage_types:
-            counter += 1
-        if k in advantage_types:
-            counter += 1
-        if h in disadvantage_types:
-            counter -= 1
-        if i in disadvantage_types:
-            counter -= 1
-        t_adv.append(counter)
 
-    return t_adv
+# Per-process state of write_partitioned_parallel workers
+_SHARD_INPUTS = {}
+
+
+def _init_shard_worker(combat_path, pokemon_path):
+    # Both come back as views of the data/.cache memory maps, so workers share the parent's pages
+    _SHARD_INPUTS["pokemon"] = load_pokemon(pokemon_path)
+    _SHARD_INPUTS["combat"] = load_csv(combat_path)
+
+
+def _process_shard(task):
+    part, start, stop, output_dir, is_training_data = task
+    combat = _SHARD_INPUTS["combat"].iloc[start:stop].reset_index(drop=True)
+    return _write_part(
+        combat, _SHARD_INPUTS["pokemon"], output_dir, part, is_training_data
+    )
+
+
+def write_partitioned_parallel(
+    combat_path,
+    output_dir,
+    chunksize,
+    workers,
+    is_training_data=True,
+    pokemon_path=POKEMON_PATH,
+):
+    """
+    write_partitioned across a pool of worker processes. The log is split into chunksize-row shards, and
+    shard i is always written as part i, so the dataset is identical for any number of workers.
+    Workers read the roster and the log from the memory-mapped column cache instead of receiving pickles.
+    """
+    # Compile the caches once up front so the workers only ever map them. Compiling reads the log in chunks
+    # and the parent only needs its row count, so the log is never loaded here
+    load_pokemon(pokemon_path)
+    total = count_rows(combat_path)
+    _clear_parts(output_dir)
+    tasks = [
+        (part, start, min(start + chunksize, total), output_dir, is_training_data)
+        for part, start in enumerate(range(0, total, chunksize))
+    ]
+    rows = 0
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_shard_worker,
+        initargs=(combat_path, pokemon_path),
+    ) as pool:
+        for written in pool.map(_process_shard, tasks):
+            rows += written
+            logger.info(f"Wrote {rows:,} rows to {output_dir}")
+
+
+def load_partitioned(output_dir, as_pandas=True):
+    """
+    Reloads a dataset written by write_partitioned. Files are memory-mapped rather than read into buffers,
+    and names/types stay dictionary-encoded (Categorical) instead of being expanded to strings.
+    """
+    table = pq.read_table(output_dir, memory_map=True)
+    return table.to_pandas() if as_pandas else table
+
+
+def _output_state(output, parquet):
+    # What the checkpoint expects to find on disk; anything else means the output was rebuilt or a run died
+    if parquet:
+        return len(glob.glob(os.path.join(output, "part-*.parquet")))
+    return os.path.getsize(output) if os.path.exists(output) else 0
+
+
+def update_training_data(log, pokemon, parquet=False):
+    """
+    Appends the combats added to log since the last run to the training set (CSV, or new part files of the
+    Parquet dataset). Starts over when pokemon.csv, an already processed segment or the output changed.
+    """
+    output = TRAIN_PARQUET if parquet else TRAIN_CSV
+    checkpoint = Checkpoint("classification-parquet" if parquet else "classification")
+    if not checkpoint.is_valid(log) or checkpoint.state.get("output") != _output_state(
+        output, parquet
+    ):
+        logger.info(f"Rebuilding {output} from scratch")
+        if os.path.isdir(output):
+            shutil.rmtree(output)
+        elif os.path.exists(output):
+            os.remove(output)
+        checkpoint.reset(log)
+        checkpoint.state["output"] = _output_state(output, parquet)
+        checkpoint.save()
+
+    for segment, combat, offset in read_new_rows(log, checkpoint):
+        battle_data = process_data(combat, pokemon)
+        battle_data["type_advantage"] = build_type_advantage(battle_data)
+        if parquet:
+            os.makedirs(output, exist_ok=True)
+            table = pa.Table.from_pandas(
+                compact_dtypes(battle_data, pokemon), preserve_index=False
+            )
+            part = checkpoint.state["output"]
+            pq.write_table(table, os.path.join(output, f"part-{part:05d}.parquet"))
+        else:
+            battle_data.to_csv(
+                output, mode="a", header=not os.path.exists(output), index=False
+            )
+        checkpoint.state["output"] = _output_state(output, parquet)
+        checkpoint.advance(segment, offset, len(combat))
+        checkpoint.save()
+        logger.info(f"Appended {len(combat):,} combats from {segment}")
+    logger.info(f"{output} covers {checkpoint.rows:,} combats")
 
 
 def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        help="Stream the combat logs in chunks of this many rows into partitioned Parquet",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help=f"Build the partitioned Parquet datasets with this many processes "
+        f"(shards of --chunksize rows, default {SHARD_ROWS:,})",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only append combats added to the log since the last incremental run "
+        "to the training set (Parquet when --chunksize is given)",
+    )
+    parser.add_argument(
+        "--log",
+        default=COMBATS_PATH,
+        help="combats.csv, or a directory of CSV log segments (with --incremental)",
+    )
+    args = parser.parse_args()
+
+    if args.incremental:
+        logger.info("Updating training data...")
+        update_training_data(args.log, load_pokemon(), parquet=bool(args.chunksize))
+        return
+
+    if args.workers > 1:
+        for combat_path, output_dir, is_training_data in [
+            (COMBATS_PATH, TRAIN_PARQUET, True),
+            (os.path.join(DATA_DIR, "tests.csv"), TEST_PARQUET, False),
+        ]:
+            logger.info(f"Processing {combat_path} with {args.workers} workers...")
+            write_partitioned_parallel(
+                combat_path,
+                output_dir,
+                args.chunksize or SHARD_ROWS,
+                args.workers,
+                is_training_data=is_training_data,
+            )
+        return
+
+    if args.chunksize:
+        pokemon = load_pokemon()
+        logger.info("Processing training data...")
+        write_partitioned(
+            os.path.join(DATA_DIR, "combats.csv"),
+            pokemon,
+            TRAIN_PARQUET,
+            args.chunksize,
+        )
+        logger.info("Processing scoring data...")
+        write_partitioned(
+            os.path.join(DATA_DIR, "tests.csv"),
+            pokemon,
+            TEST_PARQUET,
+            args.chunksize,
+            is_training_data=False,
+        )
+        return
+
     logger.info("Reading data...")
     pokemon, combat, test_data = read_data()
     logger.info("Processing training data...")
@@ -141,8 +377,10 @@ def main():
     scoring_data["type_advantage"] = build_type_advantage(scoring_data)
 
     logger.info("Saving data...")
-    training_data.to_csv("../data/pokemon_combat_classifier - train.csv", index=False)
-    scoring_data.to_csv("../data/pokemon_combat_classifier - test.csv", index=False)
+    training_data.to_csv(TRAIN_CSV, index=False)
+    scoring_data.to_csv(
+        os.path.join(DATA_DIR, "pokemon_combat_classifier - test.csv"), index=False
+    )
 
 
 if __name__ == "__main__":
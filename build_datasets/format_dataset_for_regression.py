@@ -1,67 +1,153 @@
+import argparse
+import os
+
 import numpy as np
 import pandas as pd
 from logzero import logger
 
+from build_datasets.data_loading import (
+    COMBATS_PATH,
+    DATA_DIR,
+    POKEMON_BASE_COLUMNS,
+    POKEMON_CSV_COLUMNS,
+    load_combats,
+    load_pokemon,
+)
+from build_datasets.incremental import Checkpoint, read_new_rows
+
 # Much of the preprocessing code lovingly borrowed from a friendly kaggler: https://www.kaggle.com/balams/pokemon-regression-model-beginners/notebook
 
 
 def read_data():
-    pokemon = pd.read_csv("data/pokemon.csv").rename(columns={"#": "index"})
-    combat = pd.read_csv("data/combats.csv")
+    pokemon = load_pokemon().rename(columns={"id": "index"})
+    combat = load_combats()
     return pokemon, combat
 
 
-def build_combat_occurence_dataframe(combat):
-    # Combat occurences
-    # Count occurences where pokemon is first
-    FirstCombat = combat.First_pokemon.value_counts().reset_index(name="FirstCombat")
-    # Count occurences where pokemon is second
-    SecondCombat = combat.Second_pokemon.value_counts().reset_index(name="SecondCombat")
-    TotalCombat = pd.merge(FirstCombat, SecondCombat, how="left", on="index")
-    # Count total occurences with pokemon
-    TotalCombat["TotalMatch"] = TotalCombat["FirstCombat"] + TotalCombat["SecondCombat"]
-    return TotalCombat
-
-
-def build_match_win_dataframe(combat):
-    # Match winning details
-    FirstWin = (
-        combat["First_pokemon"][combat["First_pokemon"] == combat["Winner"]]
-        .value_counts()
-        .reset_index(name="FirstWin")
-    )
-    SecondWin = (
-        combat["Second_pokemon"][combat["Second_pokemon"] == combat["Winner"]]
-        .value_counts()
-        .reset_index(name="SecondWin")
-    )
-    TotalWin = pd.merge(FirstWin, SecondWin, how="left", on="index")
-    TotalWin["TotalWin"] = TotalWin["FirstWin"] + TotalWin["SecondWin"]
-    return TotalWin
+COUNT_CHUNK = 10_000_000
+COUNT_NAMES = ("FirstCombat", "SecondCombat", "FirstWin", "SecondWin")
+
+
+def count_combats(combat, size):
+    """
+    Per-pokemon FirstCombat, SecondCombat, FirstWin and SecondWin counts over the roster id space [0, size),
+    by bincount over the combat id arrays. Pokemon that never appear in a role count 0 there.
+    Large logs are counted in slices so temporaries stay bounded.
+    """
+    first = combat["First_pokemon"].to_numpy()
+    second = combat["Second_pokemon"].to_numpy()
+    winner = combat["Winner"].to_numpy()
+    counts = {name: np.zeros(size, dtype=np.int64) for name in COUNT_NAMES}
+    for start in range(0, len(first), COUNT_CHUNK):
+        f = first[start : start + COUNT_CHUNK]
+        s = second[start : start + COUNT_CHUNK]
+        w = winner[start : start + COUNT_CHUNK]
+        counts["FirstCombat"] += np.bincount(f, minlength=size)
+        counts["SecondCombat"] += np.bincount(s, minlength=size)
+        counts["FirstWin"] += np.bincount(f[f == w], minlength=size)
+        counts["SecondWin"] += np.bincount(s[s == w], minlength=size)
+    return counts
+
+
+def assign_counts(pokemon, counts):
+    ids = pokemon["index"].to_numpy()
+    return pokemon.assign(
+        FirstCombat=counts["FirstCombat"][ids],
+        SecondCombat=counts["SecondCombat"][ids],
+        TotalMatch=(counts["FirstCombat"] + counts["SecondCombat"])[ids],
+        FirstWin=counts["FirstWin"][ids],
+        SecondWin=counts["SecondWin"][ids],
+        TotalWin=(counts["FirstWin"] + counts["SecondWin"])[ids],
+    ).drop(columns="index")
 
 
 def merge_dataframes(pokemon, combat):
-    combat_occurence = build_combat_occurence_dataframe(combat)
-    match_win = build_match_win_dataframe(combat)
-    pokemon = pokemon.merge(combat_occurence, how="left", on="index")
-    pokemon = pokemon.merge(match_win, how="left", on="index")
-    return pokemon.drop(columns="index")
+    size = int(
+        max(
+            pokemon["index"].max(),
+            combat["First_pokemon"].max(),
+            combat["Second_pokemon"].max(),
+        )
+        + 1
+    )
+    return assign_counts(pokemon, count_combats(combat, size))
+
+
+def update_counts(log, size):
+    """
+    Adds the combats appended to log since the last run to the counters kept in the checkpoint,
+    recounting from scratch when pokemon.csv or an already counted segment changed.
+    """
+    checkpoint = Checkpoint("regression")
+    if not checkpoint.is_valid(log):
+        logger.info("Counting the combat log from scratch")
+        checkpoint.reset(log)
+    stored = checkpoint.state.get("counts", {})
+    counts = {
+        name: np.array(stored.get(name, np.zeros(size)), dtype=np.int64)
+        for name in COUNT_NAMES
+    }
+    for segment, combat, offset in read_new_rows(log, checkpoint):
+        size = int(
+            max(
+                len(counts["FirstCombat"]),
+                combat["First_pokemon"].max() + 1,
+                combat["Second_pokemon"].max() + 1,
+            )
+        )
+        new = count_combats(combat, size)
+        for name, values in new.items():
+            values[: len(counts[name])] += counts[name]
+        counts = new
+        checkpoint.state["counts"] = {
+            name: values.tolist() for name, values in counts.items()
+        }
+        checkpoint.advance(segment, offset, len(combat))
+        checkpoint.save()
+    logger.info(f"Counted {checkpoint.rows:,} combats")
+    return counts
 
 
 def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only count combats appended to the log since the last incremental run",
+    )
+    parser.add_argument(
+        "--log",
+        default=COMBATS_PATH,
+        help="combats.csv, or a directory of CSV log segments (with --incremental)",
+    )
+    args = parser.parse_args()
+
     logger.info("Reading data...")
-    pokemon, combat = read_data()
-    logger.info("Merging dataframes...")
-    pokemon_full_df = merge_dataframes(pokemon, combat)
+    if args.incremental:
+        # The log itself is never loaded whole, only the rows past the checkpoint
+        pokemon = load_pokemon().rename(columns={"id": "index"})
+        logger.info("Updating combat counts...")
+        pokemon_full_df = assign_counts(
+            pokemon, update_counts(args.log, int(pokemon["index"].max()) + 1)
+        )
+    else:
+        pokemon, combat = read_data()
+        logger.info("Merging dataframes...")
+        pokemon_full_df = merge_dataframes(pokemon, combat)
     pokemon_full_df = pokemon_full_df.assign(
-        Multi_Type=np.where(pd.isna(pokemon_full_df["Type 2"]), False, True),
+        Multi_Type=np.where(pd.isna(pokemon_full_df["type_2"]), False, True),
         winning_percentage=np.round(
             pokemon_full_df["TotalWin"] / pokemon_full_df["TotalMatch"] * 100, 2
         ),
     ).drop(columns=["FirstWin", "SecondWin", "TotalWin", "TotalMatch"])
-    pokemon_full_df["Type 2"].fillna("Not Applicable", inplace=True)
+    pokemon_full_df["type_2"] = pokemon_full_df["type_2"].fillna("Not Applicable")
     logger.info("Saving modeling dataframe...")
-    pokemon_full_df.to_csv("data/pokemon_win_rate_regressor - train.csv", index=False)
+    # The training file keeps the column names of data/pokemon.csv
+    pokemon_full_df.rename(
+        columns=dict(zip(POKEMON_BASE_COLUMNS, POKEMON_CSV_COLUMNS))
+    ).to_csv(
+        os.path.join(DATA_DIR, "pokemon_win_rate_regressor - train.csv"), index=False
+    )
 
 
 if __name__ == "__main__":
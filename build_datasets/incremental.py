@@ -0,0 +1,115 @@
+"""
+Checkpointing for incremental dataset rebuilds over append-only combat logs.
+
+A checkpoint records, for every log segment (combats.csv or each CSV in a directory of segments), how many
+bytes have been processed, plus the fingerprint of pokemon.csv the outputs were built against.
+Builders only read rows past the recorded offsets. If pokemon.csv changes, or a segment shrinks or is
+rewritten, the checkpoint is reset and the builder starts over.
+"""
+
+import glob
+import hashlib
+import io
+import json
+import os
+
+import pandas as pd
+
+from build_datasets.data_loading import DATA_DIR, POKEMON_PATH, file_fingerprint
+
+CHECKPOINT_DIR = os.path.join(DATA_DIR, ".checkpoints")
+BLOCK_SIZE = 64 << 20
+HEAD_BYTES = 1 << 16
+
+
+def log_segments(source):
+    """combats.csv itself, or the CSV segments of a log directory in name order"""
+    if os.path.isdir(source):
+        return sorted(
+            os.path.abspath(p) for p in glob.glob(os.path.join(source, "*.csv"))
+        )
+    return [os.path.abspath(source)]
+
+
+def _head_digest(path, length):
+    # Identifies a segment by its first bytes, so a log replaced by a different one is not mistaken for growth.
+    # Only bytes already processed are hashed: rows appended to a short segment must not change its digest
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read(length)).hexdigest()
+
+
+class Checkpoint:
+    def __init__(self, name):
+        self.path = os.path.join(CHECKPOINT_DIR, f"{name}.json")
+        self.state = {}
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                self.state = json.load(f)
+
+    @property
+    def segments(self):
+        return self.state.setdefault("segments", {})
+
+    def is_valid(self, source, pokemon_path=POKEMON_PATH):
+        """False when the outputs must be rebuilt from scratch"""
+        if self.state.get("pokemon") != file_fingerprint(pokemon_path):
+            return False
+        if self.state.get("source") != os.path.abspath(source):
+            return False
+        for segment, progress in self.segments.items():
+            if (
+                not os.path.exists(segment)
+                or os.path.getsize(segment) < progress["offset"]
+            ):
+                return False
+            head_bytes = progress.get("head_bytes", HEAD_BYTES)
+            if _head_digest(segment, head_bytes) != progress["head"]:
+                return False
+        return True
+
+    def reset(self, source, pokemon_path=POKEMON_PATH):
+        self.state = {
+            "pokemon": file_fingerprint(pokemon_path),
+            "source": os.path.abspath(source),
+            "segments": {},
+        }
+
+    def advance(self, segment, offset, rows):
+        progress = self.segments.setdefault(segment, {"offset": 0, "rows": 0})
+        progress["offset"] = offset
+        progress["rows"] += rows
+        progress["head_bytes"] = min(offset, HEAD_BYTES)
+        progress["head"] = _head_digest(segment, progress["head_bytes"])
+
+    @property
+    def rows(self):
+        return sum(progress["rows"] for progress in self.segments.values())
+
+    def save(self):
+        os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+        with open(self.path + ".tmp", "w") as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(self.path + ".tmp", self.path)
+
+
+def read_new_rows(source, checkpoint, block_size=BLOCK_SIZE):
+    """
+    Yields (segment, combat rows, end offset) for every complete line past the checkpoint, block_size bytes
+    at a time. A trailing line without a newline is left for the next run, in case it is still being written.
+    """
+    for segment in log_segments(source):
+        progress = checkpoint.segments.get(segment, {"offset": 0})
+        with open(segment, "rb") as f:
+            header = f.readline()
+            names = header.decode().strip().split(",")
+            offset = max(progress["offset"], len(header))
+            f.seek(offset)
+            while True:
+                block = f.read(block_size)
+                end = block.rfind(b"\n") + 1
+                if end == 0:
+                    break
+                f.seek(offset + end)
+                combat = pd.read_csv(io.BytesIO(block[:end]), names=names, header=None)
+                offset += end
+                yield segment, combat, offset
@@ -0,0 +1,210 @@
+"""
+Precomputes the win probability of every roster pairing so the app can answer roster battles by index lookup.
+
+Usage (from the repo root):
+    python -m build_datasets.matchup_matrix
+
+Arrays are indexed by roster id, i.e. probabilities[First_pokemon, Second_pokemon], and are memory-mapped on load.
+The manifest records fingerprints of pokemon.csv and model.jar; a matrix built from other files is ignored.
+"""
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from logzero import logger
+
+import get_predictions as gp
+from build_datasets.data_loading import DATA_DIR, POKEMON_PATH, load_pokemon
+from build_datasets.format_dataset_for_classification import (
+    build_type_advantage,
+    process_data,
+)
+
+MATCHUP_DIR = os.path.join(DATA_DIR, "matchup_matrix")
+MANIFEST_FILE = "manifest.json"
+PROBABILITY_FILE = "win_probability.npy"
+FEATURE_FILE = "explanation_feature.npy"
+STRENGTH_FILE = "explanation_strength.npy"
+MAX_EXPLANATIONS = 3
+BATCH_SIZE = 50_000
+
+
+def source_fingerprints(pokemon_path=POKEMON_PATH):
+    return {
+        "pokemon": gp.file_fingerprint(pokemon_path),
+        "model": gp.model_version(),
+    }
+
+
+class MatchupMatrix:
+    def __init__(self, directory, manifest):
+        self.directory = directory
+        self.fingerprints = manifest["fingerprints"]
+        self.probabilities = np.load(
+            os.path.join(directory, PROBABILITY_FILE), mmap_mode="r"
+        )
+        self.features = np.load(os.path.join(directory, FEATURE_FILE), mmap_mode="r")
+        self.strengths = np.load(os.path.join(directory, STRENGTH_FILE), mmap_mode="r")
+        # Code 0 is reserved for "no explanation"
+        self.feature_names = np.array([None] + manifest["feature_names"], dtype=object)
+        self.strength_names = np.array(
+            [None] + manifest["strength_names"], dtype=object
+        )
+
+    def is_fresh(self, pokemon_path=POKEMON_PATH):
+        return self.fingerprints == source_fingerprints(pokemon_path)
+
+    def covers(self, battle_df):
+        """True when every row of battle_df is a roster-vs-roster pairing held in the matrix"""
+        if not {"First_pokemon", "Second_pokemon"}.issubset(battle_df.columns):
+            return False
+        return self.covers_pairs(battle_df.First_pokemon, battle_df.Second_pokemon)
+
+    def covers_pairs(self, first_ids, second_ids):
+        """True when every (first, second) roster id pairing is held in the matrix"""
+        first, second = np.asarray(first_ids), np.asarray(second_ids)
+        if not (
+            pd.api.types.is_integer_dtype(first.dtype)
+            and pd.api.types.is_integer_dtype(second.dtype)
+        ):
+            return False
+        size = self.probabilities.shape[0]
+        if ((first < 0) | (first >= size) | (second < 0) | (second >= size)).any():
+            return False
+        return not np.isnan(self.probabilities[first, second]).any()
+
+    def lookup(self, first_ids, second_ids):
+        """Returns predictions in the same layout as ScoringCodeModel.predict(..., max_explanations=3)"""
+        first_ids = np.asarray(first_ids)
+        second_ids = np.asarray(second_ids)
+        probability = self.probabilities[first_ids, second_ids].astype(np.float64)
+        preds = {
+            "target_True_PREDICTION": probability,
+            "target_False_PREDICTION": 1 - probability,
+        }
+        features = self.features[first_ids, second_ids]
+        strengths = self.strengths[first_ids, second_ids]
+        for k in range(MAX_EXPLANATIONS):
+            preds[f"EXPLANATION_{k + 1}_FEATURE_NAME"] = self.feature_names[
+                features[:, k]
+            ]
+            preds[f"EXPLANATION_{k + 1}_QUALITATIVE_STRENGTH"] = self.strength_names[
+                strengths[:, k]
+            ]
+        return pd.DataFrame(preds)
+
+
+_MATRIX = None
+
+
+def load_matchup_matrix(directory=MATCHUP_DIR, pokemon_path=POKEMON_PATH):
+    """
+    Returns the precomputed MatchupMatrix, or None when it has not been built or
+    pokemon.csv / model.jar changed since it was.
+    """
+    global _MATRIX
+    if (
+        _MATRIX is not None
+        and _MATRIX.directory == directory
+        and _MATRIX.is_fresh(pokemon_path)
+    ):
+        return _MATRIX
+    _MATRIX = None
+    manifest_path = os.path.join(directory, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    if manifest["fingerprints"] != source_fingerprints(pokemon_path):
+        logger.info(
+            "Matchup matrix is stale, rebuild with `python -m build_datasets.matchup_matrix`"
+        )
+        return None
+    _MATRIX = MatchupMatrix(directory, manifest)
+    return _MATRIX
+
+
+def _encode(values, vocabulary):
+    """Maps strings to uint8 codes, growing vocabulary as new values appear. Missing values map to 0."""
+    values = pd.Series(values, dtype=object)
+    for value in values.dropna().unique():
+        vocabulary.setdefault(value, len(vocabulary) + 1)
+    if len(vocabulary) > np.iinfo(np.uint8).max:
+        raise ValueError("Too many distinct explanation values for uint8 codes")
+    return values.map(vocabulary).fillna(0).to_numpy(dtype=np.uint8)
+
+
+def build_matchup_matrix(pokemon, directory=MATCHUP_DIR, batch_size=BATCH_SIZE):
+    os.makedirs(directory, exist_ok=True)
+    if os.path.exists(os.path.join(directory, MANIFEST_FILE)):
+        os.remove(os.path.join(directory, MANIFEST_FILE))
+    fingerprints = source_fingerprints()
+    ids = pokemon.id.to_numpy()
+    size = int(ids.max()) + 1
+    first, second = (grid.ravel() for grid in np.meshgrid(ids, ids, indexing="ij"))
+
+    def open_array(name, dtype, shape):
+        return np.lib.format.open_memmap(
+            os.path.join(directory, name + ".tmp"), mode="w+", dtype=dtype, shape=shape
+        )
+
+    probabilities = open_array(PROBABILITY_FILE, np.float32, (size, size))
+    probabilities[:] = np.nan
+    features = open_array(FEATURE_FILE, np.uint8, (size, size, MAX_EXPLANATIONS))
+    strengths = open_array(STRENGTH_FILE, np.uint8, (size, size, MAX_EXPLANATIONS))
+    feature_vocabulary, strength_vocabulary = {}, {}
+
+    start_time = time.perf_counter()
+    for start in range(0, len(first), batch_size):
+        f, s = first[start : start + batch_size], second[start : start + batch_size]
+        combat = pd.DataFrame({"First_pokemon": f, "Second_pokemon": s})
+        battle_data = process_data(combat, pokemon, is_training_data=False)
+        battle_data["type_advantage"] = build_type_advantage(battle_data)
+        preds = gp.get_model().predict(battle_data, max_explanations=MAX_EXPLANATIONS)
+
+        probabilities[f, s] = preds["target_True_PREDICTION"].to_numpy()
+        for k in range(MAX_EXPLANATIONS):
+            features[f, s, k] = _encode(
+                preds[f"EXPLANATION_{k + 1}_FEATURE_NAME"], feature_vocabulary
+            )
+            strengths[f, s, k] = _encode(
+                preds[f"EXPLANATION_{k + 1}_QUALITATIVE_STRENGTH"],
+                strength_vocabulary,
+            )
+        done = start + len(f)
+        logger.info(
+            f"Scored {done}/{len(first)} pairings "
+            f"({done / (time.perf_counter() - start_time):,.0f} rows/sec)"
+        )
+
+    for array in (probabilities, features, strengths):
+        array.flush()
+        os.replace(array.filename, array.filename[: -len(".tmp")])
+    del probabilities, features, strengths
+
+    # The manifest goes last so a half-written build is never picked up
+    manifest = {
+        "fingerprints": fingerprints,
+        "feature_names": list(feature_vocabulary),
+        "strength_names": list(strength_vocabulary),
+    }
+    with open(os.path.join(directory, MANIFEST_FILE + ".tmp"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(
+        os.path.join(directory, MANIFEST_FILE + ".tmp"),
+        os.path.join(directory, MANIFEST_FILE),
+    )
+
+
+def main():
+    logger.info("Reading data...")
+    pokemon = load_pokemon()
+    logger.info("Scoring all pairings...")
+    build_matchup_matrix(pokemon)
+    logger.info("Done")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Trains get_predictions.NumpyLogisticModel on the classification train set and saves it to numpy_model.npz.
+
+Every HOLDOUT_EVERY-th combat is held out of training, so benchmarks.engine_report can score the engines
+on combats the NumPy model has not seen.
+"""
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+from logzero import logger
+
+import get_predictions as gp
+from build_datasets.data_loading import load_combats, load_pokemon
+from build_datasets.format_dataset_for_classification import (
+    TRAIN_CSV,
+    TRAIN_PARQUET,
+    build_type_advantage,
+    load_partitioned,
+    process_data,
+)
+
+HOLDOUT_EVERY = 5
+
+
+def load_training_data():
+    """The built train set (Parquet, then CSV), or the combat log processed in memory when neither exists"""
+    if os.path.isdir(TRAIN_PARQUET):
+        return load_partitioned(TRAIN_PARQUET)
+    if os.path.exists(TRAIN_CSV):
+        return pd.read_csv(TRAIN_CSV)
+    logger.info("No train set built yet, processing data/combats.csv in memory")
+    training_data = process_data(load_combats(), load_pokemon())
+    training_data["type_advantage"] = build_type_advantage(training_data)
+    return training_data
+
+
+def split(training_data):
+    """(train, holdout) rows"""
+    holdout = np.arange(len(training_data)) % HOLDOUT_EVERY == 0
+    return training_data[~holdout], training_data[holdout]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output", default=gp.NUMPY_MODEL_PATH)
+    parser.add_argument("--l2", type=float, default=1e-3)
+    args = parser.parse_args()
+
+    train, holdout = split(load_training_data())
+    logger.info(f"Fitting on {len(train):,} combats...")
+    model = gp.NumpyLogisticModel.fit(train, train["pokemon_1_won"], l2=args.l2)
+    predicted = model.predict(holdout)["target_True_PREDICTION"].to_numpy() > 0.5
+    accuracy = (predicted == holdout["pokemon_1_won"].to_numpy()).mean()
+    logger.info(f"Holdout accuracy on {len(holdout):,} combats: {accuracy:.4f}")
+    model.save(args.output)
+    logger.info(f"Saved {args.output}")
+
+
+if __name__ == "__main__":
+    main()
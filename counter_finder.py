@@ -0,0 +1,82 @@
+"""
+Counter finder: which roster pokemon beat a given pokemon, and which it beats.
+
+The pokemon is paired with every other roster member in both orders, all in one vectorized pair_frame
+(or read from the precomputed matchup matrix), and scored in a single probability-only model call. The
+model scores First_pokemon vs Second_pokemon, so the two orders are averaged, as in tournament.py.
+Matchups are cached per (pokemon, model version); filters and top-k are applied to the cached result.
+"""
+
+import numpy as np
+
+import get_predictions as gp
+from build_datasets.matchup_matrix import load_matchup_matrix
+from instrumentation import METRICS
+from prediction_cache import LRUCache
+
+COUNTER_CACHE_SIZE = 256
+COUNTER_CACHE = LRUCache(maxsize=COUNTER_CACHE_SIZE)
+OPPONENT_COLUMNS = ["name", "type_1", "type_2", "generation", "legendary"]
+
+
+@METRICS.timed("counter_matchups")
+def matchups(store, name):
+    """
+    Every other named roster pokemon with win_probability, the chance that name beats it.
+    Sorted from name's best matchup to its worst.
+    """
+    key = (name, gp.model_version())
+    cached = COUNTER_CACHE.get(key)
+    if cached is not None:
+        METRICS.count("counter_cache_hit")
+        return cached
+    METRICS.count("counter_cache_miss")
+
+    row = store.index_by_name[name]
+    rows = np.flatnonzero(
+        (np.arange(len(store)) != row) & store.pokemon.name.notna().to_numpy()
+    )
+    pokemon_id = store.ids[row]
+    opponent_ids = store.ids[rows]
+    first_ids = np.concatenate([np.full(len(rows), pokemon_id), opponent_ids])
+    second_ids = np.concatenate([opponent_ids, np.full(len(rows), pokemon_id)])
+
+    matchup_matrix = load_matchup_matrix()
+    if matchup_matrix is not None and matchup_matrix.covers_pairs(
+        first_ids, second_ids
+    ):
+        preds = matchup_matrix.lookup(first_ids, second_ids)
+        first_wins = preds["target_True_PREDICTION"].to_numpy()
+    else:
+        first_wins = gp.predict_proba(store.pair_frame(first_ids, second_ids))
+    win_probability = (first_wins[: len(rows)] + 1 - first_wins[len(rows) :]) / 2
+
+    result = store.pokemon.iloc[rows][OPPONENT_COLUMNS].reset_index(drop=True)
+    result["win_probability"] = win_probability
+    result = result.sort_values(
+        "win_probability", ascending=False, kind="stable", ignore_index=True
+    )
+    COUNTER_CACHE.put(key, result)
+    return result
+
+
+def find_counters(store, name, k=10, type_=None, generation=None, legendary=None):
+    """
+    (counters, victims): the k opponents most likely to beat name, with win_probability their chance of
+    doing so, and the k name is most likely to beat, with win_probability name's chance.
+    Opponents can be limited to a type (either slot), a generation and legendary or not.
+    """
+    opponents = matchups(store, name)
+    keep = np.ones(len(opponents), dtype=bool)
+    if type_ is not None:
+        keep &= ((opponents.type_1 == type_) | (opponents.type_2 == type_)).to_numpy()
+    if generation is not None:
+        keep &= (opponents.generation == int(generation)).to_numpy()
+    if legendary is not None:
+        keep &= (opponents.legendary == bool(legendary)).to_numpy()
+    opponents = opponents[keep]
+
+    victims = opponents.head(k).reset_index(drop=True)
+    counters = opponents.iloc[::-1].head(k).reset_index(drop=True)
+    counters["win_probability"] = 1 - counters["win_probability"]
+    return counters, victims
@@ -0,0 +1,158 @@
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+
+from build_datasets.format_dataset_for_classification import (
+    CONTINUOUS_COLUMNS,
+    encode_types,
+    prepare_roster,
+    type_advantage_from_codes,
+)
+
+
+# Stats shown in the comparison chart, in chart order
+CHART_STATS = ["hp", "attack", "defense", "sp_attack", "sp_defense", "speed"]
+
+
+def _as_column(values, n):
+    """values as n rows: a single value (or one-item list) is repeated, a list of n values kept as is"""
+    if np.ndim(values) == 0:
+        values = [values]
+    if len(values) == n:
+        return values
+    if len(values) == 1:
+        # An array rather than a list: pandas converts a long Python list element by element
+        return np.repeat(np.array(values), n)
+    raise ValueError(f"Got {len(values)} values for {n} custom pokemon")
+
+
+def _truthy(values):
+    """bool() of each value, worked out once per distinct value"""
+    values = np.asarray(values)
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    truthy = np.array([bool(value) for value in uniques], dtype=bool)[codes]
+    # factorize reads None as NaN, but unlike bool(NaN), bool(None) is False
+    truthy[np.equal(values, None)] = False
+    return truthy
+
+
+class RosterFeatureStore:
+    """
+    Per-pokemon model features, indexed once so battle rows can be assembled by row gather.
+    pair_frame is column-identical to process_data(..., is_training_data=False) plus type_advantage,
+    custom_pair_frame to the frame process_for_custom_battle has always built.
+    """
+
+    def __init__(self, pokemon):
+        self.pokemon = pokemon
+        self.ids = pokemon.id.to_numpy()
+        self.index_by_name = {name: i for i, name in enumerate(pokemon.name)}
+        self.index_by_id = np.full(self.ids.max() + 1, -1, dtype=np.int64)
+        self.index_by_id[self.ids] = np.arange(len(self.ids))
+
+        roster = prepare_roster(pokemon)
+        # Feature columns as process_data names them, minus the pokemon_n_ prefix
+        self.features = {
+            column: (
+                roster[column].array
+                if isinstance(roster[column].dtype, pd.api.extensions.ExtensionDtype)
+                else roster[column].to_numpy()
+            )
+            for column in roster.columns[1:]
+        }
+        self.type_codes = np.column_stack(
+            [encode_types(roster.type_1), encode_types(roster.type_2)]
+        )
+        # Plain Python records of the raw roster, the shape process_for_custom_battle builds the opponent from
+        self.records = pokemon.to_dict(orient="records")
+
+    def __len__(self):
+        return len(self.ids)
+
+    def id_of(self, name):
+        return self.ids[self.index_by_name[name]]
+
+    def rows_of(self, ids):
+        rows = self.index_by_id[np.asarray(ids)]
+        if (rows < 0).any():
+            raise KeyError(f"Unknown pokemon ids {np.asarray(ids)[rows < 0]}")
+        return rows
+
+    @cached_property
+    def melted_stats(self):
+        """Chart stats in long form (name, id, stat, value), one block of CHART_STATS rows per pokemon"""
+        n, k = len(self.ids), len(CHART_STATS)
+        return pd.DataFrame(
+            {
+                "name": np.repeat(self.pokemon.name.to_numpy(), k),
+                "id": np.repeat(self.ids, k),
+                "stat": np.tile(CHART_STATS, n),
+                "value": self.pokemon[CHART_STATS].to_numpy().ravel(),
+            }
+        )
+
+    def stats_of(self, name):
+        """The melted_stats block of one pokemon"""
+        start = self.index_by_name[name] * len(CHART_STATS)
+        return self.melted_stats.iloc[start : start + len(CHART_STATS)]
+
+    def pair_frame(self, first_ids, second_ids):
+        """Model rows for First_pokemon vs Second_pokemon, for arrays of roster ids"""
+        first_ids = np.atleast_1d(np.asarray(first_ids, dtype=np.int64))
+        second_ids = np.atleast_1d(np.asarray(second_ids, dtype=np.int64))
+        first, second = self.rows_of(first_ids), self.rows_of(second_ids)
+        columns = {"First_pokemon": first_ids, "Second_pokemon": second_ids}
+        for prefix, rows in (("pokemon_1_", first), ("pokemon_2_", second)):
+            for column, values in self.features.items():
+                columns[prefix + column] = values.take(rows)
+        for stat in CONTINUOUS_COLUMNS:
+            columns[f"net_{stat}"] = (
+                columns[f"pokemon_1_{stat}"] - columns[f"pokemon_2_{stat}"]
+            )
+        columns["type_advantage"] = type_advantage_from_codes(
+            self.type_codes[first, 0],
+            self.type_codes[first, 1],
+            self.type_codes[second, 0],
+            self.type_codes[second, 1],
+        )
+        return pd.DataFrame(columns)
+
+    def custom_pair_frame(self, custom_pokemon_dict, opponent_name):
+        """
+        Model rows for custom pokemon against a roster pokemon.
+        custom_pokemon_dict maps pokemon_1_* columns to lists with one entry per row, or to single values
+        (or one-item lists) shared by every row.
+        """
+        row = self.index_by_name[opponent_name]
+        n = max(
+            (len(v) for v in custom_pokemon_dict.values() if np.ndim(v) > 0), default=1
+        )
+        opponent = {f"pokemon_2_{k}": v for k, v in self.records[row].items()}
+        opponent["pokemon_2_Multi_Type"] = (
+            1 if (opponent["pokemon_2_type_1"] and opponent["pokemon_2_type_2"]) else 0
+        )
+        # Constant columns as arrays: pandas converts a long Python list element by element
+        columns = {
+            column: np.repeat(np.array([value]), n) for column, value in opponent.items()
+        }
+        for column, values in custom_pokemon_dict.items():
+            columns[column] = _as_column(values, n)
+        # Per row, with the same test the opponent's single value gets
+        columns["pokemon_1_Multi_Type"] = (
+            _truthy(columns["pokemon_1_type_1"]) & _truthy(columns["pokemon_1_type_2"])
+        ).astype(np.int64)
+        columns["First_pokemon"] = np.repeat(np.array(["foo"]), n)
+        columns["Second_pokemon"] = np.repeat(np.array(["bar"]), n)
+        columns["type_advantage"] = type_advantage_from_codes(
+            encode_types(columns["pokemon_1_type_1"]),
+            encode_types(columns["pokemon_1_type_2"]),
+            np.repeat(self.type_codes[row, 0], n),
+            # The opponent's missing type_2 arrives raw (NaN) here, which encodes the same as "None"
+            np.repeat(self.type_codes[row, 1], n),
+        )
+        for stat in CONTINUOUS_COLUMNS:
+            columns[f"net_{stat}"] = np.asarray(
+                columns[f"pokemon_1_{stat}"]
+            ) - np.asarray(columns[f"pokemon_2_{stat}"])
+        return pd.DataFrame(columns)
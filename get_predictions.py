@@ -8,87 +8,629 @@ We highly recommend that you update SSL certificates with:
     pip install -U urllib3[secure] certifi
 """
 
+import array
+import codecs
+import json
+import os
+import queue
+import re
+import threading
+import time
+from concurrent.futures import Future
+from functools import partial
+
+import numpy as np
 import pandas as pd
-from datarobot_predict.scoring_code import ScoringCodeModel
+from logzero import logger
+
+from build_datasets.data_loading import file_fingerprint
+from instrumentation import METRICS
+from prediction_cache import LRUCache
+
+MODEL_PATH = "model.jar"
+NUMPY_MODEL_PATH = "numpy_model.npz"
+SCORING_ENGINE_ENV = "POKEMON_SCORING_ENGINE"
+SCORING_ENGINES = ("auto", "jar", "numpy", "stub")
+SCORING_WORKERS_ENV = "POKEMON_SCORING_WORKERS"
+BATCH_WINDOW_MS = 5
+BATCH_MAX_ROWS = 256
+MAX_EXPLANATIONS = 3
+EXPLANATION_CACHE_SIZE = 4096
+
+
+class LinearScoringModel:
+    """
+    Base for the in-process engines: a logistic function of per-feature contributions.
+    Subclasses implement contributions(data) -> (rows, len(features)) array, and predict() returns the
+    ScoringCodeModel columns, with the largest contributions as the explanations.
+    """
+
+    features = []
+    intercept = 0.0
+    version = None
+
+    def contributions(self, data):
+        raise NotImplementedError
+
+    def predict(self, data, max_explanations=0):
+        contributions = self.contributions(data)
+        probability = 1 / (1 + np.exp(-(self.intercept + contributions.sum(axis=1))))
+        preds = {
+            "target_True_PREDICTION": probability,
+            "target_False_PREDICTION": 1 - probability,
+        }
+        rows = np.arange(len(data))
+        order = np.argsort(-np.abs(contributions), axis=1, kind="stable")
+        for k in range(min(max_explanations, len(self.features))):
+            strength = contributions[rows, order[:, k]]
+            magnitude = np.select([np.abs(strength) > 1, np.abs(strength) > 0.3], [3, 2], 1)
+            preds[f"EXPLANATION_{k + 1}_FEATURE_NAME"] = np.array(self.features)[order[:, k]]
+            preds[f"EXPLANATION_{k + 1}_STRENGTH"] = strength
+            preds[f"EXPLANATION_{k + 1}_QUALITATIVE_STRENGTH"] = [
+                ("+" if s >= 0 else "-") * m for s, m in zip(strength, magnitude)
+            ]
+        return pd.DataFrame(preds)
+
+
+class StubScoringModel(LinearScoringModel):
+    """
+    Deterministic stand-in for ScoringCodeModel, used when no model file is available.
+    Scores a fixed logistic function of the net stats and type advantage and returns the same columns,
+    so everything downstream of the model can be run and load-tested without a JVM.
+    call_overhead_ms simulates the fixed cost of a JVM round trip (waiting, so threads overlap it), and
+    cpu_ms a call that keeps a core busy (holding the GIL, so only more processes overlap it).
+    """
+
+    WEIGHTS = {
+        "net_speed": 0.04,
+        "net_attack": 0.02,
+        "net_sp_attack": 0.015,
+        "net_hp": 0.01,
+        "net_defense": 0.01,
+        "net_sp_defense": 0.01,
+        "type_advantage": 0.5,
+    }
+    CENTERS = {"type_advantage": 3}
+    features = list(WEIGHTS)
+    version = "stub"
+
+    def __init__(self, call_overhead_ms=0.0, cpu_ms=0.0):
+        self.call_overhead_ms = call_overhead_ms
+        self.cpu_ms = cpu_ms
+
+    def contributions(self, data):
+        return np.column_stack(
+            [
+                (data[f].to_numpy(dtype=np.float64) - self.CENTERS.get(f, 0))
+                * self.WEIGHTS[f]
+                for f in self.features
+            ]
+        )
+
+    def predict(self, data, max_explanations=0):
+        if self.call_overhead_ms:
+            time.sleep(self.call_overhead_ms / 1000)
+        if self.cpu_ms:
+            # CPU time rather than wall time, so calls sharing a core take proportionally longer
+            busy_until = time.thread_time() + self.cpu_ms / 1000
+            while time.thread_time() < busy_until:
+                pass
+        return super().predict(data, max_explanations)
+
+
+class NumpyLogisticModel(LinearScoringModel):
+    """
+    Logistic regression fitted on the classification train set (python -m build_datasets.train_numpy_model)
+    and scored in-process with NumPy. Besides the raw features it has a term for which pokemon moves first,
+    sign(net_speed), which is explained as part of net_speed.
+    """
+
+    features = [
+        "net_hp",
+        "net_attack",
+        "net_defense",
+        "net_sp_attack",
+        "net_sp_defense",
+        "net_speed",
+        "type_advantage",
+        "pokemon_1_legendary",
+        "pokemon_2_legendary",
+    ]
+
+    def __init__(self, mean, scale, coef, intercept, version="numpy-unsaved"):
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.coef = np.asarray(coef, dtype=np.float64)
+        self.intercept = float(intercept)
+        self.version = version
+
+    @classmethod
+    def design(cls, data):
+        """Feature matrix: one column per entry of features, then sign(net_speed)"""
+        net_speed = data["net_speed"].to_numpy(dtype=np.float64)
+        return np.column_stack(
+            [data[f].to_numpy(dtype=np.float64) for f in cls.features]
+            + [np.sign(net_speed)]
+        )
 
+    @classmethod
+    def fit(cls, data, target, l2=1e-3, iterations=25):
+        """Newton-Raphson on standardised features with a small L2 penalty"""
+        x = cls.design(data)
+        y = np.asarray(target, dtype=np.float64)
+        mean = x.mean(axis=0)
+        scale = x.std(axis=0)
+        scale[scale == 0] = 1
+        z = np.column_stack([np.ones(len(x)), (x - mean) / scale])
+        w = np.zeros(z.shape[1])
+        for _ in range(iterations):
+            p = 1 / (1 + np.exp(-z @ w))
+            gradient = z.T @ (p - y) + l2 * w
+            hessian = (z * (p * (1 - p))[:, None]).T @ z + l2 * np.eye(len(w))
+            step = np.linalg.solve(hessian, gradient)
+            w -= step
+            if np.abs(step).max() < 1e-8:
+                break
+        return cls(mean, scale, w[1:], w[0])
 
-MODEL = ScoringCodeModel("model.jar")
+    def contributions(self, data):
+        terms = (self.design(data) - self.mean) / self.scale * self.coef
+        contributions = terms[:, : len(self.features)]
+        contributions[:, self.features.index("net_speed")] += terms[:, -1]
+        return contributions
 
+    def save(self, path=None):
+        path = path or NUMPY_MODEL_PATH
+        np.savez(
+            path,
+            features=np.array(self.features),
+            mean=self.mean,
+            scale=self.scale,
+            coef=self.coef,
+            intercept=self.intercept,
+        )
 
-def dataframify_predictions(preds):
+    @classmethod
+    def load(cls, path=None):
+        path = path or NUMPY_MODEL_PATH
+        with np.load(path) as saved:
+            if list(saved["features"]) != cls.features:
+                raise ValueError(f"{path} was trained on different features, retrain it")
+            return cls(
+                saved["mean"],
+                saved["scale"],
+                saved["coef"],
+                saved["intercept"],
+                version=f"numpy-{file_fingerprint(path)}",
+            )
+
+
+def resolve_engine(name=None):
     """
-    Converts Prediction Response from DataRobot API into a Pandas Dataframe. Works fast enough for my demo purposes
-    preds: list of dictionaries returned by DataRobot API
+    The engine load_engine(name) loads. name defaults to POKEMON_SCORING_ENGINE, and auto becomes the first
+    of jar/numpy whose model file exists, or stub.
+    """
+    name = name or os.environ.get(SCORING_ENGINE_ENV, "auto")
+    if name == "auto":
+        if os.path.exists(MODEL_PATH):
+            return "jar"
+        if os.path.exists(NUMPY_MODEL_PATH):
+            return "numpy"
+        return "stub"
+    if name not in SCORING_ENGINES:
+        raise ValueError(
+            f"Unknown scoring engine {name!r}, expected one of {', '.join(SCORING_ENGINES)}"
+        )
+    return name
+
+
+def engine_version(name=None):
+    """The version of the model load_engine(name) would load, read from its model file without loading it"""
+    name = resolve_engine(name)
+    if name == "jar":
+        return file_fingerprint(MODEL_PATH)
+    if name == "numpy":
+        return f"numpy-{file_fingerprint(NUMPY_MODEL_PATH)}"
+    return StubScoringModel.version
+
+
+def load_engine(name=None):
+    """
+    The scoring engine named by POKEMON_SCORING_ENGINE: jar (DataRobot Scoring Code, needs a JVM),
+    numpy (NumpyLogisticModel), stub, or auto (default) for the first of jar/numpy whose model file exists,
+    falling back to the stub.
+    """
+    requested = name or os.environ.get(SCORING_ENGINE_ENV, "auto")
+    name = resolve_engine(requested)
+    if name == "jar":
+        if not os.path.exists(MODEL_PATH):
+            raise FileNotFoundError(MODEL_PATH)
+        from datarobot_predict.scoring_code import ScoringCodeModel
+
+        return ScoringCodeModel(MODEL_PATH)
+    if name == "numpy":
+        return NumpyLogisticModel.load(NUMPY_MODEL_PATH)
+    if requested == "auto":
+        logger.warning(
+            f"Neither {MODEL_PATH} nor {NUMPY_MODEL_PATH} found, scoring with StubScoringModel"
+        )
+    return StubScoringModel()
+
+
+# Loaded on first use by get_model(). Assigning a model here (e.g. in benchmarks) overrides the engine setting,
+# and assigning a scoring_pool.ScoringWorkerPool scores in worker processes.
+MODEL = None
+_MODEL_LOCK = threading.Lock()
+
 
+def get_model():
+    """
+    The scoring model, loaded on first call. Concurrent callers wait for the one load in progress.
+    With POKEMON_SCORING_WORKERS set to N > 0 it is a pool of N worker processes, each with its own model.
+    """
+    global MODEL
+    if MODEL is None:
+        with _MODEL_LOCK:
+            if MODEL is None:
+                start = time.perf_counter()
+                workers = int(os.environ.get(SCORING_WORKERS_ENV, 0))
+                if workers:
+                    from scoring_pool import ScoringWorkerPool
+
+                    model = ScoringWorkerPool(workers)
+                else:
+                    model = load_engine()
+                METRICS.observe("model_load", time.perf_counter() - start)
+                logger.info(
+                    f"Loaded {type(model).__name__} in {time.perf_counter() - start:.2f}s"
+                )
+                MODEL = model
+    return MODEL
+
+
+def start_warmup(sample=None):
+    """
+    Loads the model on a background thread and, if sample is given, scores it once so the first real
+    prediction does not pay for JVM start-up or JIT warm-up. Returns the thread.
+    """
+
+    def warm_up():
+        model = get_model()
+        if sample is not None:
+            start = time.perf_counter()
+            model.predict(sample, max_explanations=3)
+            logger.info(f"Warmed up the model in {time.perf_counter() - start:.2f}s")
+
+    thread = threading.Thread(target=warm_up, name="model-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def model_version():
+    """
+    Identifies the scoring model in use. Until it is loaded, the version the configured engine will load,
+    so cache keys and the matchup matrix check never force a model load.
     """
-    predictions = preds["data"]
-    rowId = []
-    predictionValue = []
+    model = MODEL
+    if model is None:
+        return engine_version()
+    return getattr(model, "version", None) or file_fingerprint(MODEL_PATH)
 
-    explanation_0_feature = []
-    explanation_0_feature_value = []
-    explanation_0_qualitative_strength = []
-    explanation_0_strength = []
 
-    explanation_1_feature = []
-    explanation_1_feature_value = []
-    explanation_1_qualitative_strength = []
-    explanation_1_strength = []
+class _PendingPrediction:
+    __slots__ = ("data", "future", "submitted")
 
-    explanation_2_feature = []
-    explanation_2_feature_value = []
-    explanation_2_qualitative_strength = []
-    explanation_2_strength = []
+    def __init__(self, data):
+        self.data = data
+        self.future = Future()
+        self.submitted = time.perf_counter()
 
-    for row in predictions:
-        rowId.append(row.get("rowId"))
-        predictionValue.append(row.get("predictionValues")[0].get("value"))
-        explanations = row.get("predictionExplanations")
-        if not explanations:
-            exp0, exp1, exp2 = {"feature": ""}, {"feature": ""}, {"feature": ""}
-        elif len(explanations) >= 3:
-            exp0, exp1, exp2 = explanations[0], explanations[1], explanations[2]
-        elif len(explanations) == 2:
-            exp0, exp1, exp2 = explanations[0], explanations[1], {"feature": ""}
-        elif len(explanations) == 1:
-            exp0, exp1, exp2 = explanations[0], {"feature": ""}, {"feature": ""}
+
+class PredictionBatcher:
+    """
+    Coalesces concurrent prediction requests into one model call.
+    A background thread waits up to window_ms after the first queued request (or until max_rows rows are queued),
+    scores everything collected in a single model.predict and hands each caller back its own rows.
+    """
+
+    def __init__(
+        self,
+        model=None,
+        window_ms=BATCH_WINDOW_MS,
+        max_rows=BATCH_MAX_ROWS,
+        max_explanations=3,
+    ):
+        self.model = model if model is not None else get_model()
+        self.window = window_ms / 1000
+        self.max_rows = max_rows
+        self.max_explanations = max_explanations
+        self.model_calls = 0
+        self.requests_scored = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(
+            target=self._run, name="prediction-batcher", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, data: pd.DataFrame) -> Future:
+        pending = _PendingPrediction(data)
+        self._queue.put(pending)
+        return pending.future
+
+    def predict(self, data: pd.DataFrame, timeout=None) -> pd.DataFrame:
+        return self.submit(data).result(timeout)
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            pending = self._queue.get()
+            if pending is None:
+                return
+            batch, rows = [pending], len(pending.data)
+            deadline = time.perf_counter() + self.window
+            closing = False
+            while rows < self.max_rows:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    pending = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if pending is None:
+                    closing = True
+                    break
+                batch.append(pending)
+                rows += len(pending.data)
+            self._score(batch)
+            if closing:
+                return
+
+    def _score(self, batch):
+        # Roster and custom battles carry different columns, so only like-shaped frames share a call
+        groups = {}
+        for pending in batch:
+            groups.setdefault(tuple(pending.data.columns), []).append(pending)
+        now = time.perf_counter()
+        for pending in batch:
+            METRICS.observe("batch_queue_wait", now - pending.submitted)
+        for group in groups.values():
+            self.model_calls += 1
+            self.requests_scored += len(group)
+            data = pd.concat([p.data for p in group], ignore_index=True)
+            METRICS.count("model_calls")
+            METRICS.count("rows_scored", len(data))
+            if hasattr(self.model, "submit"):
+                # A worker pool scores in other processes; keep batching while it does
+                future = self.model.submit(data, max_explanations=self.max_explanations)
+                future.add_done_callback(
+                    partial(self._deliver, group, time.perf_counter(), len(data))
+                )
+                continue
+            try:
+                with METRICS.timer("model_predict", rows=len(data)):
+                    preds = self.model.predict(
+                        data, max_explanations=self.max_explanations
+                    )
+            except Exception as e:
+                for pending in group:
+                    pending.future.set_exception(e)
+                continue
+            self._split(group, preds)
+
+    def _deliver(self, group, submitted, rows, future):
+        METRICS.observe("model_predict", time.perf_counter() - submitted, rows=rows)
+        if future.exception() is not None:
+            for pending in group:
+                pending.future.set_exception(future.exception())
         else:
-            exp0, exp1, exp2 = {"feature": ""}, {"feature": ""}, {"feature": ""}
-
-        explanation_0_feature.append(exp0.get("feature"))
-        explanation_0_feature_value.append(str(exp0.get("featureValue")))
-        explanation_0_qualitative_strength.append(exp0.get("qualitativeStrength"))
-        explanation_0_strength.append(exp0.get("strength"))
-
-        explanation_1_feature.append(exp1.get("feature"))
-        explanation_1_feature_value.append(str(exp1.get("featureValue")))
-        explanation_1_qualitative_strength.append(exp1.get("qualitativeStrength"))
-        explanation_1_strength.append(exp1.get("strength"))
-
-        explanation_2_feature.append(exp2.get("feature"))
-        explanation_2_feature_value.append(str(exp2.get("featureValue")))
-        explanation_2_qualitative_strength.append(exp2.get("qualitativeStrength"))
-        explanation_2_strength.append(exp2.get(str("strength")))
-
-    prediction_data = pd.DataFrame(
-        {
-            "rowId": rowId,
-            "predictionValue": predictionValue,
-            "explanation_0_feature": explanation_0_feature,
-            "explanation_0_feature_value": explanation_0_feature_value,
-            "explanation_0_qualitative_strength": explanation_0_qualitative_strength,
-            "explanation_0_strength": explanation_0_strength,
-            "explanation_1_feature": explanation_1_feature,
-            "explanation_1_feature_value": explanation_1_feature_value,
-            "explanation_1_qualitative_strength": explanation_1_qualitative_strength,
-            "explanation_1_strength": explanation_1_strength,
-            "explanation_2_feature": explanation_2_feature,
-            "explanation_2_feature_value": explanation_2_feature_value,
-            "explanation_2_qualitative_strength": explanation_2_qualitative_strength,
-            "explanation_2_strength": explanation_2_strength,
-        },
-    )
-    return prediction_data
+            self._split(group, future.result())
+
+    @staticmethod
+    def _split(group, preds):
+        offset = 0
+        for pending in group:
+            n = len(pending.data)
+            pending.future.set_result(
+                preds.iloc[offset : offset + n].reset_index(drop=True)
+            )
+            offset += n
+
+
+# One batcher per explanation depth, so probability-only requests never wait on explanations
+_BATCHERS = {}
+_BATCHER_LOCK = threading.Lock()
+
+
+def get_batcher(max_explanations=MAX_EXPLANATIONS):
+    with _BATCHER_LOCK:
+        if max_explanations not in _BATCHERS:
+            _BATCHERS[max_explanations] = PredictionBatcher(
+                max_explanations=max_explanations
+            )
+        return _BATCHERS[max_explanations]
+
+
+class _PredictionColumns:
+    """
+    Typed columns for a prediction response, filled one row at a time.
+    Values go straight into C-typed array buffers and string fields are dictionary-encoded into integer codes,
+    so rows are never copied into padded dicts or Python lists. The buffers become NumPy arrays without a copy.
+    """
+
+    def __init__(self, max_explanations):
+        self.max_explanations = max_explanations
+        self.row_id = array.array("q")
+        self.value = array.array("d")
+        # Explanation fields are stored row-major, max_explanations entries per row
+        self.feature = array.array("i")
+        self.feature_value = array.array("i")
+        self.qualitative_strength = array.array("i")
+        self.strength = array.array("d")
+        # One vocabulary per string field, shared across explanation slots. Code -1 is missing.
+        self.feature_codes = {}
+        self.feature_value_codes = {}
+        self.qualitative_strength_codes = {}
+        # Padding matches the legacy output: empty feature name, "None" feature value
+        self._padding = (
+            self.feature_codes.setdefault("", 0),
+            self.feature_value_codes.setdefault("None", 0),
+        )
+
+    def append(self, row):
+        row_id = row.get("rowId")
+        self.row_id.append(-1 if row_id is None else row_id)
+        self.value.append(row["predictionValues"][0]["value"])
+        explanations = row.get("predictionExplanations") or ()
+        feature_codes = self.feature_codes
+        feature_value_codes = self.feature_value_codes
+        qualitative_strength_codes = self.qualitative_strength_codes
+        for explanation in explanations[: self.max_explanations]:
+            feature = explanation.get("feature")
+            self.feature.append(
+                -1
+                if feature is None
+                else feature_codes.setdefault(feature, len(feature_codes))
+            )
+            feature_value = str(explanation.get("featureValue"))
+            self.feature_value.append(
+                feature_value_codes.setdefault(feature_value, len(feature_value_codes))
+            )
+            qualitative_strength = explanation.get("qualitativeStrength")
+            self.qualitative_strength.append(
+                -1
+                if qualitative_strength is None
+                else qualitative_strength_codes.setdefault(
+                    qualitative_strength, len(qualitative_strength_codes)
+                )
+            )
+            strength = explanation.get("strength")
+            self.strength.append(np.nan if strength is None else strength)
+        for _ in range(self.max_explanations - len(explanations)):
+            self.feature.append(self._padding[0])
+            self.feature_value.append(self._padding[1])
+            self.qualitative_strength.append(-1)
+            self.strength.append(np.nan)
+
+    def to_frame(self):
+        k = self.max_explanations
+
+        def matrix(buffer, dtype):
+            return np.frombuffer(buffer, dtype=dtype).reshape(-1, k)
+
+        feature = matrix(self.feature, np.int32)
+        feature_value = matrix(self.feature_value, np.int32)
+        qualitative_strength = matrix(self.qualitative_strength, np.int32)
+        strength = matrix(self.strength, np.float64)
+
+        def categorical(codes, vocabulary):
+            return pd.Categorical.from_codes(codes, categories=list(vocabulary))
+
+        columns = {
+            "rowId": np.frombuffer(self.row_id, dtype=np.int64),
+            "predictionValue": np.frombuffer(self.value, dtype=np.float64),
+        }
+        for i in range(k):
+            columns[f"explanation_{i}_feature"] = categorical(
+                feature[:, i], self.feature_codes
+            )
+            columns[f"explanation_{i}_feature_value"] = categorical(
+                feature_value[:, i], self.feature_value_codes
+            )
+            columns[f"explanation_{i}_qualitative_strength"] = categorical(
+                qualitative_strength[:, i], self.qualitative_strength_codes
+            )
+            columns[f"explanation_{i}_strength"] = strength[:, i]
+        return pd.DataFrame(columns)
+
+
+_SEPARATORS = {sep: re.compile(rf"[\s{sep}]*") for sep in ("", ",", ":")}
+_DELIMITER = re.compile(r"[\s,:\]}]")
+
+
+def iter_prediction_rows(stream, chunk_size=1 << 16):
+    """
+    Yields the rows of a DataRobot prediction response's "data" array one at a time,
+    reading the stream in chunks so the full response is never held in memory.
+    stream: text or binary file-like object
+    """
+    decoder = json.JSONDecoder()
+    if isinstance(stream.read(0), bytes):
+        # Unlike io.TextIOWrapper, a StreamReader does not close the caller's stream when it is collected
+        stream = codecs.getreader("utf-8")(stream)
+    buffer, pos = "", 0
+
+    def skip(separator):
+        # Advances past whitespace and the given separator, reading more input as needed
+        nonlocal buffer, pos
+        while True:
+            pos = _SEPARATORS[separator].match(buffer, pos).end()
+            if pos < len(buffer):
+                return buffer[pos]
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                return None
+            buffer, pos = chunk, 0
+
+    def decode():
+        nonlocal buffer, pos
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # Possibly a value cut off at the chunk boundary
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    raise
+                buffer, pos = buffer[pos:] + chunk, 0
+                continue
+            if (
+                isinstance(value, (int, float))
+                and not isinstance(value, bool)
+                and not _DELIMITER.search(buffer, end)
+            ):
+                # A number cut off at the chunk boundary ("1." then "5") decodes as its first part,
+                # so it is only trusted once a delimiter is in view
+                chunk = stream.read(chunk_size)
+                if chunk:
+                    buffer, pos = buffer[pos:] + chunk, 0
+                    continue
+            pos = end
+            return value
+
+    if skip("") != "{":
+        raise ValueError("Prediction response is not a JSON object")
+    pos += 1
+    while skip(",") not in ("}", None):
+        key = decode()
+        skip(":")
+        if key != "data":
+            decode()
+            continue
+        if skip("") != "[":
+            raise ValueError('"data" in prediction response is not a list')
+        pos += 1
+        while skip(",") not in ("]", None):
+            yield decode()
+        pos += 1
+
+
+@METRICS.timed("dataframify_predictions")
+def dataframify_predictions(preds, max_explanations=3):
+    """
+    Converts Prediction Response from DataRobot API into a Pandas Dataframe with columns
+    rowId, predictionValue and explanation_{i}_feature / _feature_value / _qualitative_strength / _strength
+    for i < max_explanations.
+    preds: parsed response dict, or a text/binary stream of the JSON response, which is parsed incrementally
+    """
+    rows = preds["data"] if isinstance(preds, dict) else iter_prediction_rows(preds)
+    columns = _PredictionColumns(max_explanations)
+    for row in rows:
+        columns.append(row)
+    return columns.to_frame()
 
 
 def main(data: pd.DataFrame) -> pd.DataFrame:
@@ -96,5 +638,47 @@ def main(data: pd.DataFrame) -> pd.DataFrame:
     Return an exit code on script completion or error. Codes > 0 are errors to the shell.
     Also useful as a usage demonstration of
     `make_datarobot_deployment_predictions(data, deployment_id)`
+    Requests arriving together from concurrent sessions are scored in one model call by the PredictionBatcher.
+    """
+    return get_batcher().predict(data)
+
+
+def predict_proba(data: pd.DataFrame) -> np.ndarray:
+    """
+    Probability First_pokemon wins, for every row of data. The fast path: the model computes no
+    explanations, which cost far more than the prediction itself.
+    """
+    return get_batcher(0).predict(data)["target_True_PREDICTION"].to_numpy()
+
+
+EXPLANATION_CACHE = LRUCache(maxsize=EXPLANATION_CACHE_SIZE)
+
+
+def explain(data: pd.DataFrame, rows=None) -> pd.DataFrame:
+    """
+    Predictions with explanations for the given rows of data (all of them by default), in the layout of
+    main(). Meant for the rows actually displayed: rows are cached by their content and model version,
+    so only rows not explained before are scored.
     """
-    return MODEL.predict(data, max_explanations=3)
+    if rows is not None:
+        data = data.iloc[list(rows)]
+    data = data.reset_index(drop=True)
+    version = model_version()
+    row_hashes = pd.util.hash_pandas_object(data, index=False).to_numpy()
+    keys = [(version, tuple(data.columns), int(h)) for h in row_hashes]
+    explained = {key: EXPLANATION_CACHE.get(key) for key in keys}
+    # Rows not cached yet, each scored once however often it repeats
+    missing = {}
+    for i, key in enumerate(keys):
+        if explained[key] is None:
+            missing.setdefault(key, i)
+    METRICS.count("explanation_cache_hit", len(explained) - len(missing))
+    if missing:
+        METRICS.count("explanation_cache_miss", len(missing))
+        preds = main(data.iloc[list(missing.values())].reset_index(drop=True))
+        for j, key in enumerate(missing):
+            explained[key] = preds.iloc[j : j + 1].reset_index(drop=True)
+            EXPLANATION_CACHE.put(key, explained[key])
+    if len(keys) == 1:
+        return explained[keys[0]]
+    return pd.concat([explained[key] for key in keys], ignore_index=True)
@@ -1,14 +1,15 @@
+import hashlib
+import json
+from functools import wraps
+
 import pandas as pd
-import plotly.express as px
 import numpy as np
 import streamlit as st
-from logzero import logger
 
-import get_predictions as gp
-from build_datasets.format_dataset_for_classification import (
-    process_data,
-    CONTINUOUS_COLUMNS,
-)
+from prediction_cache import LRUCache
+
+# The model, dataset, feature and image modules are imported where they are first used, so importing this
+# module (and rendering the top of the page) does not wait for them
 
 
 # from get_predictions import DICT_RECATEGORIZE
@@ -23,53 +24,75 @@ SMALL_FONT_STYLE = """
     </style>
     """
 
-POKEMON_BASE_COLUMNS = [
-    "id",
-    "name",
-    "type_1",
-    "type_2",
-    "hp",
-    "attack",
-    "defense",
-    "sp_attack",
-    "sp_defense",
-    "speed",
-    "generation",
-    "legendary",
-]
-
-TYPE_ADVANTAGES = {
-    "fire": ["grass", "ice", "bug", "steel", "fairy"],
-    "grass": ["water", "ground", "rock"],
-    "water": ["fire", "ground", "rock"],
-    "electric": ["water", "flying"],
-    "ice": ["grass", "ground", "flying", "dragon"],
-    "psychic": [
-        "poison",
-        "fighting",
-    ],
-    "fighting": ["normal", "ice", "rock", "dark", "steel"],
-    "normal": [],
-    "poison": ["grass", "fairy"],
-    "bug": ["grass", "psychic", "dark"],
-    "dragon": ["dragon"],
-    "dark": ["psychic", "ghost"],
-    "fairy": ["fighting", "dragon", "dark"],
-    "rock": ["fire", "ice", "flying", "bug"],
-    "ghost": ["ghost", "psychic", "normal"],
-    "steel": ["ice", "rock", "fairy"],
-    "ground": ["rock", "fire", "electric", "poison"],
-    "flying": ["grass", "fighting", "bug"],
-    "none": [],
-}
+BATTLE_CACHE_SIZE = 4096
+BATTLE_CACHE_TTL = 60 * 60
+
+BATTLE_CACHE = LRUCache(maxsize=BATTLE_CACHE_SIZE, ttl=BATTLE_CACHE_TTL)
+
+COMP_CHART_CACHE_SIZE = 256
+
+COMP_CHART_CACHE = LRUCache(maxsize=COMP_CHART_CACHE_SIZE)
+
+
+def _timed(stage):
+    """instrumentation.METRICS.timed, importing instrumentation on the first call"""
+
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            from instrumentation import METRICS
+
+            with METRICS.timer(stage):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def _count(event):
+    from instrumentation import METRICS
+
+    METRICS.count(event)
 
 
 @st.cache_data
 def load_data():
-    pokemon_data = pd.read_csv("data/pokemon.csv")
-    pokemon_data.columns = POKEMON_BASE_COLUMNS
+    from build_datasets.data_loading import load_pokemon
+
+    return load_pokemon()
+
+
+@st.cache_resource
+def load_feature_store():
+    from feature_store import RosterFeatureStore
+
+    return RosterFeatureStore(load_data())
+
 
-    return pokemon_data
+@st.cache_resource
+def load_image_index():
+    from image_assets import ImageIndex
+
+    return ImageIndex(load_data().name.dropna())
+
+
+@st.cache_resource
+def start_model_warmup():
+    """Loads and warms the scoring model in the background, once per server process"""
+    import get_predictions as gp
+
+    store = load_feature_store()
+    sample = store.pair_frame(store.ids[:1], store.ids[:1])
+    return gp.start_warmup(sample)
+
+
+def wait_for_model():
+    """Blocks, behind a spinner, only if the background warm-up has not finished yet"""
+    warmup = start_model_warmup()
+    if warmup.is_alive():
+        with st.spinner("Warming up the model..."):
+            warmup.join()
 
 
 def get_dropdowns(df):
@@ -80,32 +103,29 @@ def get_dropdowns(df):
     return pokemon1, pokemon2, types
 
 
+@_timed("comp_chart")
 def build_comp_chart(pokemon_data, pokemon1, pokemon2):
-    pokemon_comp = (
-        pokemon_data.loc[lambda x: x.name.isin([pokemon1, pokemon2])]
-        .assign(sort_order=lambda x: np.where(x.name == pokemon1, 0, 1))
-        .sort_values(by="sort_order")
-        .drop(columns="sort_order")
-        .copy()
-    )
-    pokemon_comp.columns = POKEMON_BASE_COLUMNS
-
-    melt_comp = (
-        pokemon_comp[
-            [
-                "id",
-                "name",
-                "hp",
-                "attack",
-                "defense",
-                "sp_attack",
-                "sp_defense",
-                "speed",
-            ]
-        ]
-        .melt(id_vars=["name", "id"], var_name="stat", value_name="value")
-        .rename(columns={"name": "Pokemon"})
-    )
+    """
+    Grouped bar chart of the two pokemons' base stats. Figures are cached per pair: st.plotly_chart only
+    serializes the figure it is given, so a cached figure is not rebuilt or re-validated on reruns.
+    """
+    key = (pokemon1, pokemon2)
+    fig = COMP_CHART_CACHE.get(key)
+    if fig is not None:
+        _count("comp_chart_cache_hit")
+        return fig
+    _count("comp_chart_cache_miss")
+
+    store = feature_store(pokemon_data)
+    melt_comp = pd.concat(
+        [store.stats_of(pokemon1), store.stats_of(pokemon2)]
+        if pokemon1 != pokemon2
+        else [store.stats_of(pokemon1)],
+        ignore_index=True,
+    ).rename(columns={"name": "Pokemon"})
+
+    # plotly.express is imported on first use so it does not hold up the first render
+    import plotly.express as px
 
     fig = px.bar(
         melt_comp,
@@ -125,113 +145,221 @@ def build_comp_chart(pokemon_data, pokemon1, pokemon2):
             size=22,
         ),
     )
+    COMP_CHART_CACHE.put(key, fig)
     return fig
 
 
-def build_type_advantage(df):
-    temp = (
-        df[
-            [
-                "pokemon_1_type_1",
-                "pokemon_1_type_2",
-                "pokemon_2_type_1",
-                "pokemon_2_type_2",
-            ]
-        ]
-        .copy()
-        .fillna("none")
+def build_tournament_chart(results):
+    import plotly.express as px
+
+    fig = px.bar(
+        results.head(16),
+        x="Pokemon",
+        y="championship_probability",
+        error_y=results.head(16).ci_high - results.head(16).championship_probability,
+        error_y_minus=results.head(16).championship_probability
+        - results.head(16).ci_low,
     )
-    for col in temp.columns:
-        temp[col] = temp[col].str.lower()
-
-    t11, t12, t21, t22 = (
-        temp.pokemon_1_type_1,
-        temp.pokemon_1_type_2,
-        temp.pokemon_2_type_1,
-        temp.pokemon_2_type_2,
+    fig.update_layout(
+        yaxis_title="Chance of winning the tournament",
+        xaxis_title=None,
+        autosize=False,
+        height=500,
+        width=1200,
+        font=dict(
+            size=18,
+        ),
     )
+    return fig
+
+
+def build_sweep_chart(probabilities, x_stat, x_values, y_stat=None, y_values=None):
+    """Win probability curve for a one-stat sweep, heatmap for a two-stat sweep"""
+    import plotly.express as px
 
-    t_adv = []
-    for h, i, j, k in zip(t11, t12, t21, t22):
-        counter = 3
-        advantage_types = list(
-            set(TYPE_ADVANTAGES[h] + TYPE_ADVANTAGES.get(i, ["none"]))
+    if y_stat is None:
+        fig = px.line(
+            x=x_values, y=probabilities, labels={"x": x_stat, "y": "Chance of winning"}
         )
-        disadvantage_types = list(
-            set(TYPE_ADVANTAGES[j] + TYPE_ADVANTAGES.get(k, ["none"]))
+        fig.add_hline(y=0.5, line_dash="dot")
+    else:
+        fig = px.imshow(
+            probabilities,
+            x=x_values,
+            y=y_values,
+            origin="lower",
+            aspect="auto",
+            zmin=0,
+            zmax=1,
+            color_continuous_scale="RdBu",
+            labels={"x": x_stat, "y": y_stat, "color": "Chance of winning"},
         )
-        if j in advantage_types:
-            counter += 1
-        if k in advantage_types:
-            counter += 1
-        if h in disadvantage_types:
-            counter -= 1
-        if i in disadvantage_types:
-            counter -= 1
-        t_adv.append(counter)
+    fig.update_layout(
+        autosize=False,
+        height=500,
+        width=1200,
+        font=dict(
+            size=18,
+        ),
+    )
+    return fig
+
+
+def feature_store(pokemon):
+    """Accepts the roster DataFrame or an already-built RosterFeatureStore"""
+    from feature_store import RosterFeatureStore
 
-    return t_adv
+    if isinstance(pokemon, RosterFeatureStore):
+        return pokemon
+    return RosterFeatureStore(pokemon)
 
 
 def process_for_pokemon_battle(
     pokemon_df: pd.DataFrame, pokemon1: str, pokemon2: str
 ) -> pd.DataFrame:
-    pokemon1_id = pokemon_df.loc[pokemon_df.name == pokemon1].id.values[0]
-    pokemon2_id = pokemon_df.loc[pokemon_df.name == pokemon2].id.values[0]
-    combat = pd.DataFrame(
-        {"First_pokemon": [pokemon1_id], "Second_pokemon": [pokemon2_id]}
+    return process_for_pokemon_battles(pokemon_df, [pokemon1], [pokemon2])
+
+
+@_timed("prepare_battle")
+def process_for_pokemon_battles(pokemon_df, pokemon1s, pokemon2s) -> pd.DataFrame:
+    """process_for_pokemon_battle for lists of names, one row per battle"""
+    from build_datasets.matchup_matrix import load_matchup_matrix
+
+    store = feature_store(pokemon_df)
+    pokemon1_ids = np.array([store.id_of(name) for name in pokemon1s], dtype=np.int64)
+    pokemon2_ids = np.array([store.id_of(name) for name in pokemon2s], dtype=np.int64)
+    matchup_matrix = load_matchup_matrix()
+    if matchup_matrix is not None and matchup_matrix.covers_pairs(
+        pokemon1_ids, pokemon2_ids
+    ):
+        # run_pokemon_battle answers these pairings straight from the precomputed matrix
+        return pd.DataFrame(
+            {"First_pokemon": pokemon1_ids, "Second_pokemon": pokemon2_ids}
+        )
+    return store.pair_frame(pokemon1_ids, pokemon2_ids)
+
+
+def model_ready(battle_ready_df):
+    """
+    battle_ready_df with the model's feature columns. Id-only frames are built for the matchup matrix;
+    if it is stale or gone by the time they are scored, the features are built from the roster ids.
+    """
+    if set(battle_ready_df.columns) != {"First_pokemon", "Second_pokemon"}:
+        return battle_ready_df
+    return load_feature_store().pair_frame(
+        battle_ready_df.First_pokemon.to_numpy(),
+        battle_ready_df.Second_pokemon.to_numpy(),
     )
-    battle_data = process_data(combat, pokemon_df, is_training_data=False)
-    battle_data["type_advantage"] = build_type_advantage(battle_data)
-    print(battle_data.head())
-    return battle_data
 
 
+def battle_cache_key(battle_ready_df):
+    """
+    Roster battles are keyed by the two roster ids, custom battles by a hash of the custom pokemon's
+    stats against the opponent's id. Both include the model version. None for multi-row frames.
+    """
+    import get_predictions as gp
+
+    if len(battle_ready_df) != 1:
+        return None
+    row = battle_ready_df.iloc[0]
+    if pd.api.types.is_integer_dtype(battle_ready_df.First_pokemon):
+        return (
+            "roster",
+            gp.model_version(),
+            int(row.First_pokemon),
+            int(row.Second_pokemon),
+        )
+    custom_stats = {
+        column: value.item() if isinstance(value, np.generic) else value
+        for column, value in row.items()
+        if column.startswith("pokemon_1_")
+    }
+    digest = hashlib.sha256(
+        json.dumps(custom_stats, sort_keys=True, default=str).encode()
+    ).hexdigest()
+    return ("custom", gp.model_version(), int(row.pokemon_2_id), digest)
+
+
+@_timed("run_battle")
 def run_pokemon_battle(battle_ready_df):
-    preds = gp.main(battle_ready_df)
+    import get_predictions as gp
+    from build_datasets.matchup_matrix import load_matchup_matrix
+
+    key = battle_cache_key(battle_ready_df)
+    preds = None if key is None else BATTLE_CACHE.get(key)
+    if preds is not None:
+        _count("battle_cache_hit")
+    else:
+        _count("battle_cache_miss")
+        matchup_matrix = load_matchup_matrix()
+        if matchup_matrix is not None and matchup_matrix.covers(battle_ready_df):
+            _count("matchup_matrix_hit")
+            preds = matchup_matrix.lookup(
+                battle_ready_df.First_pokemon, battle_ready_df.Second_pokemon
+            )
+        else:
+            preds = gp.explain(model_ready(battle_ready_df))
+        if key is not None:
+            BATTLE_CACHE.put(key, preds)
     probability_pokemon1_wins = preds["target_True_PREDICTION"][0]
     return probability_pokemon1_wins, preds
 
 
-def process_for_custom_battle(pokemon_df, pokemon2, custom_pokemon_dict):
-    custom_pokemon_dict["pokemon_1_Multi_Type"] = (
-        1
-        if (
-            custom_pokemon_dict["pokemon_1_type_1"]
-            and custom_pokemon_dict["pokemon_1_type_2"]
-        )
-        else 0
-    )
-
-    pokemon2_df = pokemon_df.loc[pokemon_df.name == pokemon2]
-    logger.info(pokemon2_df.columns)
-
-    pokemon2_df.columns = [f"pokemon_2_{i}" for i in pokemon2_df.columns]
+@_timed("battle_probability")
+def battle_probabilities(battle_ready_df):
+    """
+    Fast path of run_pokemon_battle: the probability pokemon 1 wins each battle, without explanations.
+    Explanations for the battles actually shown come from explain_battle.
+    """
+    import get_predictions as gp
+    from build_datasets.matchup_matrix import load_matchup_matrix
 
-    pokemon2_df_dict = pokemon2_df.to_dict(orient="records")[0]
+    key = battle_cache_key(battle_ready_df)
+    preds = None if key is None else BATTLE_CACHE.get(key)
+    if preds is None:
+        matchup_matrix = load_matchup_matrix()
+        if matchup_matrix is not None and matchup_matrix.covers(battle_ready_df):
+            _count("matchup_matrix_hit")
+            preds = matchup_matrix.lookup(
+                battle_ready_df.First_pokemon, battle_ready_df.Second_pokemon
+            )
+    if preds is not None:
+        return preds["target_True_PREDICTION"].to_numpy()
+    return gp.predict_proba(model_ready(battle_ready_df))
 
-    pokemon2_df_dict["pokemon_2_Multi_Type"] = (
-        1
-        if (
-            pokemon2_df_dict["pokemon_2_type_1"]
-            and pokemon2_df_dict["pokemon_2_type_2"]
-        )
-        else 0
-    )
 
-    for key, value in pokemon2_df_dict.items():
-        pokemon2_df_dict[key] = [value]
+def explain_battle(battle_ready_df, row=0):
+    """Predictions with explanations for one battle of battle_ready_df, computed when it is displayed"""
+    return run_pokemon_battle(battle_ready_df.iloc[[row]].reset_index(drop=True))[1]
 
-    combine_dict = {**pokemon2_df_dict, **custom_pokemon_dict}
-    battle_data = pd.DataFrame(combine_dict)
-    battle_data["First_pokemon"] = "foo"
-    battle_data["Second_pokemon"] = "bar"
 
-    battle_data["type_advantage"] = build_type_advantage(battle_data)
+@_timed("prepare_custom_battle")
+def process_for_custom_battle(pokemon_df, pokemon2, custom_pokemon_dict):
+    return feature_store(pokemon_df).custom_pair_frame(custom_pokemon_dict, pokemon2)
 
-    for stat in CONTINUOUS_COLUMNS:
-        battle_data[f"net_{stat}"] = (
-            battle_data[f"pokemon_1_{stat}"] - battle_data[f"pokemon_2_{stat}"]
-        )
 
-    return battle_data
+@_timed("format_explanations")
+def format_explanations(preds, row=0):
+    """
+    Display strings such as "NET SPEED +++" for each explanation of a prediction row. Empty slots, where
+    the model gave fewer explanations than there are columns, are skipped.
+    """
+    explanations = []
+    k = 1
+    while f"EXPLANATION_{k}_FEATURE_NAME" in preds:
+        feature = preds[f"EXPLANATION_{k}_FEATURE_NAME"][row]
+        strength = preds[f"EXPLANATION_{k}_QUALITATIVE_STRENGTH"][row]
+        k += 1
+        if feature is None or pd.isna(feature):
+            continue
+        explanations.append(f"{feature.replace('_', ' ').upper()} {strength}")
+    return explanations
+
+
+def drivers_markdown(explanations):
+    """The Primary Drivers block of the battle results, one line per explanation"""
+    lines = [
+        f'<p style="font-family:Courier; font-size: 20px;">{explanation}</p>'
+        for explanation in explanations
+    ]
+    return " \n\n".join(["<h3>Primary Drivers:</h3>"] + lines)
@@ -0,0 +1,143 @@
+"""
+Index of the images/ assets and display-size thumbnails served from memory.
+
+The directory is listed once when the index is built, and every roster name is resolved to its file then,
+whatever the extension or case (and for forms such as "Mega Charizard X" or "Heat Rotom", the base
+species' image). Images wider than a display width are resized once with Pillow, kept under
+data/.cache/thumbnails and held as encoded bytes in a bounded in-memory cache. Images that already fit are
+served as their original bytes, since upscaling would only make them larger.
+
+Usage (from the repo root), to pre-generate the thumbnails:
+    python -m image_assets
+"""
+
+import io
+import os
+import re
+import unicodedata
+
+from logzero import logger
+from PIL import Image
+
+from build_datasets.data_loading import CACHE_DIR
+from prediction_cache import LRUCache
+
+IMAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "images")
+THUMBNAIL_DIR = os.path.join(CACHE_DIR, "thumbnails")
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif", ".webp")
+DISPLAY_WIDTHS = (150, 250)
+THUMBNAIL_CACHE_SIZE = 512
+
+# Words that name a form rather than the species; the species' image stands in for the form
+_FORM_PREFIXES = ("mega", "primal")
+
+
+def image_key(name):
+    """File-name style key: "Mr. Mime" -> "mr-mime", "Nidoran♀" -> "nidoran-f", "Flabébé" -> "flabebe" """
+    name = str(name).replace("♀", "-f").replace("♂", "-m")
+    name = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode()
+    name = re.sub(r"[\s.]+", "-", name.strip().lower())
+    return re.sub(r"-+", "-", name).strip("-")
+
+
+class ImageIndex:
+    """Resolves pokemon names to image files and serves their thumbnails; names are resolved up front"""
+
+    def __init__(self, names=(), directory=IMAGE_DIR, cache_dir=THUMBNAIL_DIR):
+        self.directory = directory
+        self.cache_dir = cache_dir
+        self.files = {}
+        for filename in sorted(os.listdir(directory)):
+            stem, extension = os.path.splitext(filename)
+            if extension.lower() in IMAGE_EXTENSIONS:
+                self.files.setdefault(
+                    image_key(stem), os.path.join(directory, filename)
+                )
+        # Keys without separators, so "MrMime" and "Mr. Mime" find the same file
+        self.compact = {}
+        for key, path in self.files.items():
+            self.compact.setdefault(key.replace("-", ""), path)
+        self.paths = {name: self._resolve(name) for name in names}
+        self.thumbnails = LRUCache(maxsize=THUMBNAIL_CACHE_SIZE)
+
+    def _match(self, key):
+        """The file whose key is key, exactly or ignoring separators"""
+        path = self.files.get(key)
+        return path if path is not None else self.compact.get(key.replace("-", ""))
+
+    def _resolve(self, name):
+        # Only run for the roster names the index is built with, whose forms share the species' image
+        key = image_key(name)
+        path = self._match(key)
+        if path is not None:
+            return path
+        words = [w for w in key.split("-") if w and w not in _FORM_PREFIXES]
+        for word in words:
+            if word in self.files:
+                return self.files[word]
+        # Names like "DeoxysAttack Forme" glue the form onto the species
+        for word in words:
+            matches = [k for k in self.files if len(k) >= 4 and word.startswith(k)]
+            if matches:
+                return self.files[max(matches, key=len)]
+        return None
+
+    def path_of(self, name):
+        """
+        The image file for a pokemon name, or None. Names the index was built with are resolved up front,
+        forms included; any other name (e.g. a custom pokemon) only gets an exact or normalized match.
+        """
+        if name in self.paths:
+            return self.paths[name]
+        return self._match(image_key(name))
+
+    def _render(self, path, width):
+        with Image.open(path) as image:
+            if image.width <= width:
+                with open(path, "rb") as f:
+                    return f.read()
+            stem = os.path.splitext(os.path.basename(path))[0]
+            cached = os.path.join(self.cache_dir, f"{stem}-{width}.png")
+            if os.path.exists(cached) and os.path.getmtime(cached) >= os.path.getmtime(
+                path
+            ):
+                with open(cached, "rb") as f:
+                    return f.read()
+            height = round(image.height * width / image.width)
+            buffer = io.BytesIO()
+            image.resize((width, height), Image.LANCZOS).save(
+                buffer, format="PNG", optimize=True
+            )
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(cached + f".{os.getpid()}.tmp", "wb") as f:
+            f.write(buffer.getvalue())
+        os.replace(cached + f".{os.getpid()}.tmp", cached)
+        return buffer.getvalue()
+
+    def thumbnail(self, name, width):
+        """Encoded image bytes for name at most width pixels wide, or None when there is no image for it"""
+        path = self.path_of(name)
+        if path is None:
+            return None
+        data = self.thumbnails.get((path, width))
+        if data is None:
+            data = self._render(path, width)
+            self.thumbnails.put((path, width), data)
+        return data
+
+    def pregenerate(self, widths=DISPLAY_WIDTHS):
+        for path in sorted(set(self.files.values())):
+            for width in widths:
+                self._render(path, width)
+
+
+def main():
+    index = ImageIndex()
+    index.pregenerate()
+    logger.info(
+        f"Thumbnails for {len(index.files)} images at {DISPLAY_WIDTHS} px are in {THUMBNAIL_DIR}"
+    )
+
+
+if __name__ == "__main__":
+    main()
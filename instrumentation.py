@@ -0,0 +1,149 @@
+"""
+Per-stage timers and event counters for the battle path.
+
+Stages are timed with METRICS.timer("stage") or the @METRICS.timed("stage") decorator, and events are
+counted with METRICS.count("event"). Each stage keeps a count, a running total and a bounded reservoir of
+its most recent durations, from which snapshot() and prometheus() report p50/p95/p99. Recording a sample
+costs a lock and a deque append, so instrumentation stays on in production. Stages slower than
+POKEMON_SLOW_STAGE_MS (default 250) are logged as structured records when they happen.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+import numpy as np
+from logzero import logger
+
+RESERVOIR_SIZE = 2048
+SLOW_STAGE_MS = float(os.environ.get("POKEMON_SLOW_STAGE_MS", 250))
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class _Stage:
+    __slots__ = ("count", "total", "recent")
+
+    def __init__(self, reservoir_size):
+        self.count = 0
+        self.total = 0.0
+        self.recent = deque(maxlen=reservoir_size)
+
+
+class StageMetrics:
+    def __init__(self, reservoir_size=RESERVOIR_SIZE, slow_ms=SLOW_STAGE_MS):
+        self.reservoir_size = reservoir_size
+        self.slow_seconds = slow_ms / 1000
+        self._stages = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds, **fields):
+        with self._lock:
+            entry = self._stages.get(stage)
+            if entry is None:
+                entry = self._stages[stage] = _Stage(self.reservoir_size)
+            entry.count += 1
+            entry.total += seconds
+            entry.recent.append(seconds)
+        if seconds >= self.slow_seconds:
+            logger.warning(
+                json.dumps(
+                    {
+                        "event": "slow_stage",
+                        "stage": stage,
+                        "ms": round(seconds * 1000, 3),
+                        **fields,
+                    },
+                    default=str,
+                )
+            )
+
+    @contextmanager
+    def timer(self, stage, **fields):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start, **fields)
+
+    def timed(self, stage):
+        """Decorator timing every call of a function as stage"""
+
+        def decorate(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.observe(stage, time.perf_counter() - start)
+
+            return wrapper
+
+        return decorate
+
+    def count(self, event, n=1):
+        with self._lock:
+            self._counters[event] = self._counters.get(event, 0) + n
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+            self._counters.clear()
+
+    def snapshot(self):
+        """{"stages": {stage: count, sum and quantiles in seconds}, "counters": {event: count}}"""
+        with self._lock:
+            stages = {
+                stage: (entry.count, entry.total, list(entry.recent))
+                for stage, entry in self._stages.items()
+            }
+            counters = dict(self._counters)
+        report = {}
+        for stage, (count, total, recent) in sorted(stages.items()):
+            quantiles = np.quantile(recent, QUANTILES) if recent else [0.0] * 3
+            report[stage] = {
+                "count": count,
+                "sum": total,
+                **{
+                    f"p{round(q * 100)}": float(v) for q, v in zip(QUANTILES, quantiles)
+                },
+            }
+        return {"stages": report, "counters": dict(sorted(counters.items()))}
+
+    def prometheus(self, prefix="pokemon"):
+        """The snapshot in the Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        lines = [
+            f"# HELP {prefix}_stage_seconds Time spent per stage of the battle path",
+            f"# TYPE {prefix}_stage_seconds summary",
+        ]
+        for stage, stats in snapshot["stages"].items():
+            for q in QUANTILES:
+                lines.append(
+                    f'{prefix}_stage_seconds{{stage="{stage}",quantile="{q}"}} '
+                    f"{stats[f'p{round(q * 100)}']}"
+                )
+            lines.append(
+                f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {stats["sum"]}'
+            )
+            lines.append(
+                f'{prefix}_stage_seconds_count{{stage="{stage}"}} {stats["count"]}'
+            )
+        lines += [
+            f"# HELP {prefix}_events_total Events counted on the battle path",
+            f"# TYPE {prefix}_events_total counter",
+        ]
+        for event, value in snapshot["counters"].items():
+            lines.append(f'{prefix}_events_total{{event="{event}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def log_snapshot(self):
+        logger.info(json.dumps({"event": "metrics_snapshot", **self.snapshot()}))
+
+
+METRICS = StageMetrics()
@@ -0,0 +1,448 @@
+"""
+Pool of scoring worker processes, each with its own model instance, for using more than one core.
+
+Requests wait in the parent and each is handed to the next free worker, so a slow request never holds up
+the others. The parent records which worker has a request before handing it over, so a worker that dies
+always fails its own request with WorkerCrashed rather than losing it. Each worker answers down its own
+pipe, so one killed halfway through a message cannot block the others. A monitor thread checks the workers
+every health_interval seconds: a worker that died is replaced, and one busy on a single request for longer
+than request_timeout is killed and replaced the same way, its request failing with TimeoutError. A worker
+that cannot load its model is retried with exponential backoff, at most MAX_RESTART_DELAY apart, and
+health() reports its error until a retry succeeds. While every worker is failing, waiting requests fail
+rather than wait for a retry, and with request_timeout set a request also fails once it has waited that long
+for a free worker.
+
+The pool has the model interface (predict(data, max_explanations)), plus submit() returning a Future,
+which PredictionBatcher uses to keep several batches in flight. Set POKEMON_SCORING_WORKERS=N to have
+get_predictions.get_model() return a pool of N workers.
+"""
+
+import itertools
+import multiprocessing
+import os
+import pickle
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from multiprocessing.connection import wait
+
+from logzero import logger
+
+import get_predictions as gp
+from instrumentation import METRICS
+
+HEALTH_INTERVAL = 1.0
+START_TIMEOUT = 300
+CLOSE_TIMEOUT = 30
+MAX_RESTART_DELAY = 60.0
+
+
+class WorkerCrashed(RuntimeError):
+    pass
+
+
+def _worker_main(model_factory, inbox, results):
+    try:
+        model = model_factory()
+    except Exception as e:
+        results.send(("failed", repr(e)))
+        return
+    results.send(("ready", getattr(model, "version", None)))
+    while True:
+        item = inbox.get()
+        if item is None:
+            return
+        request_id, data, max_explanations = item
+        try:
+            message = (
+                "result",
+                request_id,
+                model.predict(data, max_explanations=max_explanations),
+            )
+        except Exception as e:
+            try:
+                pickle.dumps(e)
+            except Exception:
+                e = RuntimeError(repr(e))
+            message = ("error", request_id, e)
+        results.send(message)
+
+
+class _Worker:
+    """Parent-side state of one worker slot"""
+
+    __slots__ = (
+        "process",
+        "inbox",
+        "results",
+        "ready",
+        "request_id",
+        "busy_since",
+        "failures",
+        "error",
+        "restart_at",
+    )
+
+    def __init__(self):
+        self.process = None
+        self.inbox = None
+        self.results = None
+        self.ready = False
+        self.request_id = None
+        self.busy_since = 0.0
+        # Consecutive starts that did not get as far as loading the model, and the last one's error
+        self.failures = 0
+        self.error = None
+        self.restart_at = None
+
+
+class ScoringWorkerPool:
+    """
+    size worker processes, each calling model_factory() once to load its own model (by default
+    get_predictions.load_engine, so POKEMON_SCORING_ENGINE applies). model_factory must be picklable,
+    e.g. a module-level function or a functools.partial of one. Waits until every worker has its model,
+    and fails as soon as one cannot load it.
+    """
+
+    def __init__(
+        self,
+        size=None,
+        model_factory=gp.load_engine,
+        health_interval=HEALTH_INTERVAL,
+        request_timeout=None,
+        start_timeout=START_TIMEOUT,
+    ):
+        self.size = size or os.cpu_count()
+        self.model_factory = model_factory
+        self.health_interval = health_interval
+        self.request_timeout = request_timeout
+        self.version = None
+        self.restarts = 0
+        # spawn rather than fork: the parent runs threads, and a JVM does not survive a fork
+        self._context = multiprocessing.get_context("spawn")
+        self._pending = {}
+        self._waiting = deque()
+        # Result pipes of replaced workers, read until their worker's last message and then closed
+        self._retired = []
+        self._lock = threading.Lock()
+        # Notified whenever a worker becomes ready, fails to start or finishes a request
+        self._changed = threading.Condition(self._lock)
+        self._request_ids = itertools.count()
+        self._closing = threading.Event()
+        self._stopped = threading.Event()
+        self._monitor = None
+        self._workers = [_Worker() for _ in range(self.size)]
+        for slot in range(self.size):
+            self._start_worker(slot)
+
+        self._collector = threading.Thread(
+            target=self._collect, name="scoring-pool-collector", daemon=True
+        )
+        self._collector.start()
+        self._wait_until_started(start_timeout)
+        self._monitor = threading.Thread(
+            target=self._watch, name="scoring-pool-monitor", daemon=True
+        )
+        self._monitor.start()
+        logger.info(f"Started {self.size} scoring workers")
+
+    def _start_worker(self, slot):
+        worker = self._workers[slot]
+        if worker.inbox is not None:
+            # Whatever is left in a dead worker's inbox was already failed, so do not wait to flush it
+            worker.inbox.cancel_join_thread()
+        if worker.results is not None:
+            self._retired.append(worker.results)
+        worker.inbox = self._context.Queue()
+        worker.results, sender = self._context.Pipe(duplex=False)
+        worker.ready = False
+        worker.request_id = None
+        worker.process = self._context.Process(
+            target=_worker_main,
+            args=(self.model_factory, worker.inbox, sender),
+            name=f"scoring-worker-{slot}",
+            daemon=True,
+        )
+        worker.process.start()
+        # Only the worker holds the sending end, so its pipe reports EOF once it exits
+        sender.close()
+
+    def _wait_until_started(self, start_timeout):
+        deadline = time.monotonic() + start_timeout
+        with self._lock:
+            while True:
+                failed = [w for w in self._workers if w.error is not None]
+                # A worker that fails to load exits cleanly after reporting, so only a crash has no message
+                crashed = [
+                    w
+                    for w in self._workers
+                    if not w.ready and w.process.exitcode not in (None, 0)
+                ]
+                remaining = deadline - time.monotonic()
+                if failed:
+                    error = RuntimeError(
+                        f"A scoring worker could not load its model: {failed[0].error}"
+                    )
+                elif crashed:
+                    error = RuntimeError(
+                        f"A scoring worker exited with code {crashed[0].process.exitcode} "
+                        "before loading its model"
+                    )
+                elif all(w.ready for w in self._workers):
+                    return
+                elif remaining <= 0:
+                    error = TimeoutError(
+                        f"Scoring workers not ready after {start_timeout}s"
+                    )
+                else:
+                    self._changed.wait(min(remaining, self.health_interval))
+                    continue
+                break
+        self.close(timeout=0)
+        raise error
+
+    def submit(self, data, max_explanations=0):
+        if self._closing.is_set():
+            raise RuntimeError("The scoring pool is closed")
+        future = Future()
+        request_id = next(self._request_ids)
+        with self._lock:
+            self._pending[request_id] = future
+            self._waiting.append((request_id, data, max_explanations, time.time()))
+            self._dispatch()
+        return future
+
+    def predict(self, data, max_explanations=0, timeout=None):
+        return self.submit(data, max_explanations).result(timeout)
+
+    def _dispatch(self):
+        """Hands waiting requests to idle workers, recording each as taken first. Called with the lock held."""
+        for worker in self._workers:
+            if not self._waiting:
+                return
+            if worker.ready and worker.request_id is None:
+                request_id, data, max_explanations, _ = self._waiting.popleft()
+                worker.request_id, worker.busy_since = request_id, time.time()
+                worker.inbox.put((request_id, data, max_explanations))
+
+    def _collect(self):
+        while True:
+            with self._lock:
+                slots = {w.results: slot for slot, w in enumerate(self._workers)}
+                slots.pop(None, None)
+                readers = list(slots) + self._retired
+            # New workers' pipes are picked up within health_interval
+            ready = wait(readers, timeout=self.health_interval)
+            if not ready and self._stopped.is_set():
+                return
+            for reader in ready:
+                try:
+                    message = reader.recv()
+                except (EOFError, OSError):
+                    self._close_pipe(reader)
+                    continue
+                self._handle(slots.get(reader), reader, message)
+
+    def _close_pipe(self, reader):
+        """Stops reading the pipe of a worker that exited"""
+        with self._lock:
+            if reader in self._retired:
+                self._retired.remove(reader)
+            for worker in self._workers:
+                if worker.results is reader:
+                    worker.results = None
+        reader.close()
+
+    def _handle(self, slot, reader, message):
+        kind = message[0]
+        future = None
+        with self._lock:
+            worker = None if slot is None else self._workers[slot]
+            # Messages from a worker that has since been replaced only settle their request
+            current = worker is not None and worker.results is reader
+            if kind == "ready":
+                if current:
+                    worker.ready = True
+                    worker.failures, worker.error = 0, None
+                    self.version = self.version or message[1]
+            elif kind == "failed":
+                if current:
+                    worker.error = message[1]
+            else:
+                request_id = message[1]
+                if current and worker.request_id == request_id:
+                    worker.request_id = None
+                # Already failed by the monitor if its worker died right after answering
+                future = self._pending.pop(request_id, None)
+            self._dispatch()
+            self._changed.notify_all()
+        if future is None:
+            return
+        if kind == "error":
+            future.set_exception(message[2])
+        else:
+            future.set_result(message[2])
+
+    def _watch(self):
+        while not self._closing.wait(self.health_interval):
+            for slot in range(self.size):
+                self._check_worker(slot)
+            self._expire_waiting()
+
+    def _expire_waiting(self):
+        """
+        Fails waiting requests once they have waited request_timeout, and all of them while every worker
+        is failing to load its model, rather than leaving callers waiting on the restarts
+        """
+        expired = []
+        with self._lock:
+            if all(worker.failures for worker in self._workers):
+                error = RuntimeError(
+                    f"No scoring worker can load its model: {self._workers[0].error}"
+                )
+                expired, self._waiting = list(self._waiting), deque()
+            elif self.request_timeout is not None:
+                error = TimeoutError(
+                    f"Waited longer than {self.request_timeout}s for a scoring worker"
+                )
+                deadline = time.time() - self.request_timeout
+                # Oldest first, so the expired requests are at the front
+                while self._waiting and self._waiting[0][3] <= deadline:
+                    expired.append(self._waiting.popleft())
+            futures = [self._pending.pop(item[0], None) for item in expired]
+        for future in futures:
+            if future is not None:
+                future.set_exception(error)
+
+    def _check_worker(self, slot):
+        future = None
+        with self._lock:
+            worker = self._workers[slot]
+            process = worker.process
+            if worker.restart_at is not None:
+                # Backing off after failed starts
+                if time.monotonic() >= worker.restart_at:
+                    worker.restart_at = None
+                    self._restart(slot)
+                return
+            if process.is_alive():
+                if worker.request_id is None or self.request_timeout is None:
+                    return
+                busy_for = time.time() - worker.busy_since
+                if busy_for < self.request_timeout:
+                    return
+                logger.warning(
+                    f"Scoring worker {process.pid} busy for {busy_for:.0f}s, restarting it"
+                )
+                process.kill()
+                process.join()
+                error = TimeoutError(
+                    f"Scoring took longer than {self.request_timeout}s"
+                )
+            elif not worker.ready:
+                worker.failures += 1
+                worker.error = worker.error or f"exited with code {process.exitcode}"
+                delay = min(
+                    self.health_interval * 2 ** (worker.failures - 1), MAX_RESTART_DELAY
+                )
+                logger.error(
+                    f"Scoring worker could not load its model ({worker.error}), "
+                    f"retrying in {delay:.1f}s"
+                )
+                worker.restart_at = time.monotonic() + delay
+                return
+            else:
+                logger.warning(
+                    f"Scoring worker {process.pid} exited with code {process.exitcode}, restarting it"
+                )
+                error = WorkerCrashed(
+                    f"Scoring worker exited with code {process.exitcode}"
+                )
+            if worker.request_id is not None:
+                future = self._pending.pop(worker.request_id, None)
+            self._restart(slot)
+        if future is not None:
+            future.set_exception(error)
+
+    def _restart(self, slot):
+        self.restarts += 1
+        METRICS.count("scoring_worker_restarts")
+        self._start_worker(slot)
+
+    def health(self):
+        """Liveness and current work of each worker, and the error of any that cannot load its model"""
+        now = time.time()
+        with self._lock:
+            workers = [
+                {
+                    "pid": worker.process.pid,
+                    "alive": worker.process.is_alive(),
+                    "ready": worker.ready,
+                    "busy_seconds": (
+                        now - worker.busy_since
+                        if worker.request_id is not None
+                        else 0.0
+                    ),
+                    "start_failures": worker.failures,
+                    "error": worker.error,
+                }
+                for worker in self._workers
+            ]
+            pending, waiting = len(self._pending), len(self._waiting)
+        return {
+            "size": self.size,
+            "pending": pending,
+            "waiting": waiting,
+            "restarts": self.restarts,
+            "failing": sum(worker["start_failures"] > 0 for worker in workers),
+            "workers": workers,
+        }
+
+    def _draining(self):
+        # Requests that a live worker has, or will take. Called with the lock held
+        live = [w for w in self._workers if w.ready and w.process.is_alive()]
+        return bool(live) and (
+            bool(self._waiting) or any(w.request_id is not None for w in live)
+        )
+
+    def close(self, timeout=CLOSE_TIMEOUT):
+        """
+        Stops the workers once the requests already submitted are scored, waiting at most timeout seconds,
+        and fails anything left over
+        """
+        self._closing.set()
+        # Stop the monitor first, so it does not restart workers as they exit
+        if self._monitor is not None:
+            self._monitor.join()
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while self._draining() and time.monotonic() < deadline:
+                self._changed.wait(deadline - time.monotonic())
+        for worker in self._workers:
+            worker.inbox.put(None)
+        for worker in self._workers:
+            worker.process.join(timeout=max(deadline - time.monotonic(), 0))
+            if worker.process.is_alive():
+                worker.process.kill()
+                worker.process.join()
+            # Undelivered requests were failed below, so there is nothing to flush
+            worker.inbox.cancel_join_thread()
+        self._stopped.set()
+        self._collector.join()
+        for worker in self._workers:
+            if worker.results is not None:
+                worker.results.close()
+        for reader in self._retired:
+            reader.close()
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._waiting.clear()
+        for future in pending.values():
+            future.set_exception(RuntimeError("The scoring pool was closed"))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,69 @@
+"""
+Stat sweeps for a custom pokemon: its chance of beating an opponent across a range of one or two stats.
+
+The whole grid of custom pokemon is built at once as columns, turned into model rows with a single
+custom_pair_frame call and scored in one batched model call without explanations, so a 50x50 grid costs
+about as much as a single prediction.
+"""
+
+import numpy as np
+
+import get_predictions as gp
+from feature_store import CHART_STATS
+from instrumentation import METRICS
+
+SWEEP_STATS = CHART_STATS
+MAX_STEPS = 100
+MAX_SWEEP_ROWS = MAX_STEPS * MAX_STEPS
+
+
+def stat_values(low, high, steps):
+    """Up to steps whole-number stat values spread evenly from low to high"""
+    if not 2 <= steps <= MAX_STEPS:
+        raise ValueError(f"A sweep needs between 2 and {MAX_STEPS} steps")
+    return np.unique(np.linspace(low, high, steps).round().astype(np.int64))
+
+
+def sweep(
+    store, custom_pokemon_dict, opponent, x_stat, x_values, y_stat=None, y_values=None
+):
+    """
+    Probability the custom pokemon beats opponent at every value of x_stat, or every (x_stat, y_stat) pair.
+    custom_pokemon_dict is the single-row dict process_for_custom_battle takes; the swept stats replace
+    its values. Returns an array shaped (len(x_values),), or (len(y_values), len(x_values)) for two stats.
+    """
+    for stat in (x_stat, y_stat):
+        if stat is not None and stat not in SWEEP_STATS:
+            raise ValueError(f"Cannot sweep {stat}, choose one of {SWEEP_STATS}")
+    if y_stat is None:
+        grid = {x_stat: np.asarray(x_values)}
+    elif y_stat == x_stat:
+        raise ValueError("Sweep two different stats")
+    else:
+        x_grid, y_grid = np.meshgrid(x_values, y_values)
+        grid = {x_stat: x_grid.ravel(), y_stat: y_grid.ravel()}
+    n = len(grid[x_stat])
+    if n > MAX_SWEEP_ROWS:
+        raise ValueError(
+            f"A sweep can score at most {MAX_SWEEP_ROWS:,} stat combinations"
+        )
+
+    # The other custom_pokemon_dict values are single values, which custom_pair_frame repeats for every row
+    columns = dict(custom_pokemon_dict)
+    for stat, values in grid.items():
+        columns[f"pokemon_1_{stat}"] = values
+    battle_data = store.custom_pair_frame(columns, opponent)
+    with METRICS.timer("stat_sweep", rows=n):
+        probabilities = gp.predict_proba(battle_data)
+    if y_stat is None:
+        return probabilities
+    return probabilities.reshape(len(y_values), len(x_values))
+
+
+def break_even(values, probabilities):
+    """The lowest swept value from which the custom pokemon is favoured throughout, or None"""
+    favoured = np.asarray(probabilities) > 0.5
+    if not favoured[-1]:
+        return None
+    losing = np.flatnonzero(~favoured)
+    return values[losing[-1] + 1] if len(losing) else values[0]
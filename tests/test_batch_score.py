@@ -0,0 +1,112 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import batch_score
+import get_predictions as gp
+from build_datasets.data_loading import load_pokemon
+
+CHUNKSIZE = 40
+
+
+class Interrupted(Exception):
+    pass
+
+
+class InterruptingModel(gp.StubScoringModel):
+    """Scores the first `chunks` chunks, then fails as a killed job would"""
+
+    version = "stub"
+
+    def __init__(self, chunks=None):
+        super().__init__()
+        self.chunks = chunks
+        self.calls = 0
+
+    def predict(self, data, max_explanations=0):
+        if self.chunks is not None and self.calls >= self.chunks:
+            raise Interrupted()
+        self.calls += 1
+        return super().predict(data, max_explanations=max_explanations)
+
+
+@pytest.fixture(scope="module")
+def matchups():
+    ids = load_pokemon().id.to_numpy()
+    rng = np.random.default_rng(0)
+    return pd.DataFrame(
+        {"First_pokemon": rng.choice(ids, 230), "Second_pokemon": rng.choice(ids, 230)}
+    )
+
+
+def input_file(matchups, tmp_path, kind):
+    if kind == "csv":
+        path = str(tmp_path / "matchups.csv")
+        matchups.to_csv(path, index=False)
+    else:
+        path = str(tmp_path / "matchups.parquet")
+        matchups.to_parquet(path, index=False, row_group_size=75)
+    return path
+
+
+def read_output(path):
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path)
+    return pd.read_csv(path)
+
+
+def score(monkeypatch, input_path, output_path, model):
+    monkeypatch.setattr(gp, "MODEL", model)
+    return batch_score.score_file(
+        input_path, output_path, chunksize=CHUNKSIZE, max_explanations=1
+    )
+
+
+@pytest.mark.parametrize("input_kind", ["csv", "parquet"])
+@pytest.mark.parametrize("output_name", ["scored.csv", "scored.parquet"])
+def test_resume_after_interruption(
+    matchups, tmp_path, monkeypatch, input_kind, output_name
+):
+    input_path = input_file(matchups, tmp_path, input_kind)
+    output_path = str(tmp_path / output_name)
+    with pytest.raises(Interrupted):
+        score(monkeypatch, input_path, output_path, InterruptingModel(chunks=3))
+    assert len(read_output(output_path)) == 3 * CHUNKSIZE
+
+    # A chunk that was being written when the job died, but never recorded
+    if output_path.endswith(".parquet"):
+        pd.DataFrame({"First_pokemon": [-1]}).to_parquet(
+            os.path.join(output_path, "part-00003.parquet")
+        )
+    else:
+        with open(output_path, "a") as f:
+            f.write("-1,-1,0.5\n-1,")
+
+    resumed = InterruptingModel()
+    assert score(monkeypatch, input_path, output_path, resumed) == len(matchups)
+    # Only the chunks after the three already written are scored again
+    chunks = len(list(batch_score.read_chunks(input_path, CHUNKSIZE)))
+    assert resumed.calls == chunks - 3
+
+    scored = read_output(output_path)
+    pd.testing.assert_frame_equal(
+        scored[batch_score.ID_COLUMNS], matchups, check_dtype=False
+    )
+    uninterrupted = str(tmp_path / ("full-" + output_name))
+    score(monkeypatch, input_path, uninterrupted, InterruptingModel())
+    pd.testing.assert_frame_equal(scored, read_output(uninterrupted))
+
+
+def test_changed_settings_start_over(matchups, tmp_path, monkeypatch):
+    input_path = input_file(matchups, tmp_path, "csv")
+    output_path = str(tmp_path / "scored.csv")
+    with pytest.raises(Interrupted):
+        score(monkeypatch, input_path, output_path, InterruptingModel(chunks=2))
+    monkeypatch.setattr(gp, "MODEL", InterruptingModel())
+    batch_score.score_file(input_path, output_path, chunksize=50, max_explanations=1)
+    scored = read_output(output_path)
+    pd.testing.assert_frame_equal(
+        scored[batch_score.ID_COLUMNS], matchups, check_dtype=False
+    )
@@ -0,0 +1,237 @@
+import asyncio
+import http.client
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import battle_service
+import get_predictions as gp
+
+CUSTOM_POKEMON = {
+    "name": "Brettasaurus",
+    "type_1": "Fire",
+    "type_2": "None",
+    "generation": 7,
+    "legendary": False,
+    "hp": 65,
+    "speed": 65,
+    "attack": 75,
+    "defense": 70,
+    "sp_attack": 65,
+    "sp_defense": 70,
+}
+
+
+@pytest.fixture(scope="module")
+def port():
+    """The service on a free port, scoring with the stub engine as --engine stub does"""
+    model = gp.StubScoringModel()
+    model.version = "stub"
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(gp, "MODEL", model)
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+        _, server = asyncio.run_coroutine_threadsafe(
+            battle_service.start("127.0.0.1", 0, max_concurrency=2), loop
+        ).result(60)
+        yield server.sockets[0].getsockname()[1]
+        asyncio.run_coroutine_threadsafe(stop(server), loop).result(10)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(10)
+        loop.close()
+
+
+async def stop(server):
+    """Closes the server and ends the connection handlers still waiting for a request"""
+    server.close()
+    handlers = [
+        task for task in asyncio.all_tasks() if task is not asyncio.current_task()
+    ]
+    for task in handlers:
+        task.cancel()
+    await asyncio.gather(*handlers, return_exceptions=True)
+
+
+def request(port, method, path, body=None, raw=None):
+    """(status, headers, decoded body) of one request"""
+    if raw is None and body is not None:
+        raw = json.dumps(body)
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    try:
+        connection.request(method, path, body=raw)
+        response = connection.getresponse()
+        data = response.read().decode()
+    finally:
+        connection.close()
+    if response.getheader("Content-Type") == "application/json":
+        data = json.loads(data)
+    return response.status, response, data
+
+
+def test_health(port):
+    status, _, health = request(port, "GET", "/health")
+    assert status == 200
+    assert health["status"] == "ok"
+    assert health["model"] == "stub"
+    assert health["max_concurrency"] == 2
+
+
+def test_battle(port):
+    status, _, result = request(
+        port, "POST", "/battle", {"pokemon1": "Pikachu", "pokemon2": "Bulbasaur"}
+    )
+    assert status == 200
+    assert result["winner"] in ("Pikachu", "Bulbasaur")
+    assert 0 <= result["probability_pokemon1_wins"] <= 1
+    assert result["explanations"]
+
+
+def test_custom_battle(port):
+    status, _, result = request(
+        port,
+        "POST",
+        "/custom-battle",
+        {"custom_pokemon": CUSTOM_POKEMON, "opponent": "Bulbasaur"},
+    )
+    assert status == 200
+    assert result["pokemon1"] == "Brettasaurus"
+
+
+@pytest.mark.parametrize("explanations", [True, False])
+def test_batch(port, explanations):
+    battles = [
+        {"pokemon1": "Pikachu", "pokemon2": "Bulbasaur"},
+        {"pokemon1": "Bulbasaur", "pokemon2": "Charmander"},
+    ]
+    status, _, result = request(
+        port, "POST", "/batch", {"battles": battles, "explanations": explanations}
+    )
+    assert status == 200
+    assert [(r["pokemon1"], r["pokemon2"]) for r in result["results"]] == [
+        (b["pokemon1"], b["pokemon2"]) for b in battles
+    ]
+    assert all(("explanations" in r) == explanations for r in result["results"])
+    single = request(port, "POST", "/battle", battles[1])[2]
+    assert result["results"][1]["probability_pokemon1_wins"] == pytest.approx(
+        single["probability_pokemon1_wins"]
+    )
+
+
+def test_counters(port):
+    status, _, result = request(
+        port,
+        "POST",
+        "/counters",
+        {"pokemon": "Pikachu", "k": 3, "generation": 1, "legendary": False},
+    )
+    assert status == 200
+    assert len(result["counters"]) == len(result["victims"]) == 3
+    assert all(row["generation"] == 1 for row in result["counters"])
+    assert not any(row["legendary"] for row in result["counters"])
+    legendary = request(
+        port, "POST", "/counters", {"pokemon": "Pikachu", "legendary": True}
+    )[2]
+    assert all(row["legendary"] for row in legendary["counters"])
+
+
+def test_metrics(port):
+    request(port, "POST", "/battle", {"pokemon1": "Pikachu", "pokemon2": "Bulbasaur"})
+    status, response, text = request(port, "GET", "/metrics")
+    assert status == 200
+    assert response.getheader("Content-Type") == battle_service.PROMETHEUS_CONTENT_TYPE
+    assert "http_battle" in text
+    status, _, snapshot = request(port, "GET", "/metrics.json")
+    assert status == 200
+    assert "http_battle" in snapshot["stages"]
+
+
+@pytest.mark.parametrize(
+    "method, path, body, status, message",
+    [
+        ("GET", "/nowhere", None, 404, "No endpoint"),
+        ("GET", "/battle", None, 405, "not allowed"),
+        ("POST", "/battle", "{not json", 400, "Invalid JSON"),
+        ("POST", "/battle", {"pokemon1": "Pikachu"}, 400, "Missing fields: pokemon2"),
+        ("POST", "/battle", ["Pikachu"], 400, "Expected a JSON object"),
+        (
+            "POST",
+            "/battle",
+            {"pokemon1": "Pikachu", "pokemon2": "Nobody"},
+            404,
+            "Unknown pokemon: Nobody",
+        ),
+        (
+            "POST",
+            "/custom-battle",
+            {
+                "custom_pokemon": dict(CUSTOM_POKEMON, hp="lots"),
+                "opponent": "Bulbasaur",
+            },
+            400,
+            "custom_pokemon fields must be numbers: hp",
+        ),
+        (
+            "POST",
+            "/custom-battle",
+            {
+                "custom_pokemon": dict(CUSTOM_POKEMON, type_1="Plasma"),
+                "opponent": "Bulbasaur",
+            },
+            400,
+            "Unknown pokemon type",
+        ),
+        (
+            "POST",
+            "/batch",
+            {"battles": [{"pokemon1": "Pikachu", "pokemon2": "Bulbasaur"}] * 10_001},
+            413,
+            "At most",
+        ),
+        ("POST", "/counters", {"pokemon": "Pikachu", "k": "ten"}, 400, "k must be"),
+        (
+            "POST",
+            "/counters",
+            {"pokemon": "Pikachu", "legendary": "false"},
+            400,
+            "legendary must be",
+        ),
+    ],
+)
+def test_errors(port, method, path, body, status, message):
+    raw = body if isinstance(body, str) else None
+    got, _, result = request(port, method, path, body=None if raw else body, raw=raw)
+    assert got == status
+    assert message in result["error"]
+
+
+def test_rejects_requests_over_max_concurrency(port):
+    model = gp.get_model()
+    model.call_overhead_ms = 1000
+    try:
+        with ThreadPoolExecutor(4) as pool:
+            responses = list(
+                pool.map(
+                    lambda hp: request(
+                        port,
+                        "POST",
+                        "/custom-battle",
+                        {
+                            "custom_pokemon": dict(CUSTOM_POKEMON, hp=hp),
+                            "opponent": "Bulbasaur",
+                        },
+                    ),
+                    [11, 12, 13, 14],
+                )
+            )
+    finally:
+        model.call_overhead_ms = 0
+    statuses = sorted(status for status, _, _ in responses)
+    assert statuses.count(200) >= 1
+    assert statuses.count(429) >= 1
+    rejected = next(r for status, r, _ in responses if status == 429)
+    assert rejected.getheader("Retry-After") == "1"
+    status, _, health = request(port, "GET", "/health")
+    assert health["rejected"] >= 1
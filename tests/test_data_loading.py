@@ -0,0 +1,44 @@
+import pandas as pd
+import pytest
+
+from build_datasets import data_loading
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_loading, "CACHE_DIR", str(tmp_path / "cache"))
+    return tmp_path
+
+
+def test_loaded_columns_are_writable(cache_dir):
+    pokemon = data_loading.load_pokemon()
+    pokemon.loc[0, "hp"] = 5
+    assert pokemon.loc[0, "hp"] == 5
+    assert data_loading.load_pokemon().loc[0, "hp"] != 5
+
+
+@pytest.mark.parametrize("chunk_rows", [1, 2, 1000])
+def test_chunked_compile_matches_whole_file(cache_dir, monkeypatch, chunk_rows):
+    monkeypatch.setattr(data_loading, "COMPILE_CHUNK_ROWS", chunk_rows)
+    path = cache_dir / "mixed.csv"
+    path.write_text("a,b,c\n1,1.5,fire\n2,,\n,3,water\n4,4.25,ice\n")
+    loaded = data_loading.load_csv(str(path))
+    expected = pd.read_csv(path)
+    pd.testing.assert_frame_equal(loaded, expected)
+
+
+def test_same_basename_in_different_directories(cache_dir):
+    for directory, value in (("one", 1), ("two", 2)):
+        (cache_dir / directory).mkdir()
+        (cache_dir / directory / "combats.csv").write_text(f"x\n{value}\n")
+    assert data_loading.load_csv(str(cache_dir / "one" / "combats.csv")).x[0] == 1
+    assert data_loading.load_csv(str(cache_dir / "two" / "combats.csv")).x[0] == 2
+    assert data_loading.load_csv(str(cache_dir / "one" / "combats.csv")).x[0] == 1
+
+
+def test_count_rows_and_remove_cache(cache_dir):
+    path = cache_dir / "log.csv"
+    path.write_text("x\n1\n2\n3\n")
+    assert data_loading.count_rows(str(path)) == 3
+    data_loading.remove_cache(str(path))
+    assert not list((cache_dir / "cache").iterdir())
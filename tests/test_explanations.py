@@ -0,0 +1,25 @@
+import numpy as np
+import pandas as pd
+
+import helper_functions as hf
+
+
+def test_format_explanations_skips_empty_slots():
+    preds = pd.DataFrame(
+        {
+            "EXPLANATION_1_FEATURE_NAME": ["net_speed"],
+            "EXPLANATION_1_QUALITATIVE_STRENGTH": ["+++"],
+            "EXPLANATION_2_FEATURE_NAME": [None],
+            "EXPLANATION_2_QUALITATIVE_STRENGTH": [None],
+            "EXPLANATION_3_FEATURE_NAME": [np.nan],
+            "EXPLANATION_3_QUALITATIVE_STRENGTH": [np.nan],
+        }
+    )
+    assert hf.format_explanations(preds) == ["NET SPEED +++"]
+
+
+def test_drivers_markdown_has_a_line_per_explanation():
+    for explanations in ([], ["NET SPEED +++"], ["A +", "B -", "C ++", "D --"]):
+        markdown = hf.drivers_markdown(explanations)
+        assert markdown.count("<p ") == len(explanations)
+        assert all(explanation in markdown for explanation in explanations)
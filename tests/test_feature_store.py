@@ -0,0 +1,129 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from build_datasets.data_loading import POKEMON_BASE_COLUMNS, POKEMON_PATH, load_pokemon
+from build_datasets.format_dataset_for_classification import (
+    CONTINUOUS_COLUMNS,
+    build_type_advantage,
+    process_data,
+)
+from feature_store import RosterFeatureStore
+
+CUSTOM_POKEMON = {
+    "pokemon_1_name": "Brettasaurus",
+    "pokemon_1_type_1": "Fire",
+    "pokemon_1_type_2": "None",
+    "pokemon_1_generation": 7,
+    "pokemon_1_legendary": False,
+    "pokemon_1_hp": 65,
+    "pokemon_1_speed": 65,
+    "pokemon_1_attack": 75,
+    "pokemon_1_defense": 70,
+    "pokemon_1_sp_attack": 65,
+    "pokemon_1_sp_defense": 70,
+}
+
+
+def legacy_pokemon():
+    """The roster as the app originally loaded it"""
+    pokemon = pd.read_csv(POKEMON_PATH)
+    pokemon.columns = POKEMON_BASE_COLUMNS
+    return pokemon
+
+
+def legacy_pokemon_battle(pokemon, first_ids, second_ids):
+    """The original process_for_pokemon_battle, for arrays of ids"""
+    combat = pd.DataFrame({"First_pokemon": first_ids, "Second_pokemon": second_ids})
+    battle_data = process_data(combat, pokemon, is_training_data=False)
+    battle_data["type_advantage"] = build_type_advantage(battle_data)
+    return battle_data
+
+
+def legacy_custom_battle(pokemon_df, pokemon2, custom_pokemon_dict):
+    """The original process_for_custom_battle"""
+    custom_pokemon_dict = dict(custom_pokemon_dict)
+    custom_pokemon_dict["pokemon_1_Multi_Type"] = (
+        1
+        if (
+            custom_pokemon_dict["pokemon_1_type_1"]
+            and custom_pokemon_dict["pokemon_1_type_2"]
+        )
+        else 0
+    )
+    pokemon2_df = pokemon_df.loc[pokemon_df.name == pokemon2]
+    pokemon2_df.columns = [f"pokemon_2_{i}" for i in pokemon2_df.columns]
+    pokemon2_df_dict = pokemon2_df.to_dict(orient="records")[0]
+    pokemon2_df_dict["pokemon_2_Multi_Type"] = (
+        1
+        if (
+            pokemon2_df_dict["pokemon_2_type_1"]
+            and pokemon2_df_dict["pokemon_2_type_2"]
+        )
+        else 0
+    )
+    for key, value in pokemon2_df_dict.items():
+        pokemon2_df_dict[key] = [value]
+
+    combine_dict = {**pokemon2_df_dict, **custom_pokemon_dict}
+    battle_data = pd.DataFrame(combine_dict)
+    battle_data["First_pokemon"] = "foo"
+    battle_data["Second_pokemon"] = "bar"
+    battle_data["type_advantage"] = build_type_advantage(battle_data)
+    for stat in CONTINUOUS_COLUMNS:
+        battle_data[f"net_{stat}"] = (
+            battle_data[f"pokemon_1_{stat}"] - battle_data[f"pokemon_2_{stat}"]
+        )
+    return battle_data
+
+
+@pytest.fixture(scope="module")
+def store():
+    return RosterFeatureStore(load_pokemon())
+
+
+def test_pair_frame_matches_process_data(store):
+    rng = np.random.default_rng(0)
+    first_ids, second_ids = rng.choice(store.ids, 300), rng.choice(store.ids, 300)
+    pd.testing.assert_frame_equal(
+        store.pair_frame(first_ids, second_ids),
+        legacy_pokemon_battle(legacy_pokemon(), first_ids, second_ids),
+    )
+
+
+def test_pair_frame_single_pair(store):
+    pd.testing.assert_frame_equal(
+        store.pair_frame(store.ids[5], store.ids[9]),
+        legacy_pokemon_battle(legacy_pokemon(), [store.ids[5]], [store.ids[9]]),
+    )
+
+
+@pytest.mark.parametrize(
+    "types",
+    [("Fire", "None"), ("Water", "Ground"), ("Ghost", None), ("Dragon", "Flying")],
+)
+def test_custom_pair_frame_matches_legacy_custom_battle(store, types):
+    rng = np.random.default_rng(1)
+    pokemon = legacy_pokemon()
+    custom = dict(CUSTOM_POKEMON, pokemon_1_type_1=types[0], pokemon_1_type_2=types[1])
+    for opponent in rng.choice(pokemon.name.dropna().to_numpy(), 25):
+        pd.testing.assert_frame_equal(
+            store.custom_pair_frame(custom, opponent),
+            legacy_custom_battle(pokemon, opponent, custom),
+        )
+
+
+def test_custom_pair_frame_rows_match_single_battles(store):
+    pokemon = legacy_pokemon()
+    speeds = [40, 65, 120]
+    custom = dict(CUSTOM_POKEMON, pokemon_1_speed=speeds)
+    expected = pd.concat(
+        [
+            legacy_custom_battle(
+                pokemon, "Pikachu", dict(CUSTOM_POKEMON, pokemon_1_speed=speed)
+            )
+            for speed in speeds
+        ],
+        ignore_index=True,
+    )
+    pd.testing.assert_frame_equal(store.custom_pair_frame(custom, "Pikachu"), expected)
@@ -0,0 +1,29 @@
+import pytest
+
+from image_assets import ImageIndex
+
+
+@pytest.fixture
+def image_dir(tmp_path):
+    for filename in ("charizard.png", "deoxys.PNG", "mr-mime.jpg", "rotom.png"):
+        (tmp_path / filename).write_bytes(b"")
+    return tmp_path
+
+
+def test_roster_forms_resolve_to_the_species(image_dir):
+    index = ImageIndex(
+        ["Mega Charizard X", "DeoxysAttack Forme", "Heat Rotom"],
+        directory=str(image_dir),
+    )
+    assert index.path_of("Mega Charizard X").endswith("charizard.png")
+    assert index.path_of("DeoxysAttack Forme").endswith("deoxys.PNG")
+    assert index.path_of("Heat Rotom").endswith("rotom.png")
+
+
+def test_other_names_need_an_exact_or_normalized_match(image_dir):
+    index = ImageIndex(directory=str(image_dir))
+    assert index.path_of("Charizard").endswith("charizard.png")
+    assert index.path_of("MrMime").endswith("mr-mime.jpg")
+    assert index.path_of("Mr. Mime").endswith("mr-mime.jpg")
+    assert index.path_of("Charizarding") is None
+    assert index.path_of("Mega Charizard X") is None
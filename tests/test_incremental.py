@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from build_datasets import format_dataset_for_regression as regression
+from build_datasets import incremental
+from build_datasets.incremental import Checkpoint
+
+HEADER = "First_pokemon,Second_pokemon,Winner\n"
+
+
+@pytest.fixture(autouse=True)
+def checkpoint_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(incremental, "CHECKPOINT_DIR", str(tmp_path / "checkpoints"))
+
+
+@pytest.fixture
+def counted_rows(monkeypatch):
+    """Lengths of the combat frames count_combats is given"""
+    lengths = []
+    count_combats = regression.count_combats
+
+    def counting(combat, size):
+        lengths.append(len(combat))
+        return count_combats(combat, size)
+
+    monkeypatch.setattr(regression, "count_combats", counting)
+    return lengths
+
+
+def write_log(path, rows, mode="w"):
+    with open(path, mode) as f:
+        if mode == "w":
+            f.write(HEADER)
+        f.writelines(f"{a},{b},{w}\n" for a, b, w in rows)
+
+
+def full_counts(path, size):
+    return regression.count_combats(pd.read_csv(path), size)
+
+
+def test_appending_to_a_short_segment_keeps_the_checkpoint(tmp_path):
+    log = tmp_path / "combats.csv"
+    write_log(log, [(1, 2, 1), (2, 3, 3), (3, 1, 3)])
+    checkpoint = Checkpoint("test")
+    checkpoint.reset(str(log))
+    for segment, combat, offset in incremental.read_new_rows(str(log), checkpoint):
+        checkpoint.advance(segment, offset, len(combat))
+    write_log(log, [(1, 3, 1)], mode="a")
+    assert checkpoint.is_valid(str(log))
+
+
+def test_a_rewritten_segment_invalidates_the_checkpoint(tmp_path):
+    log = tmp_path / "combats.csv"
+    write_log(log, [(1, 2, 1), (2, 3, 3)])
+    checkpoint = Checkpoint("test")
+    checkpoint.reset(str(log))
+    for segment, combat, offset in incremental.read_new_rows(str(log), checkpoint):
+        checkpoint.advance(segment, offset, len(combat))
+    write_log(log, [(4, 2, 4), (2, 3, 3), (1, 1, 1)])
+    assert not checkpoint.is_valid(str(log))
+
+
+def test_update_counts_only_counts_appended_rows(tmp_path, counted_rows):
+    log = tmp_path / "combats.csv"
+    write_log(log, [(1, 2, 1), (2, 3, 3), (3, 1, 3)])
+    first = regression.update_counts(str(log), 5)
+    assert counted_rows == [3]
+
+    write_log(log, [(1, 3, 1), (4, 1, 4)], mode="a")
+    counts = regression.update_counts(str(log), 5)
+    # The two appended rows only, added to the stored counters rather than a recount
+    assert counted_rows == [3, 2]
+    expected = full_counts(log, 5)
+    for name in regression.COUNT_NAMES:
+        np.testing.assert_array_equal(counts[name], expected[name], err_msg=name)
+    assert counts["FirstCombat"].sum() == first["FirstCombat"].sum() + 2
+    assert Checkpoint("regression").rows == 5
+
+
+def test_update_counts_skips_a_partial_last_line(tmp_path, counted_rows):
+    log = tmp_path / "combats.csv"
+    write_log(log, [(1, 2, 1)])
+    with open(log, "a") as f:
+        f.write("2,3")
+    regression.update_counts(str(log), 5)
+    with open(log, "a") as f:
+        f.write(",3\n")
+    counts = regression.update_counts(str(log), 5)
+    assert counted_rows == [1, 1]
+    assert counts["SecondWin"][3] == 1
@@ -0,0 +1,16 @@
+import pytest
+
+import get_predictions as gp
+
+
+def test_model_version_does_not_load_the_model(monkeypatch):
+    monkeypatch.setattr(gp, "MODEL", None)
+    monkeypatch.setenv(gp.SCORING_ENGINE_ENV, "stub")
+    version = gp.model_version()
+    assert gp.MODEL is None
+    assert gp.get_model().version == version == gp.model_version()
+
+
+def test_resolve_engine_rejects_unknown_names():
+    with pytest.raises(ValueError, match="onnx"):
+        gp.resolve_engine("onnx")
@@ -0,0 +1,131 @@
+import pytest
+
+import get_predictions as gp
+import helper_functions as hf
+import prediction_cache
+from build_datasets.data_loading import load_pokemon
+from feature_store import RosterFeatureStore
+from prediction_cache import LRUCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(prediction_cache.time, "monotonic", clock)
+    return clock
+
+
+def test_evicts_the_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    # Reading "a" makes "b" the least recently used
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+
+
+def test_put_refreshes_an_existing_key():
+    cache = LRUCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.put("a", 10)
+    cache.put("c", 3)
+    assert cache.get("a") == 10
+    assert cache.get("b") is None
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = LRUCache(maxsize=4, ttl=60)
+    cache.put("a", 1)
+    clock.now += 30
+    cache.put("b", 2)
+    clock.now += 30
+    assert cache.get("a") == 1
+    clock.now += 0.001
+    assert cache.get("a", "gone") == "gone"
+    assert cache.get("b") == 2
+    assert len(cache) == 1
+
+
+def test_counters(clock):
+    cache = LRUCache(maxsize=2, ttl=10)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.put("c", 3)
+    cache.get("a")
+    cache.get("b")
+    cache.get("c")
+    clock.now += 11
+    cache.get("b")
+    cache.get("b")
+    assert cache.stats() == {
+        "size": 1,
+        "maxsize": 2,
+        "hits": 2,
+        "misses": 3,
+        "evictions": 1,
+        "expirations": 1,
+    }
+    cache.clear()
+    assert cache.stats()["size"] == 0
+
+
+@pytest.fixture(scope="module")
+def store():
+    return RosterFeatureStore(load_pokemon())
+
+
+@pytest.fixture
+def model(monkeypatch):
+    model = gp.StubScoringModel()
+    model.version = "stub-1"
+    monkeypatch.setattr(gp, "MODEL", model)
+    return model
+
+
+def test_roster_key_has_the_ids_and_model_version(store, model):
+    battle = store.pair_frame(store.ids[:1], store.ids[1:2])
+    key = hf.battle_cache_key(battle)
+    assert key == ("roster", "stub-1", int(store.ids[0]), int(store.ids[1]))
+    model.version = "stub-2"
+    assert hf.battle_cache_key(battle) != key
+
+
+def test_custom_key_has_the_model_version(store, model):
+    custom = {
+        "pokemon_1_name": "Brettasaurus",
+        "pokemon_1_type_1": "Fire",
+        "pokemon_1_type_2": "None",
+        "pokemon_1_generation": 7,
+        "pokemon_1_legendary": False,
+        "pokemon_1_hp": 65,
+        "pokemon_1_speed": 65,
+        "pokemon_1_attack": 75,
+        "pokemon_1_defense": 70,
+        "pokemon_1_sp_attack": 65,
+        "pokemon_1_sp_defense": 70,
+    }
+    opponent = "Pikachu"
+    key = hf.battle_cache_key(store.custom_pair_frame(custom, opponent))
+    assert key[:2] == ("custom", "stub-1")
+    faster = hf.battle_cache_key(
+        store.custom_pair_frame(dict(custom, pokemon_1_speed=66), opponent)
+    )
+    assert faster[:3] == key[:3] and faster != key
+
+
+def test_multi_row_frames_are_not_cached(store, model):
+    battles = store.pair_frame(store.ids[:3], store.ids[3:6])
+    assert hf.battle_cache_key(battles) is None
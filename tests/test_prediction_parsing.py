@@ -0,0 +1,72 @@
+import gc
+import io
+import json
+
+import pytest
+
+from get_predictions import dataframify_predictions, iter_prediction_rows
+
+RESPONSE = {
+    "elapsed": 1.5,
+    "count": 12,
+    "ratio": -2.5e-3,
+    "data": [
+        {
+            "rowId": 0,
+            "prediction": True,
+            "predictionValues": [{"label": True, "value": 0.8125}],
+            "predictionExplanations": [
+                {
+                    "feature": "net_speed",
+                    "strength": 1.25e2,
+                    "qualitativeStrength": "+++",
+                }
+            ],
+        },
+        {
+            "rowId": 1,
+            "prediction": False,
+            "predictionValues": [{"label": True, "value": 0.125}],
+            "predictionExplanations": [],
+        },
+        17.25,
+        -3,
+        None,
+    ],
+    "version": 10.0,
+}
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 8])
+@pytest.mark.parametrize("separators", [(",", ":"), (", ", ": ")])
+def test_rows_survive_any_chunk_boundary(chunk_size, separators):
+    text = json.dumps(RESPONSE, separators=separators)
+    rows = list(iter_prediction_rows(io.StringIO(text), chunk_size=chunk_size))
+    assert rows == RESPONSE["data"]
+
+
+def test_number_split_across_chunks():
+    text = '{"elapsed": 1.5, "data": [2.75]}'
+    # The first chunk ends with "1." and the next starts with "5"
+    chunk_size = text.index(".5") + 1
+    rows = list(iter_prediction_rows(io.StringIO(text), chunk_size=chunk_size))
+    assert rows == [2.75]
+
+
+def test_binary_stream():
+    text = json.dumps(RESPONSE).encode()
+    stream = io.BytesIO(text)
+    rows = list(iter_prediction_rows(stream, chunk_size=4))
+    assert rows == RESPONSE["data"]
+    gc.collect()
+    # The caller owns the stream, so it is still open after parsing
+    assert not stream.closed
+
+
+def test_dataframify_leaves_the_stream_open():
+    response = dict(RESPONSE, data=RESPONSE["data"][:2])
+    stream = io.BytesIO(json.dumps(response).encode())
+    frame = dataframify_predictions(stream, max_explanations=1)
+    gc.collect()
+    assert not stream.closed
+    assert frame.rowId.tolist() == [0, 1]
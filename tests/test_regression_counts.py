@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from build_datasets import format_dataset_for_regression as regression
+
+
+def groupby_counts(combat, size):
+    """The counts as the original value_counts/merge build derived them, with 0 for never seen"""
+    first_wins = combat[combat.First_pokemon == combat.Winner]
+    second_wins = combat[combat.Second_pokemon == combat.Winner]
+    counted = {
+        "FirstCombat": combat.groupby("First_pokemon").size(),
+        "SecondCombat": combat.groupby("Second_pokemon").size(),
+        "FirstWin": first_wins.groupby("First_pokemon").size(),
+        "SecondWin": second_wins.groupby("Second_pokemon").size(),
+    }
+    return {
+        name: counts.reindex(range(size), fill_value=0).to_numpy()
+        for name, counts in counted.items()
+    }
+
+
+@pytest.fixture
+def combat():
+    rng = np.random.default_rng(0)
+    first = rng.integers(1, 30, 500)
+    second = rng.integers(1, 30, 500)
+    # Id 13 never fights
+    first[first == 13], second[second == 13] = 14, 15
+    winner = np.where(rng.random(500) < 0.5, first, second)
+    return pd.DataFrame(
+        {"First_pokemon": first, "Second_pokemon": second, "Winner": winner}
+    )
+
+
+@pytest.mark.parametrize("chunk", [regression.COUNT_CHUNK, 64, 7, 1])
+def test_count_combats_matches_groupby(combat, chunk, monkeypatch):
+    monkeypatch.setattr(regression, "COUNT_CHUNK", chunk)
+    counts = regression.count_combats(combat, 32)
+    expected = groupby_counts(combat, 32)
+    for name in regression.COUNT_NAMES:
+        np.testing.assert_array_equal(counts[name], expected[name], err_msg=name)
+    assert all(counts[name][13] == 0 for name in regression.COUNT_NAMES)
+
+
+def test_merge_dataframes_counts_every_roster_pokemon(combat, monkeypatch):
+    monkeypatch.setattr(regression, "COUNT_CHUNK", 64)
+    pokemon = pd.DataFrame(
+        {"index": np.arange(1, 31), "name": list("abcdefghijklmnopqrstuvwxyzABCD")}
+    )
+    merged = regression.merge_dataframes(pokemon, combat)
+    expected = groupby_counts(combat, 31)
+    ids = pokemon["index"].to_numpy()
+    np.testing.assert_array_equal(merged.FirstCombat, expected["FirstCombat"][ids])
+    np.testing.assert_array_equal(
+        merged.TotalMatch, (expected["FirstCombat"] + expected["SecondCombat"])[ids]
+    )
+    np.testing.assert_array_equal(
+        merged.TotalWin, (expected["FirstWin"] + expected["SecondWin"])[ids]
+    )
+    # Id 13 never fought, and neither did 30, the largest id on the roster
+    assert merged.loc[ids == 13, "TotalMatch"].item() == 0
+    assert merged.loc[ids == 30, "TotalMatch"].item() == 0
+    assert merged.name.tolist() == pokemon.name.tolist()
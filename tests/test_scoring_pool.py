@@ -0,0 +1,143 @@
+import os
+import signal
+import time
+from functools import partial
+
+import pandas as pd
+import pytest
+
+import get_predictions as gp
+from build_datasets.data_loading import load_pokemon
+from feature_store import RosterFeatureStore
+from scoring_pool import ScoringWorkerPool, WorkerCrashed
+
+# Worker factories are module-level so the spawned workers can unpickle them
+
+
+def crash_on_load():
+    os._exit(3)
+
+
+def fail_on_load():
+    raise ValueError("no model here")
+
+
+def load_once(marker):
+    """A stub the first time, then a failure for every restart"""
+    if os.path.exists(marker):
+        raise ValueError("model went away")
+    open(marker, "w").close()
+    return gp.StubScoringModel()
+
+
+@pytest.fixture(scope="module")
+def battles():
+    store = RosterFeatureStore(load_pokemon())
+    return store.pair_frame(store.ids[:4], store.ids[4:8])
+
+
+def wait_for(condition, timeout=30):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.05)
+
+
+def busy_pid(pool):
+    workers = pool.health()["workers"]
+    return next(w["pid"] for w in workers if w["busy_seconds"] > 0)
+
+
+def test_scores_like_the_model(battles):
+    with ScoringWorkerPool(2, gp.StubScoringModel) as pool:
+        pd.testing.assert_frame_equal(
+            pool.predict(battles, max_explanations=3),
+            gp.StubScoringModel().predict(battles, max_explanations=3),
+        )
+
+
+def test_crashed_worker_fails_its_request_and_is_replaced(battles):
+    slow = partial(gp.StubScoringModel, call_overhead_ms=2000)
+    with ScoringWorkerPool(1, slow, health_interval=0.1) as pool:
+        future = pool.submit(battles)
+        wait_for(lambda: any(w["busy_seconds"] for w in pool.health()["workers"]))
+        os.kill(busy_pid(pool), signal.SIGKILL)
+        with pytest.raises(WorkerCrashed):
+            future.result(30)
+        assert len(pool.predict(battles)) == len(battles)
+        assert pool.restarts == 1
+
+
+def test_request_timeout_kills_the_worker(battles):
+    hung = partial(gp.StubScoringModel, call_overhead_ms=60_000)
+    with ScoringWorkerPool(1, hung, health_interval=0.1, request_timeout=0.5) as pool:
+        started = time.monotonic()
+        with pytest.raises(TimeoutError):
+            pool.predict(battles, timeout=30)
+        assert time.monotonic() - started < 10
+        wait_for(lambda: pool.health()["workers"][0]["ready"])
+        assert pool.restarts == 1
+
+
+def test_close_scores_submitted_requests_then_rejects_new_ones(battles):
+    pool = ScoringWorkerPool(1, partial(gp.StubScoringModel, call_overhead_ms=50))
+    futures = [pool.submit(battles) for _ in range(4)]
+    pool.close()
+    assert all(len(future.result(0)) == len(battles) for future in futures)
+    with pytest.raises(RuntimeError):
+        pool.submit(battles)
+
+
+def test_close_fails_requests_it_cannot_finish(battles):
+    hung = partial(gp.StubScoringModel, call_overhead_ms=60_000)
+    pool = ScoringWorkerPool(1, hung)
+    futures = [pool.submit(battles) for _ in range(2)]
+    pool.close(timeout=0.5)
+    for future in futures:
+        with pytest.raises(RuntimeError, match="closed"):
+            future.result(0)
+
+
+@pytest.mark.parametrize(
+    "factory, message", [(fail_on_load, "no model here"), (crash_on_load, "code 3")]
+)
+def test_start_fails_fast_when_a_worker_cannot_load(factory, message):
+    started = time.monotonic()
+    with pytest.raises(RuntimeError, match=message):
+        ScoringWorkerPool(1, factory, health_interval=0.1)
+    assert time.monotonic() - started < 30
+
+
+def test_failing_restarts_back_off_and_show_in_health(battles, tmp_path):
+    factory = partial(load_once, str(tmp_path / "loaded"))
+    with ScoringWorkerPool(1, factory, health_interval=0.1) as pool:
+        os.kill(pool.health()["workers"][0]["pid"], signal.SIGKILL)
+        wait_for(lambda: pool.health()["failing"])
+        time.sleep(2)
+        health = pool.health()
+        assert "model went away" in health["workers"][0]["error"]
+        # Retried 0.1, 0.2, 0.4, 0.8s apart rather than every 0.1s
+        assert health["restarts"] <= 6
+
+
+def test_requests_fail_while_every_worker_fails_to_start(battles, tmp_path):
+    # Loads once, so the pool starts, then fails every restart
+    factory = partial(load_once, str(tmp_path / "loaded"))
+    with ScoringWorkerPool(1, factory, health_interval=0.1) as pool:
+        os.kill(pool.health()["workers"][0]["pid"], signal.SIGKILL)
+        wait_for(lambda: pool.health()["failing"])
+        started = time.monotonic()
+        with pytest.raises(RuntimeError, match="model went away"):
+            pool.predict(battles, timeout=30)
+        assert time.monotonic() - started < 5
+        assert pool.health()["waiting"] == 0
+
+
+def test_request_timeout_covers_waiting_for_a_worker(battles):
+    hung = partial(gp.StubScoringModel, call_overhead_ms=60_000)
+    with ScoringWorkerPool(1, hung, health_interval=0.1, request_timeout=1) as pool:
+        running, waiting = pool.submit(battles), pool.submit(battles)
+        with pytest.raises(TimeoutError, match="Waited longer"):
+            waiting.result(30)
+        with pytest.raises(TimeoutError):
+            running.result(30)
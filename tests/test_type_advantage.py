@@ -0,0 +1,88 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from build_datasets.data_loading import POKEMON_PATH
+from build_datasets.format_dataset_for_classification import (
+    TYPE_ADVANTAGES,
+    build_type_advantage,
+    encode_types,
+    type_advantage_from_codes,
+)
+
+TYPE_COLUMNS = [
+    "pokemon_1_type_1",
+    "pokemon_1_type_2",
+    "pokemon_2_type_1",
+    "pokemon_2_type_2",
+]
+
+
+def legacy_build_type_advantage(df):
+    """The original per-row loop, kept as the reference for the vectorized version"""
+    temp = df[TYPE_COLUMNS].copy().fillna("none")
+    for col in temp.columns:
+        temp[col] = temp[col].str.lower()
+
+    t_adv = []
+    for h, i, j, k in zip(
+        temp.pokemon_1_type_1,
+        temp.pokemon_1_type_2,
+        temp.pokemon_2_type_1,
+        temp.pokemon_2_type_2,
+    ):
+        counter = 3
+        advantage_types = list(
+            set(TYPE_ADVANTAGES[h] + TYPE_ADVANTAGES.get(i, ["none"]))
+        )
+        disadvantage_types = list(
+            set(TYPE_ADVANTAGES[j] + TYPE_ADVANTAGES.get(k, ["none"]))
+        )
+        if j in advantage_types:
+            counter += 1
+        if k in advantage_types:
+            counter += 1
+        if h in disadvantage_types:
+            counter -= 1
+        if i in disadvantage_types:
+            counter -= 1
+        t_adv.append(counter)
+    return t_adv
+
+
+def all_type_combinations():
+    """Every combination of the four type slots, with the spellings the datasets use"""
+    names = [name.title() for name in TYPE_ADVANTAGES if name != "none"]
+    second_slot = names + ["None", None]
+    rows = [
+        (t11, t12, t21, t22)
+        for t11, t12, t21, t22 in itertools.product(
+            names, second_slot, names, second_slot
+        )
+    ]
+    return pd.DataFrame(rows, columns=TYPE_COLUMNS, dtype=object)
+
+
+def test_build_type_advantage_matches_legacy_loop():
+    df = all_type_combinations()
+    expected = np.array(legacy_build_type_advantage(df))
+    np.testing.assert_array_equal(build_type_advantage(df), expected)
+
+
+def test_type_advantage_from_codes_matches_legacy_loop():
+    df = all_type_combinations()
+    codes = [encode_types(df[column]) for column in TYPE_COLUMNS]
+    expected = np.array(legacy_build_type_advantage(df))
+    np.testing.assert_array_equal(type_advantage_from_codes(*codes), expected)
+
+
+def test_roster_battles_match_legacy_loop():
+    pokemon = pd.read_csv(POKEMON_PATH)
+    types = pokemon[["Type 1", "Type 2"]]
+    rng = np.random.default_rng(0)
+    first = types.iloc[rng.integers(len(types), size=5000)].to_numpy()
+    second = types.iloc[rng.integers(len(types), size=5000)].to_numpy()
+    df = pd.DataFrame(np.hstack([first, second]), columns=TYPE_COLUMNS)
+    expected = np.array(legacy_build_type_advantage(df))
+    np.testing.assert_array_equal(build_type_advantage(df), expected)
@@ -0,0 +1,97 @@
+"""
+Monte Carlo single-elimination tournaments between roster pokemon.
+
+Every pairing the bracket can produce is scored once, in a single batched model call (or read from the
+precomputed matchup matrix), and the bracket is then replayed for all trials at once with NumPy.
+"""
+import numpy as np
+import pandas as pd
+
+import get_predictions as gp
+from build_datasets.matchup_matrix import load_matchup_matrix
+
+MIN_ENTRANTS = 8
+MAX_ENTRANTS = 256
+Z_95 = 1.959964
+
+
+def win_probability_matrix(store, entrant_ids):
+    """
+    P[i, j] = probability entrant i beats entrant j.
+    The model scores First_pokemon vs Second_pokemon, so both orders are scored and averaged.
+    """
+    entrant_ids = np.asarray(entrant_ids)
+    n = len(entrant_ids)
+    first, second = (grid.ravel() for grid in np.indices((n, n)))
+    off_diagonal = first != second
+    first, second = first[off_diagonal], second[off_diagonal]
+
+    matchup_matrix = load_matchup_matrix()
+    if matchup_matrix is not None and matchup_matrix.covers_pairs(
+        entrant_ids[first], entrant_ids[second]
+    ):
+        preds = matchup_matrix.lookup(entrant_ids[first], entrant_ids[second])
+        probabilities = preds["target_True_PREDICTION"].to_numpy()
+    else:
+        battle_data = store.pair_frame(entrant_ids[first], entrant_ids[second])
+        probabilities = gp.predict_proba(battle_data)
+
+    first_wins = np.full((n, n), 0.5)
+    first_wins[first, second] = probabilities
+    return (first_wins + (1 - first_wins.T)) / 2
+
+
+def simulate_bracket(probabilities, trials=10_000, seed=None):
+    """
+    Plays the bracket `trials` times and returns how often each entrant won it.
+    Entrants are paired in the order given (0 vs 1, 2 vs 3, ...). When the field is not a power of two,
+    the remaining slots are byes, each facing a different entrant in the first round.
+    """
+    n = len(probabilities)
+    size = 1 << (n - 1).bit_length()
+    byes = size - n
+    bye = n
+
+    # One extra row/column for the bye, which always loses
+    extended = np.zeros((n + 1, n + 1))
+    extended[:n, :n] = probabilities
+    extended[:n, bye] = 1.0
+
+    bracket = np.full(size, bye)
+    bracket[0 : 2 * byes : 2] = np.arange(byes)
+    bracket[2 * byes :] = np.arange(byes, n)
+
+    rng = np.random.default_rng(seed)
+    field = np.broadcast_to(bracket, (trials, size))
+    while field.shape[1] > 1:
+        a, b = field[:, 0::2], field[:, 1::2]
+        field = np.where(rng.random(a.shape) < extended[a, b], a, b)
+    return np.bincount(field[:, 0], minlength=n)[:n]
+
+
+def run_tournament(store, entrant_names, trials=10_000, seed=None):
+    """Championship probability with a 95% Wilson interval for every entrant"""
+    if not MIN_ENTRANTS <= len(entrant_names) <= MAX_ENTRANTS:
+        raise ValueError(
+            f"A tournament needs between {MIN_ENTRANTS} and {MAX_ENTRANTS} entrants"
+        )
+    entrant_ids = np.array([store.id_of(name) for name in entrant_names])
+    wins = simulate_bracket(
+        win_probability_matrix(store, entrant_ids), trials=trials, seed=seed
+    )
+
+    p = wins / trials
+    center = (p + Z_95**2 / (2 * trials)) / (1 + Z_95**2 / trials)
+    half_width = (
+        Z_95
+        * np.sqrt(p * (1 - p) / trials + Z_95**2 / (4 * trials**2))
+        / (1 + Z_95**2 / trials)
+    )
+    return pd.DataFrame(
+        {
+            "Pokemon": list(entrant_names),
+            "championship_probability": p,
+            "ci_low": np.clip(center - half_width, 0, 1),
+            "ci_high": np.clip(center + half_width, 0, 1),
+        }
+    ).sort_values("championship_probability", ascending=False, ignore_index=True)